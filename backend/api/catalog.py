@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from foodgram.middleware import accepts_gzip
+
+
+CATALOG_VERSION_KEY = 'catalog-version:{}'
+
+CatalogDocument = namedtuple(
+    'CatalogDocument', ('version', 'built_at', 'etag', 'body', 'gzipped')
+)
+
+_documents = {}
+_lock = threading.Lock()
+
+
+def catalog_version(name):
+    """
+    Текущая версия справочника. Она хранится в кеше по умолчанию,
+    который должен быть общим для воркеров (см. api.checks): тогда
+    после изменения тега или ингредиента каждый воркер пересобирает
+    свой документ на следующем запросе. Вытесненная из кеша версия
+    заменяется новой, и документы просто пересобираются.
+    """
+    key = CATALOG_VERSION_KEY.format(name)
+    cache.add(key, uuid4().hex, None)
+    return cache.get(key)
+
+
+def bump_catalog_version(name):
+    """Помечает справочник измененным: документы будут пересобраны."""
+    cache.set(CATALOG_VERSION_KEY.format(name), uuid4().hex, None)
+
+
+def _is_fresh(document, version):
+    return (
+        document is not None
+        and document.version == version
+        and time.monotonic() - document.built_at
+        < settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+def get_catalog_document(name, render):
+    """
+    Возвращает JSON справочника и его gzip-копию из памяти процесса,
+    пересобирая их через render() только при смене версии.
+    """
+    version = catalog_version(name)
+    document = _documents.get(name)
+    if _is_fresh(document, version):
+        return document
+    with _lock:
+        document = _documents.get(name)
+        if _is_fresh(document, version):
+            return document
+        body = render()
+        document = CatalogDocument(
+            version=version,
+            built_at=time.monotonic(),
+            etag='"{}"'.format(hashlib.md5(body).hexdigest()),
+            body=body,
+            gzipped=gzip.compress(body, compresslevel=9),
+        )
+        _documents[name] = document
+    return document
+
+
+def catalog_response(request, document):
+    """Отдает готовый документ, сжатый, если клиент принимает gzip."""
+    if request.META.get('HTTP_IF_NONE_MATCH') == document.etag:
+        response = HttpResponseNotModified()
+    elif accepts_gzip(request):
+        response = HttpResponse(
+            document.gzipped, content_type='application/json'
+        )
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(
+            document.body, content_type='application/json'
+        )
+    response.headers['ETag'] = document.etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Закрепление за основной БД, кеш профилей, версии справочников и
+# короткие ссылки должны быть видны всем воркерам.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register('caches', deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            'Кеш по умолчанию не общий для процессов.',
+            hint=(
+                'Воркеры gunicorn не увидят закрепление клиента за '
+                'основной БД и сброс кеша профилей, справочников и '
+                'коротких ссылок. Задайте CACHE_BACKEND: FileBasedCache '
+                'или RedisCache.'
+            ),
+            id='api.W001',
+        )
+    ]
@@ -1,11 +1,66 @@
 AMOUNT_MIN = 1
 AMOUNT_MAX = 5000
+BATCH_CREATED = 'created'
+BATCH_DELETED = 'deleted'
+BATCH_EXISTS = 'exists'
+BATCH_MAX_SIZE = 100
+BATCH_MISSING = 'missing'
+BATCH_NOT_FOUND = 'not_found'
+BATCH_SELF = 'self'
 COOKING_TIME_MIN = 1
+FUZZY_CANDIDATES = 200
+FUZZY_LIMIT = 20
+FUZZY_MAX_LIMIT = 50
+FUZZY_THRESHOLD = 0.3
+FUZZY_TIMEOUT_MS = 200
+FUZZY_USAGE_WEIGHT = 0.05
 ING_NAME_LENGTH = 128
 ING_MEAS_LENGTH = 64
+MEDIA_ORPHAN_CHUNK_SIZE = 1000
+MEDIA_ORPHAN_GRACE_HOURS = 24
+MEDIA_ORPHAN_WORKERS = 4
+NDJSON_CHUNK_SIZE = 2000
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_PRUNE_CHUNK_SIZE = 5000
+OUTBOX_RETENTION_DAYS = 7
+PAGE_COUNT_CACHE_TIMEOUT = 60
 PAGE_SIZE = 6
+RECIPE_DOCUMENT_CHUNK_SIZE = 500
+RECIPE_FRONTEND_URL = '/recipes/{}'
 RECIPE_NAME_LENGTH = 256
+SHORT_LINK_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60 * 24
+SHORT_LINK_FLUSH_HITS = 100
+SHORT_LINK_FLUSH_INTERVAL = 30
+SHORT_LINK_LENGTH = 7
+SHORT_LINK_MEMORY_SIZE = 10000
+SHORT_LINK_MEMORY_TTL = 30
+SHORT_LINK_MISS_TIMEOUT = 60
+SHORT_LINK_MULTIPLIER = 1580030173
+SIMILAR_BANDS = 32
+SIMILAR_BENCHMARK_INGREDIENTS = 2200
+SIMILAR_CANDIDATES = 300
+SIMILAR_CHUNK_SIZE = 1000
+SIMILAR_MAX_LIMIT = 50
+SIMILAR_ROWS = 2
+SIMILAR_SEED = 20250503
 TAG_LENGTH = 200
+TAG_MASK_BITS = 63
+TAG_MASK_IN_LIMIT = 256
+THROTTLE_DB_TIMEOUT = 5
+THROTTLE_PRUNE_INTERVAL = 5 * 60
+TRENDING_CART_WEIGHT = 2.0
+TRENDING_CHUNK_SIZE = 2000
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_OVERLAP_MINUTES = 15
+TRENDING_REBASE_EXPONENT = 300
+UPLOAD_CLEANUP_INTERVAL = 10 * 60
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_READ_SIZE = 64 * 1024
 VALIDATE_MSG_1 = 'Должно быть наличие хотя бы одного ингредиента!'
 VALIDATE_MSG_2 = 'Ингредиенты должны быть уникальными!'
 VALIDATE_MSG_3 = 'Укажите положительное количество каждого ингредиента!'
+VALIDATE_MSG_UPLOAD = 'Загрузка не найдена или еще не завершена.'
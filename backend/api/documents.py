@@ -0,0 +1,222 @@
+"""
+Готовые документы рецептов для чтения. Все, что не зависит от
+пользователя (автор, теги, ингредиенты, поля рецепта), хранится в
+RecipeDocument одним JSON. В ответ добавляются только is_favorited,
+is_in_shopping_cart и author.is_subscribed, а ссылки на файлы
+становятся абсолютными. Документы сохраняются, только если версия
+строки не изменилась за время сборки (см. recipes.documents).
+
+Документ создаваемого или изменяемого через API рецепта собирается
+после коммита записи. Остальные недостающие документы (после
+переименования тега, смены профиля автора) собираются при чтении:
+на PostgreSQL без реплик - с сохранением. При чтении с реплики или на
+SQLite документ только отрисовывается и не сохраняется: запись
+перевела бы чтения запроса на основную БД (ReplicaRouter) или ждала
+бы блокировки записи SQLite. Такие документы сохраняет команда
+build_recipe_documents.
+"""
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    IntegrityError,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import Case, JSONField, Prefetch, Q, Value, When
+from django.utils import timezone
+
+from api.constants import RECIPE_DOCUMENT_CHUNK_SIZE
+from api.mixins import requested_fields
+from api.serializers import RecipeReadSerializer, UserSerializer
+from recipes.models import IngredientInRecipe, Recipe, RecipeDocument
+
+
+RECIPE_FIELDS = RecipeReadSerializer.Meta.fields
+AUTHOR_FIELDS = UserSerializer.Meta.fields
+VIEWER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def reserve_documents(recipe_ids, database):
+    """
+    Строки документов для рецептов, которые еще существуют, и их
+    версии до чтения данных: {id: версия}.
+    """
+    existing = Recipe.objects.using(database).filter(
+        id__in=recipe_ids
+    ).values_list('id', flat=True)
+    try:
+        with transaction.atomic(using=database):
+            RecipeDocument.objects.using(database).bulk_create(
+                [
+                    RecipeDocument(recipe_id=recipe_id)
+                    for recipe_id in existing
+                ],
+                batch_size=RECIPE_DOCUMENT_CHUNK_SIZE,
+                ignore_conflicts=True,
+            )
+    except IntegrityError:
+        # Рецепт удален между выборкой и вставкой.
+        pass
+    return dict(
+        RecipeDocument.objects.using(database).filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'version')
+    )
+
+
+def store_documents(documents, versions, database):
+    """Сохраняет документы одним UPDATE там, где версия не изменилась."""
+    documents = {
+        recipe_id: document for recipe_id, document in documents.items()
+        if recipe_id in versions
+    }
+    if not documents:
+        return
+    condition = Q()
+    for recipe_id in documents:
+        condition |= Q(recipe_id=recipe_id, version=versions[recipe_id])
+    RecipeDocument.objects.using(database).filter(condition).update(
+        document=Case(
+            *(
+                When(
+                    recipe_id=recipe_id,
+                    then=Value(document, output_field=JSONField()),
+                )
+                for recipe_id, document in documents.items()
+            ),
+            output_field=JSONField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def render_documents(recipe_ids, database):
+    """Документы рецептов по данным БД database без сохранения."""
+    recipes = list(
+        Recipe.objects.using(database)
+        .filter(id__in=recipe_ids)
+        .select_related('author')
+        .prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+    )
+    for recipe in recipes:
+        recipe.author.is_subscribed = False
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+    documents = {}
+    for data in RecipeReadSerializer(recipes, many=True, context={}).data:
+        document = {
+            field: value for field, value in data.items()
+            if field not in VIEWER_FIELDS
+        }
+        document['author'] = {
+            field: value for field, value in data['author'].items()
+            if field != 'is_subscribed'
+        }
+        documents[data['id']] = document
+    return documents
+
+
+def build_documents(recipe_ids):
+    """Собирает и сохраняет документы рецептов; возвращает {id: документ}."""
+    database = router.db_for_write(RecipeDocument)
+    versions = reserve_documents(recipe_ids, database)
+    documents = render_documents(recipe_ids, database)
+    built = list(documents)
+    for start in range(0, len(built), RECIPE_DOCUMENT_CHUNK_SIZE):
+        chunk = built[start:start + RECIPE_DOCUMENT_CHUNK_SIZE]
+        store_documents(
+            {recipe_id: documents[recipe_id] for recipe_id in chunk},
+            versions,
+            database,
+        )
+    return documents
+
+
+def build_on_commit(recipe_id):
+    """Собирает документ рецепта после коммита текущей транзакции."""
+    transaction.on_commit(lambda: build_documents([recipe_id]))
+
+
+def stores_on_read(database):
+    """Сохранять ли собранные при чтении документы (см. описание модуля)."""
+    return (
+        database == DEFAULT_DB_ALIAS
+        and connections[database].vendor != 'sqlite'
+    )
+
+
+def get_documents(recipe_ids):
+    """Документы рецептов по id, недостающие собираются."""
+    database = router.db_for_read(RecipeDocument)
+    documents = dict(
+        RecipeDocument.objects.using(database).filter(
+            recipe_id__in=recipe_ids, document__isnull=False
+        ).values_list('recipe_id', 'document')
+    )
+    missing = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in documents
+    ]
+    if not missing:
+        return documents
+    if stores_on_read(database):
+        documents.update(build_documents(missing))
+    else:
+        documents.update(render_documents(missing, database))
+    return documents
+
+
+def _absolute(request, url):
+    return request.build_absolute_uri(url) if url else url
+
+
+def _author(request, document, is_subscribed):
+    author = {}
+    for field in AUTHOR_FIELDS:
+        if field == 'is_subscribed':
+            author[field] = is_subscribed
+        elif field == 'avatar':
+            author[field] = _absolute(request, document[field])
+        else:
+            author[field] = document[field]
+    return author
+
+
+def render_recipes(recipes, request):
+    """
+    Ответ RecipeReadSerializer для рецептов из готовых документов.
+    Флаги пользователя берутся из аннотаций queryset рецептов.
+    """
+    fields = [
+        field for field in RECIPE_FIELDS
+        if field in requested_fields(request, RECIPE_FIELDS)
+    ]
+    documents = get_documents([recipe.id for recipe in recipes])
+    result = []
+    for recipe in recipes:
+        document = documents.get(recipe.id)
+        if document is None:
+            # Рецепт удален между выборкой страницы и сборкой документа.
+            continue
+        data = {}
+        for field in fields:
+            if field in VIEWER_FIELDS:
+                data[field] = getattr(recipe, field, False)
+            elif field == 'author':
+                data[field] = _author(
+                    request,
+                    document[field],
+                    getattr(recipe, 'author_is_subscribed', False),
+                )
+            elif field == 'image':
+                data[field] = _absolute(request, document[field])
+            else:
+                data[field] = document[field]
+        result.append(data)
+    return result
@@ -1,6 +1,8 @@
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.tag_masks import filter_by_tags
 
 
 class IngredientFilter(FilterSet):
@@ -18,7 +20,8 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
-        label='Tags'
+        label='Tags',
+        method='get_tags',
     )
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited',
@@ -26,6 +29,10 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'trending'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
@@ -34,8 +41,14 @@ class RecipeFilter(FilterSet):
             'tags',
             'is_favorited',
             'is_in_shopping_cart',
+            'ordering',
         )
 
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return filter_by_tags(queryset, [tag.id for tag in value])
+
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
@@ -47,3 +60,12 @@ class RecipeFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(in_shopping_cart__user=user)
         return queryset
+
+    def get_ordering(self, queryset, name, value):
+        if value == 'trending':
+            return queryset.order_by(
+                F('trending__score').desc(nulls_last=True),
+                '-created_at',
+                '-id',
+            )
+        return queryset
@@ -0,0 +1,195 @@
+"""
+Нечеткий поиск ингредиентов по триграммам: опечатки («картофил») и
+другой порядок слов («варенье абрикосовое») не мешают найти
+ингредиент. Триграммы слов строятся как в pg_trgm. Подходят
+названия, в которых найдено не меньше FUZZY_THRESHOLD триграмм
+запроса; сходство - среднее этой доли и сходства названий целиком,
+так что при равной доле выше короткие названия.
+
+В PostgreSQL кандидатов отбирает оператор %> по GIN-индексу
+gin_trgm_ops, время запроса ограничено FUZZY_TIMEOUT_MS. В остальных
+БД используется индекс триграмм в памяти процесса, который
+пересобирается при смене версии справочника ингредиентов и не реже
+CATALOG_CACHE_TIMEOUT. Итоговый порядок - по сходству с поправкой на
+число рецептов с ингредиентом.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import (
+    TrigramSimilarity,
+    TrigramWordSimilarity,
+)
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Count, F
+
+from api.catalog import catalog_version
+from api.constants import (
+    FUZZY_CANDIDATES,
+    FUZZY_LIMIT,
+    FUZZY_THRESHOLD,
+    FUZZY_TIMEOUT_MS,
+    FUZZY_USAGE_WEIGHT,
+    ING_NAME_LENGTH,
+)
+from recipes.models import Ingredient, IngredientInRecipe
+
+
+logger = logging.getLogger(__name__)
+
+CATALOG_NAME = 'ingredients'
+
+_WORD = re.compile(r'[^\W_]+')
+_index = None
+_lock = threading.Lock()
+
+
+def trigrams(text):
+    """Триграммы слов текста, как в pg_trgm: '  к', ' ка', 'кар'..."""
+    result = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f'  {word} '
+        result.update(
+            padded[start:start + 3] for start in range(len(padded) - 2)
+        )
+    return result
+
+
+def similarity(query_trigrams, name_trigrams):
+    """Доля триграмм запроса в названии и сходство с названием."""
+    shared = len(query_trigrams & name_trigrams)
+    word_score = shared / len(query_trigrams)
+    return word_score, (
+        word_score + shared / len(query_trigrams | name_trigrams)
+    ) / 2
+
+
+def rank(score, uses):
+    """Сходство с поправкой на популярность ингредиента."""
+    return score * (1 + FUZZY_USAGE_WEIGHT * math.log1p(uses))
+
+
+def usage_counts(ingredients=None, using=None):
+    """Число рецептов с каждым ингредиентом: {id: число}."""
+    queryset = IngredientInRecipe.objects.using(using)
+    if ingredients is not None:
+        queryset = queryset.filter(ingredient__in=ingredients)
+    return dict(
+        queryset.order_by().values('ingredient_id').annotate(
+            uses=Count('id')
+        ).values_list('ingredient_id', 'uses')
+    )
+
+
+class TrigramIndex:
+    """Индекс триграмм названий ингредиентов в памяти процесса."""
+
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.ingredients = list(Ingredient.objects.all())
+        uses = usage_counts()
+        self.uses = [
+            uses.get(ingredient.id, 0) for ingredient in self.ingredients
+        ]
+        self.trigrams = [
+            frozenset(trigrams(ingredient.name))
+            for ingredient in self.ingredients
+        ]
+        self.postings = {}
+        for position, name_trigrams in enumerate(self.trigrams):
+            for trigram in name_trigrams:
+                self.postings.setdefault(trigram, []).append(position)
+
+    def is_fresh(self, version):
+        return (
+            self.version == version
+            and time.monotonic() - self.built_at
+            < settings.CATALOG_CACHE_TIMEOUT
+        )
+
+    def search(self, query_trigrams, limit):
+        """
+        Название с долей триграмм запроса не ниже FUZZY_THRESHOLD обязано
+        содержать одну из самых редких триграмм запроса, поэтому
+        кандидаты берутся только из их списков, а точно сравниваются
+        не более FUZZY_CANDIDATES из них.
+        """
+        postings = sorted(
+            (self.postings.get(trigram, ()) for trigram in query_trigrams),
+            key=len,
+        )
+        needed = math.ceil(FUZZY_THRESHOLD * len(query_trigrams))
+        hits = Counter()
+        for positions in postings[:len(postings) - needed + 1]:
+            hits.update(positions)
+        ranked = []
+        for position, _ in hits.most_common(FUZZY_CANDIDATES):
+            word_score, score = similarity(
+                query_trigrams, self.trigrams[position]
+            )
+            if word_score >= FUZZY_THRESHOLD:
+                ranked.append(
+                    (-rank(score, self.uses[position]), position)
+                )
+        ranked.sort()
+        return [self.ingredients[position] for _, position in ranked[:limit]]
+
+
+def get_index():
+    """Индекс текущей версии справочника, пересобирается при смене."""
+    global _index
+    version = catalog_version(CATALOG_NAME)
+    index = _index
+    if index is not None and index.is_fresh(version):
+        return index
+    with _lock:
+        if _index is None or not _index.is_fresh(version):
+            _index = TrigramIndex(version)
+        return _index
+
+
+def _search_postgresql(query, limit, database):
+    with transaction.atomic(using=database):
+        with connections[database].cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s,"
+                " true), set_config('statement_timeout', %s, true)",
+                [str(FUZZY_THRESHOLD), str(FUZZY_TIMEOUT_MS)],
+            )
+        candidates = list(
+            Ingredient.objects.using(database)
+            .filter(TrigramWordSimilar(F('name'), query))
+            .annotate(similarity=(
+                TrigramSimilarity('name', query)
+                + TrigramWordSimilarity(query, 'name')
+            ) / 2)
+            .order_by('-similarity', 'name')[:FUZZY_CANDIDATES]
+        )
+        uses = usage_counts(candidates, using=database)
+    candidates.sort(key=lambda ingredient: -rank(
+        ingredient.similarity, uses.get(ingredient.id, 0)
+    ))
+    return candidates[:limit]
+
+
+def search_ingredients(query, limit=FUZZY_LIMIT):
+    """Ингредиенты, похожие на query, лучшие первыми."""
+    query = query[:ING_NAME_LENGTH]
+    query_trigrams = trigrams(query)
+    if not query_trigrams:
+        return []
+    database = router.db_for_read(Ingredient)
+    if connections[database].vendor != 'postgresql':
+        return get_index().search(query_trigrams, limit)
+    try:
+        return _search_postgresql(query, limit, database)
+    except DatabaseError:
+        logger.warning('Fuzzy ingredient search failed', exc_info=True)
+        return []
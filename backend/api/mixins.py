@@ -0,0 +1,61 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+from api.catalog import catalog_response, get_catalog_document
+
+
+def _split_param(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def requested_fields(request, fields):
+    """Поля ответа с учетом параметров ?fields= и ?omit=."""
+    fields = set(fields)
+    if request is None:
+        return fields
+    selected = _split_param(request.query_params.get('fields'))
+    omitted = _split_param(request.query_params.get('omit'))
+    if selected:
+        fields &= selected
+    return fields - omitted
+
+
+class SparseFieldsMixin:
+    """
+    Урезает набор полей сериализатора верхнего уровня
+    по параметрам запроса ?fields= и ?omit=.
+    """
+
+    def _is_top_level(self):
+        parent = self.parent
+        return parent is None or (
+            isinstance(parent, ListSerializer) and parent.parent is None
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_top_level():
+            return fields
+        keep = requested_fields(self.context.get('request'), fields)
+        return {
+            name: field for name, field in fields.items() if name in keep
+        }
+
+
+class PrecompressedListMixin:
+    """
+    Отдает список без фильтров готовым документом из памяти,
+    сжатым один раз на версию справочника catalog_name.
+    """
+
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        document = get_catalog_document(self.catalog_name, self.render_catalog)
+        return catalog_response(request, document)
+
+    def render_catalog(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
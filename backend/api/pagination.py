@@ -1,8 +1,118 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from api.constants import PAGE_COUNT_CACHE_TIMEOUT, PAGE_SIZE
+from foodgram.paginators import estimated_count
+
+
+COUNT_CACHE_KEY = 'page-count:{}:{}'
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Пагинатор с неточным числом объектов. Для выборки без фильтров
+    в PostgreSQL берется оценка планировщика, для остальных - COUNT(*),
+    закешированный на PAGE_COUNT_CACHE_TIMEOUT секунд. Ключ кеша -
+    хеш SQL запроса подсчета, поэтому одинаковые фильтры в любом
+    порядке параметров попадают в одну запись.
+    """
+
+    count_exact = False
+
+    @cached_property
+    def cache_key(self):
+        query = self.object_list.order_by().values('pk').query
+        sql, params = query.sql_with_params()
+        digest = hashlib.sha1(f'{sql}|{params!r}'.encode()).hexdigest()
+        return COUNT_CACHE_KEY.format(
+            self.object_list.model._meta.label_lower, digest
+        )
 
-from api.constants import PAGE_SIZE
+    @cached_property
+    def count(self):
+        count = cache.get(self.cache_key)
+        if count is not None:
+            return count
+        count = estimated_count(self.object_list)
+        if count is not None and count >= settings.ESTIMATED_COUNT_MIN:
+            return count
+        return self.exact_count()
+
+    def exact_count(self):
+        self.count_exact = True
+        count = self.object_list.count()
+        cache.set(self.cache_key, count, PAGE_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def set_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+
+    def page(self, number):
+        self.count  # Заодно выставляет count_exact.
+        if self.count_exact:
+            return super().page(number)
+        try:
+            number = self.validate_number(number)
+        except EmptyPage:
+            # Устаревшее число могло оказаться меньше настоящего.
+            self.set_count(self.exact_count())
+            return super().page(number)
+        # Срез не обрезается по неточному числу: иначе новые объекты
+        # не попали бы на страницу до истечения кеша.
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def correct_count(self, page, size):
+        """
+        Уточняет число по фактически полученной странице: неполная
+        непустая страница однозначно задает общее количество.
+        """
+        start = (page.number - 1) * self.per_page
+        if size < self.per_page and (size or page.number == 1):
+            count = start + size
+            if count != self.count or not self.count_exact:
+                cache.set(self.cache_key, count, PAGE_COUNT_CACHE_TIMEOUT)
+            self.count_exact = True
+        elif self.count < start + size:
+            count = start + size
+        else:
+            return
+        self.set_count(count)
 
 
 class SpecificPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+    django_paginator_class = ApproximateCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        results = super().paginate_queryset(queryset, request, view)
+        if results is not None:
+            self.page.paginator.correct_count(self.page, len(results))
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.page.paginator.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
@@ -2,12 +2,20 @@ import base64
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.db.models import Count, F
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField  # noqa: F811
 from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
 
+from api.constants import (
+    BATCH_MAX_SIZE,
+    UPLOAD_MAX_SIZE,
+    VALIDATE_MSG_UPLOAD,
+)
+from api.mixins import SparseFieldsMixin
+from api.uploads import UPLOAD_TOKEN_PREFIX, claim_upload
+from recipes import outbox
+from recipes.documents import invalidate_documents
 from recipes.models import (
     Ingredient,
     IngredientInRecipe,
@@ -16,18 +24,26 @@ from recipes.models import (
     ShoppingCart,
     Tag
 )
+from recipes.similarity import index_recipe
 from users.constants import LONG_TEXT
-from users.models import Subscription
 
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):  # noqa: F811
-    """Для обработки изображений, преобразует строку base64 в файл."""
+    """
+    Для обработки изображений, преобразует строку base64 в файл.
+    Принимает и токен 'upload:<id>' завершенной загрузки /api/uploads/.
+    """
 
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
+        if isinstance(data, str) and data.startswith(UPLOAD_TOKEN_PREFIX):
+            request = self.context.get('request')
+            data = request and claim_upload(data, request.user)
+            if data is None:
+                raise serializers.ValidationError(VALIDATE_MSG_UPLOAD)
+        elif isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
@@ -54,7 +70,7 @@ class UserCreateSerializer(UserCreateSerializer):
         ]
 
 
-class UserSerializer(UserSerializer):
+class UserSerializer(SparseFieldsMixin, UserSerializer):
     """
     Сериализатор для отображения информации
     о пользователе с проверкой подписки.
@@ -78,6 +94,8 @@ class UserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """Проверка наличия подписки."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (
             not request.user.is_anonymous
@@ -146,35 +164,42 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для создания подписки на пользователя с валидацией."""
+class BatchIdsSerializer(serializers.Serializer):
+    """Список id для пакетного добавления или удаления."""
 
-    class Meta:
-        model = Subscription
-        fields = ('subscribed_to', 'user')
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_MAX_SIZE,
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class UploadSerializer(serializers.Serializer):
+    """Файл целиком или размер для загрузки частями."""
+
+    file = serializers.FileField(required=False)
+    size = serializers.IntegerField(
+        required=False, min_value=1, max_value=UPLOAD_MAX_SIZE
+    )
+    name = serializers.CharField(required=False, default='')
+
+    def validate_file(self, value):
+        if value.size > UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Размер файла не должен превышать {UPLOAD_MAX_SIZE} байт.'
+            )
+        return value
 
     def validate(self, data):
-        request = self.context['request']
-        user = request.user
-        subscribed_to = data['subscribed_to']
-        if user == subscribed_to:
-            raise ValidationError('Невозможно подписаться на себя!')
-        if user.subscriptions.filter(subscribed_to=subscribed_to).exists():
+        if 'file' not in data and 'size' not in data:
             raise serializers.ValidationError(
-                'Вы уже подписаны на этого пользователя!'
+                'Передайте файл или размер загрузки.'
             )
         return data
 
-    def to_representation(self, instance):
-
-        author_annotated = User.objects.annotate(
-            recipes_count=Count('recipes')
-        ).filter(id=instance.subscribed_to.id).first()
-        return FollowReadSerializer(
-            author_annotated,
-            context=self.context
-        ).data
-
 
 class FollowReadSerializer(UserSerializer):
     """Для подписок с информацией о пользователе и его рецептах."""
@@ -321,6 +346,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'tags': tags
         }
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта с ингредиентами и тегами."""
         ingredients = validated_data.pop('ingredients')
@@ -331,20 +357,101 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         self._create_recipe_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        index_recipe(
+            recipe.id, [ingredient['id'] for ingredient in ingredients]
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновление рецепта с очисткой старых ингредиентов и тегов."""
+        """
+        Обновление рецепта по разнице со старым состоянием: меняются
+        только измененные поля, ингредиенты и теги. Что именно изменилось,
+        сохраняется в self.changes.
+        """
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        instance.tags.clear()
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if field == 'image' or getattr(instance, field) != value
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+        self.changes = {
+            'fields': changed_fields,
+            'ingredients': self._update_recipe_ingredients(
+                ingredients, instance
+            ),
+            'tags': self._update_recipe_tags(tags, instance),
+        }
+        if any(self.changes['ingredients'].values()):
+            # bulk-операции с ингредиентами не шлют сигналов.
+            invalidate_documents(recipe_id=instance.id)
+            index_recipe(
+                instance.id,
+                [ingredient['id'] for ingredient in ingredients]
+            )
+        return instance
 
-        self._create_recipe_ingredients(ingredients, instance)
-        instance.tags.set(tags)
+    @classmethod
+    def _update_recipe_ingredients(cls, ingredients, recipe):
+        """
+        Добавляет новые, обновляет количество измененных и удаляет
+        убранные ингредиенты рецепта.
+        """
+        amounts = {
+            int(ingredient['id']): int(ingredient['amount'])
+            for ingredient in ingredients
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        created = [
+            IngredientInRecipe(
+                ingredient_id=ingredient_id,
+                recipe=recipe,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        updated = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                updated.append(recipe_ingredient)
+        deleted = [
+            ingredient_id for ingredient_id in current
+            if ingredient_id not in amounts
+        ]
+        if created:
+            IngredientInRecipe.objects.bulk_create(created)
+            cls._record_ingredients(created, outbox.ACTION_ADD)
+        if updated:
+            IngredientInRecipe.objects.bulk_update(updated, ['amount'])
+            cls._record_ingredients(updated, outbox.ACTION_UPDATE)
+        if deleted:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=deleted
+            ).delete()
+        return {
+            'created': [item.ingredient_id for item in created],
+            'updated': [item.ingredient_id for item in updated],
+            'deleted': deleted,
+        }
 
-        return super().update(instance, validated_data)
+    @staticmethod
+    def _update_recipe_tags(tags, recipe):
+        """Перезаписывает теги, только если набор изменился."""
+        tag_ids = {int(tag) for tag in tags}
+        if {tag.id for tag in recipe.tags.all()} == tag_ids:
+            return False
+        recipe.tags.set(tag_ids)
+        return True
 
     def _create_recipe_ingredients(self, ingredients, recipe):
         """Создание связей рецепта с ингредиентами."""
@@ -357,6 +464,23 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             for ingredient in ingredients
         ]
         IngredientInRecipe.objects.bulk_create(recipe_ingredients)
+        self._record_ingredients(recipe_ingredients, outbox.ACTION_ADD)
+
+    @staticmethod
+    def _record_ingredients(recipe_ingredients, action):
+        """bulk_create и bulk_update не шлют сигналов: события пишутся тут."""
+        outbox.record_many(
+            outbox.TOPIC_RECIPE_INGREDIENTS,
+            action,
+            [
+                (
+                    item.recipe_id,
+                    {'ingredient': int(item.ingredient_id),
+                     'amount': int(item.amount)},
+                )
+                for item in recipe_ingredients
+            ],
+        )
 
     def to_representation(self, instance):
         """Возвращает данные через сериализатор для чтения."""
@@ -366,7 +490,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ).data
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для чтения рецепта с дополнительными полями."""
 
     author = UserSerializer(read_only=True)
@@ -391,14 +515,31 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
         read_only_fields = fields
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_ingredients(self, obj):
         """Возвращает список ингредиентов с их количеством."""
-        return obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('in_recipes__amount'),
-        )
+        recipe_ingredients = obj.recipe_ingredients.all()
+        if 'recipe_ingredients' not in getattr(
+            obj, '_prefetched_objects_cache', {}
+        ):
+            recipe_ingredients = recipe_ingredients.select_related(
+                'ingredient'
+            )
+        return [
+            {
+                'id': recipe_ingredient.ingredient.id,
+                'name': recipe_ingredient.ingredient.name,
+                'measurement_unit': (
+                    recipe_ingredient.ingredient.measurement_unit
+                ),
+                'amount': recipe_ingredient.amount,
+            }
+            for recipe_ingredient in recipe_ingredients
+        ]
 
     def _check_user_status(self, obj, model_class):
         """Проверяет, связан ли рецепт с пользователем"""
@@ -413,8 +554,12 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Проверяет, находится ли рецепт в избранном у пользователя."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return self._check_user_status(obj, Favorite)
 
     def get_is_in_shopping_cart(self, obj):
         """Проверяет, находится ли рецепт в корзине у пользователя."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return self._check_user_status(obj, ShoppingCart)
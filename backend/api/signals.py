@@ -0,0 +1,288 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from api.catalog import bump_catalog_version
+from recipes import outbox, short_links, trending
+from recipes.documents import invalidate_documents
+from recipes.media import delete_on_commit, stored_name
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from recipes.tag_masks import clear_tag_bit, sync_tag_masks
+from users.models import Subscription, User
+from users.profile_cache import PROFILE_FIELDS
+
+
+TAG_ACTIONS = {
+    'post_add': outbox.ACTION_ADD,
+    'post_remove': outbox.ACTION_REMOVE,
+}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_catalog_changed(sender, **kwargs):
+    bump_catalog_version('ingredients')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_catalog_changed(sender, **kwargs):
+    bump_catalog_version('tags')
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    short_links.forget(instance.id)
+    outbox.record(
+        outbox.TOPIC_RECIPE, instance.pk, outbox.ACTION_DELETE,
+        author=instance.author_id,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        recipe_id = instance.pk
+        transaction.on_commit(lambda: short_links.forget(recipe_id))
+    outbox.record(
+        outbox.TOPIC_RECIPE,
+        instance.pk,
+        outbox.ACTION_CREATE if created else outbox.ACTION_UPDATE,
+        author=instance.author_id,
+        fields=sorted(update_fields) if update_fields else None,
+    )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_saved(sender, instance, created, **kwargs):
+    outbox.record(
+        outbox.TOPIC_RECIPE_INGREDIENTS,
+        instance.recipe_id,
+        outbox.ACTION_ADD if created else outbox.ACTION_UPDATE,
+        ingredient=instance.ingredient_id,
+        amount=instance.amount,
+    )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    outbox.record(
+        outbox.TOPIC_RECIPE_INGREDIENTS,
+        instance.recipe_id,
+        outbox.ACTION_REMOVE,
+        ingredient=instance.ingredient_id,
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_added(sender, instance, created, **kwargs):
+    if created:
+        outbox.record(
+            outbox.RELATION_TOPICS[sender],
+            instance.recipe_id,
+            outbox.ACTION_ADD,
+            user=instance.user_id,
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_removed(sender, instance, **kwargs):
+    outbox.record(
+        outbox.RELATION_TOPICS[sender],
+        instance.recipe_id,
+        outbox.ACTION_REMOVE,
+        user=instance.user_id,
+    )
+    trending.retract(sender, instance)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_added(sender, instance, created, **kwargs):
+    if created:
+        outbox.record(
+            outbox.TOPIC_SUBSCRIPTION,
+            instance.subscribed_to_id,
+            outbox.ACTION_ADD,
+            user=instance.user_id,
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_removed(sender, instance, **kwargs):
+    outbox.record(
+        outbox.TOPIC_SUBSCRIPTION,
+        instance.subscribed_to_id,
+        outbox.ACTION_REMOVE,
+        user=instance.user_id,
+    )
+
+
+@receiver(post_init, sender=User)
+def remember_avatar(sender, instance, **kwargs):
+    instance._saved_avatar = stored_name(instance, 'avatar')
+
+
+@receiver(post_save, sender=User)
+def avatar_changed(sender, instance, **kwargs):
+    """Старый файл аватара удаляется после фиксации транзакции."""
+    avatar = stored_name(instance, 'avatar')
+    if avatar is None or avatar == instance._saved_avatar:
+        return
+    delete_on_commit(instance._saved_avatar)
+    instance._saved_avatar = avatar
+    outbox.record(
+        outbox.TOPIC_USER_AVATAR, instance.pk, outbox.ACTION_UPDATE,
+        avatar=avatar,
+    )
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    instance._saved_image = stored_name(instance, 'image')
+
+
+@receiver(post_save, sender=Recipe)
+def image_changed(sender, instance, **kwargs):
+    """Старое изображение рецепта удаляется после фиксации транзакции."""
+    image = stored_name(instance, 'image')
+    if image is None or image == instance._saved_image:
+        return
+    delete_on_commit(instance._saved_image)
+    instance._saved_image = image
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def media_owner_deleted(sender, instance, **kwargs):
+    delete_on_commit(
+        stored_name(instance, 'image' if sender is Recipe else 'avatar')
+    )
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    """Связи с рецептами удаляются каскадом без m2m_changed."""
+    outbox.record_many(
+        outbox.TOPIC_RECIPE_TAGS,
+        outbox.ACTION_REMOVE,
+        [
+            (recipe_id, {'tags': [instance.pk]})
+            for recipe_id in instance.recipes.values_list('id', flat=True)
+        ],
+    )
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    clear_tag_bit(instance.id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Поддерживает Recipe.tag_mask в согласии с recipe.tags."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.tag_mask = sync_tag_masks([instance.pk])[instance.pk]
+    elif action == 'post_clear':
+        clear_tag_bit(instance.pk)
+    elif pk_set:
+        sync_tag_masks(pk_set)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_recorded(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """Пишет изменения тегов рецептов в журнал изменений."""
+    if action in TAG_ACTIONS and not pk_set:
+        return
+    if not reverse:
+        if action in TAG_ACTIONS:
+            outbox.record(
+                outbox.TOPIC_RECIPE_TAGS, instance.pk, TAG_ACTIONS[action],
+                tags=sorted(pk_set),
+            )
+        elif action == 'post_clear':
+            outbox.record(
+                outbox.TOPIC_RECIPE_TAGS, instance.pk, outbox.ACTION_CLEAR,
+                tags=[],
+            )
+        return
+    if action in TAG_ACTIONS:
+        recipe_ids, recipe_action = pk_set, TAG_ACTIONS[action]
+    elif action == 'pre_clear':
+        recipe_ids = instance.recipes.values_list('id', flat=True)
+        recipe_action = outbox.ACTION_REMOVE
+    else:
+        return
+    outbox.record_many(
+        outbox.TOPIC_RECIPE_TAGS,
+        recipe_action,
+        [(recipe_id, {'tags': [instance.pk]}) for recipe_id in recipe_ids],
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_document_changed(sender, instance, created=False, **kwargs):
+    if sender is Recipe:
+        if not created:
+            invalidate_documents(recipe_id=instance.pk)
+    else:
+        invalidate_documents(recipe_id=instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_document_tags_changed(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            invalidate_documents(recipe_id=instance.pk)
+    elif action == 'pre_clear':
+        invalidate_documents(recipe__tags=instance.pk)
+    elif pk_set:
+        invalidate_documents(recipe_id__in=list(pk_set))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_documents_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_documents(recipe__tags=instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_documents_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_documents(
+            recipe__recipe_ingredients__ingredient=instance.pk
+        )
+
+
+@receiver(post_save, sender=User)
+def author_documents_changed(sender, instance, created, update_fields,
+                             **kwargs):
+    """Вход пользователя обновляет только last_login: документы не нужны."""
+    if created or (
+        update_fields and not set(update_fields) & set(PROFILE_FIELDS)
+    ):
+        return
+    invalidate_documents(recipe__author=instance.pk)
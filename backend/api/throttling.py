@@ -0,0 +1,173 @@
+"""
+Ограничение дорогих действий «ведром токенов». Ведра лежат в отдельном
+файле SQLite (THROTTLE_DB_PATH), общем для воркеров хоста: токен
+списывается в транзакции BEGIN IMMEDIATE, поэтому воркеры не затирают
+изменения друг друга, а ведра, в отличие от записей кеша, не
+вытесняются. Полные ведра удаляются не чаще раза в
+THROTTLE_PRUNE_INTERVAL секунд.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from api.constants import THROTTLE_DB_TIMEOUT, THROTTLE_PRUNE_INTERVAL
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, '
+    'tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS bucket_full_at ON bucket (full_at)',
+    'CREATE TABLE IF NOT EXISTS rejected (scope TEXT PRIMARY KEY, '
+    'count INTEGER NOT NULL)',
+)
+
+_local = threading.local()
+
+
+def _connection():
+    """Соединение потока с файлом ведер; после fork открывается заново."""
+    if getattr(_local, 'pid', None) != os.getpid():
+        connection = sqlite3.connect(
+            settings.THROTTLE_DB_PATH,
+            timeout=THROTTLE_DB_TIMEOUT,
+            isolation_level=None,
+        )
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        for statement in SCHEMA:
+            connection.execute(statement)
+        _local.connection = connection
+        _local.pid = os.getpid()
+        _local.pruned_at = 0
+    return _local.connection
+
+
+@contextmanager
+def _immediate():
+    connection = _connection()
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def take_token(scope, ident, capacity, duration):
+    """
+    Списывает токен из ведра; возвращает 0 или число секунд до
+    появления следующего токена. Отказ засчитывается области.
+    """
+    now = time.time()
+    rate = capacity / duration
+    key = f'{scope}:{ident}'
+    with _immediate() as connection:
+        row = connection.execute(
+            'SELECT tokens, updated_at FROM bucket WHERE key = ?', (key,)
+        ).fetchone()
+        tokens = capacity
+        if row is not None:
+            tokens = min(capacity, row[0] + (now - row[1]) * rate)
+        if tokens < 1:
+            connection.execute(
+                'INSERT INTO rejected VALUES (?, 1) ON CONFLICT (scope) '
+                'DO UPDATE SET count = count + 1',
+                (scope,),
+            )
+            return (1 - tokens) / rate
+        tokens -= 1
+        connection.execute(
+            'INSERT OR REPLACE INTO bucket VALUES (?, ?, ?, ?)',
+            (key, tokens, now, now + (capacity - tokens) / rate),
+        )
+        if now - _local.pruned_at >= THROTTLE_PRUNE_INTERVAL:
+            connection.execute(
+                'DELETE FROM bucket WHERE full_at < ?', (now,)
+            )
+            _local.pruned_at = now
+    return 0
+
+
+def rejected_counts():
+    """Число отказов по областям с момента создания файла ведер."""
+    return dict(
+        _connection().execute('SELECT scope, count FROM rejected')
+    )
+
+
+def get_view_scope(view):
+    """Область ограничения для действия из THROTTLE_SCOPES."""
+    action = getattr(view, 'action', None)
+    basename = getattr(view, 'basename', None)
+    return settings.THROTTLE_SCOPES.get(f'{basename}.{action}')
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Ведро вмещает num_requests токенов и равномерно пополняется за
+    duration секунд. По умолчанию ведро заводится на IP-адрес клиента
+    (за прокси - из X-Forwarded-For с учетом NUM_PROXIES).
+    """
+
+    scope_suffix = ''
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_ident_key(self, request):
+        return f'ip-{self.get_ident(request)}'
+
+    def get_cache_key(self, request, view):
+        return self.get_ident_key(request)
+
+    def allow_request(self, request, view):
+        scope = get_view_scope(view)
+        if scope is None:
+            return True
+        self.scope = scope + self.scope_suffix
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        capacity, duration = self.parse_rate(self.rate)
+        ident = self.get_cache_key(request, view)
+        try:
+            self.wait_seconds = take_token(
+                self.scope, ident, capacity, duration
+            )
+        except sqlite3.Error:
+            logger.exception('Throttle store is unavailable')
+            return True
+        if not self.wait_seconds:
+            return True
+        logger.warning(
+            'Throttled %s %s (scope %s, ident %s)',
+            request.method, request.path, self.scope, ident
+        )
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Ведро на пользователя, для анонимов - на IP."""
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return super().get_ident_key(request)
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Ведро на IP-адрес независимо от пользователя (scope + '_ip')."""
+
+    scope_suffix = '_ip'
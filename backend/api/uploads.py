@@ -0,0 +1,212 @@
+"""
+Загрузка изображений отдельно от JSON рецепта или аватара. Файл
+пишется во временный каталог UPLOAD_TEMP_DIR целиком (multipart) или
+частями с Content-Range, так что прерванную загрузку можно продолжить
+с последнего принятого байта. Рядом лежит JSON с владельцем и ожидаемым
+размером. Завершенная загрузка передается в сериализаторы строкой
+'upload:<id>' вместо base64; расширение имени файла при этом берется
+из содержимого, так как имя в запросе необязательно.
+"""
+import fcntl
+import json
+import os
+import re
+import secrets
+import shutil
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+
+from api.constants import UPLOAD_CLEANUP_INTERVAL, UPLOAD_READ_SIZE
+
+
+UPLOAD_TOKEN_PREFIX = 'upload:'
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+UPLOAD_ID = re.compile(r'^[\w-]{32}$')
+
+_last_cleanup = 0.0
+
+
+class UploadConflict(Exception):
+    """Часть файла пришла не с того смещения, на котором стоит загрузка."""
+
+
+class StoredUpload(UploadedFile):
+    """
+    Завершенная загрузка как файл запроса. Дескриптор сразу не
+    открывается: FileSystemStorage переносит файл в media по
+    temporary_file_path() без чтения, проверка изображения тоже читает
+    по пути. Хранилище, которому нужно содержимое, вызывает open().
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(None, name=name, content_type=None, size=size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+    def open(self, mode='rb'):
+        if self.closed:
+            self.file = open(self.path, mode)
+        else:
+            self.seek(0)
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def _paths(upload_id):
+    base = os.path.join(settings.UPLOAD_TEMP_DIR, upload_id)
+    return f'{base}.part', f'{base}.json'
+
+
+def _clean_name(name):
+    return os.path.basename(name or '')[:100] or 'upload'
+
+
+def start_upload(user, size, name):
+    """Создает пустую загрузку ожидаемого размера."""
+    cleanup_stale_uploads()
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    upload_id = secrets.token_hex(16)
+    data_path, meta_path = _paths(upload_id)
+    open(data_path, 'wb').close()
+    with open(meta_path, 'w', encoding='utf-8') as file:
+        json.dump(
+            {'user': user.pk, 'size': size, 'name': _clean_name(name)}, file
+        )
+    return upload_id
+
+
+def save_uploaded_file(user, uploaded):
+    """Загрузка одним multipart-запросом: файл уже на диске у Django."""
+    upload_id = start_upload(user, uploaded.size, uploaded.name)
+    data_path, _ = _paths(upload_id)
+    if hasattr(uploaded, 'temporary_file_path'):
+        shutil.move(uploaded.temporary_file_path(), data_path)
+    else:
+        with open(data_path, 'wb') as file:
+            for chunk in uploaded.chunks():
+                file.write(chunk)
+    return upload_id
+
+
+def get_upload(upload_id, user):
+    """Описание загрузки пользователя или None."""
+    if not UPLOAD_ID.match(upload_id):
+        return None
+    data_path, meta_path = _paths(upload_id)
+    try:
+        with open(meta_path, encoding='utf-8') as file:
+            meta = json.load(file)
+        offset = os.path.getsize(data_path)
+    except (OSError, ValueError):
+        return None
+    if meta['user'] != user.pk:
+        return None
+    return {
+        'id': upload_id,
+        'token': UPLOAD_TOKEN_PREFIX + upload_id,
+        'name': meta['name'],
+        'size': meta['size'],
+        'offset': offset,
+        'complete': offset == meta['size'],
+    }
+
+
+def append_chunk(upload, stream, start, length):
+    """
+    Дописывает length байт из stream с позиции start, читая тело
+    запроса блоками, и возвращает новое смещение. Запись идет под
+    исключительной блокировкой файла, смещение перечитывается под ней:
+    две части с одного смещения не допишутся обе. Байты сверх
+    ожидаемого размера отрезаются.
+    """
+    data_path, _ = _paths(upload['id'])
+    with open(data_path, 'r+b') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        offset = os.fstat(file.fileno()).st_size
+        if offset > upload['size']:
+            file.truncate(upload['size'])
+            raise UploadConflict
+        if start != offset:
+            raise UploadConflict
+        file.seek(offset)
+        remaining = min(length, upload['size'] - start)
+        while remaining > 0:
+            chunk = stream.read(min(UPLOAD_READ_SIZE, remaining))
+            if not chunk:
+                break
+            file.write(chunk)
+            remaining -= len(chunk)
+        return file.tell()
+
+
+def delete_upload(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _image_name(path, name):
+    """Имя с расширением формата изображения, если оно не совпадает."""
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+    except (OSError, ValueError):
+        return name
+    extensions = [
+        extension
+        for extension, known in Image.registered_extensions().items()
+        if known == image_format
+    ]
+    stem, extension = os.path.splitext(name)
+    if not extensions or extension.lower() in extensions:
+        return name
+    preferred = f'.{image_format.lower()}'
+    if preferred not in extensions:
+        preferred = extensions[0]
+    return stem + preferred
+
+
+def claim_upload(token, user):
+    """Файл завершенной загрузки по токену 'upload:<id>' или None."""
+    upload = get_upload(token[len(UPLOAD_TOKEN_PREFIX):], user)
+    if upload is None or not upload['complete']:
+        return None
+    data_path, _ = _paths(upload['id'])
+    return StoredUpload(
+        data_path, _image_name(data_path, upload['name']), upload['size']
+    )
+
+
+def cleanup_stale_uploads():
+    """
+    Удаляет загрузки старше UPLOAD_TTL и описания, чьи файлы уже
+    перенесены в media. Выполняется не чаще UPLOAD_CLEANUP_INTERVAL.
+    """
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < UPLOAD_CLEANUP_INTERVAL:
+        return
+    _last_cleanup = now
+    try:
+        entries = list(os.scandir(settings.UPLOAD_TEMP_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        upload_id, _ = os.path.splitext(entry.name)
+        data_path, _ = _paths(upload_id)
+        try:
+            expired = now - entry.stat().st_mtime > settings.UPLOAD_TTL
+        except FileNotFoundError:
+            continue
+        if expired or not os.path.exists(data_path):
+            delete_upload(upload_id)
@@ -6,6 +6,7 @@ from api.views import (
     RecipeViewSet,
     short_url,
     TagViewSet,
+    UploadViewSet,
     UserViewSet
 )
 
@@ -19,6 +20,7 @@ router.register(
 )
 router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
+router.register(r'uploads', UploadViewSet, basename='uploads')
 
 urlpatterns = [
     path(
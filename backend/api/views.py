@@ -1,6 +1,9 @@
+import logging
+
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Sum, Value
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
@@ -10,23 +13,54 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.viewsets import (
+    ModelViewSet,
+    ReadOnlyModelViewSet,
+    ViewSet,
+)
 
+from api.constants import (
+    BATCH_CREATED,
+    BATCH_DELETED,
+    BATCH_EXISTS,
+    BATCH_MISSING,
+    BATCH_NOT_FOUND,
+    BATCH_SELF,
+    FUZZY_LIMIT,
+    FUZZY_MAX_LIMIT,
+    PAGE_SIZE,
+    RECIPE_FRONTEND_URL,
+    SIMILAR_MAX_LIMIT,
+)
+from api.documents import build_on_commit, render_recipes
 from api.filters import IngredientFilter, RecipeFilter
+from api.ingredient_search import search_ingredients
+from api.mixins import PrecompressedListMixin, requested_fields
 from api.pagination import SpecificPagination
 from api.permissions import IsAdminOrAuthorOrReadOnly
 from api.serializers import (
     AvatarSerializer,
+    BatchIdsSerializer,
     FavoriteSerializer,
-    FollowCreateSerializer,
     FollowReadSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
     RecipeReadSerializer,
     ShoppingCartSerializer,
+    ShortRecipeSerializer,
     TagSerializer,
+    UploadSerializer,
     UserSerializer
 )
+from api.uploads import (
+    CONTENT_RANGE,
+    UploadConflict,
+    append_chunk,
+    delete_upload,
+    get_upload,
+    save_uploaded_file,
+    start_upload,
+)
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -35,16 +69,30 @@ from recipes.models import (
     ShoppingCart,
     Tag,
 )
+from recipes import outbox, short_links
+from recipes.similarity import similar_recipes
 from users.models import Subscription
+from users.profile_cache import get_cached_user
 
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 
 @require_GET
 def short_url(request, pk):
-    url = reverse('recipes', args=[pk])
-    return redirect(url)
+    return redirect(RECIPE_FRONTEND_URL.format(pk))
+
+
+@require_GET
+def short_link_redirect(request, code):
+    """Переход по короткой ссылке без обращения к БД при попадании."""
+    recipe_id = short_links.decode(code)
+    if recipe_id is None or not short_links.recipe_exists(recipe_id):
+        raise Http404('Ссылка не найдена.')
+    short_links.count_hit(recipe_id)
+    return redirect(RECIPE_FRONTEND_URL.format(recipe_id))
 
 
 class UserViewSet(UserViewSet):
@@ -57,6 +105,37 @@ class UserViewSet(UserViewSet):
     serializer_class = UserSerializer
     pagination_class = SpecificPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (
+            self.action in ('list', 'retrieve')
+            and user.is_authenticated
+            and 'is_subscribed' in requested_fields(
+                self.request, UserSerializer.Meta.fields
+            )
+        ):
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, subscribed_to=OuterRef('pk')
+                )
+            ))
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        """Профиль берется из кеша, без запроса пользователя к БД."""
+        if self.action != 'retrieve':
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            user_id = int(self.kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+        user = get_cached_user(user_id)
+        if user is None:
+            raise Http404
+        self.check_object_permissions(request, user)
+        return Response(self.get_serializer(user).data)
+
     def get_permissions(self):
         if self.action == 'me':
             return [
@@ -74,15 +153,19 @@ class UserViewSet(UserViewSet):
         serializer = AvatarSerializer(
             instance=request.user,
             data=request.data,
+            context=self.get_serializer_context(),
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data)
 
     @avatar_put.mapping.delete
     def avatar_delete(self, request, *args, **kwargs):
         user = self.request.user
-        user.avatar.delete()
+        with transaction.atomic():
+            user.avatar = ''
+            user.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -93,21 +176,28 @@ class UserViewSet(UserViewSet):
     def subscribe(self, request, id):
         user = request.user
         if request.method == 'POST':
-            subscribed_to = get_object_or_404(User, id=id)
-            serializer = FollowCreateSerializer(
-                context={'request': request},
-                data={
-                    'subscribed_to': subscribed_to.id,
-                    'user': user.id
-                }
+            author = get_object_or_404(
+                User.objects.annotate(recipes_count=Count('recipes')),
+                id=id
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            author_annotated = User.objects.annotate(
-                recipes_count=Count('recipes')
-            ).filter(id=id).first()
+            if author == user:
+                return Response(
+                    {'detail': 'Невозможно подписаться на себя!'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                with transaction.atomic():
+                    Subscription.objects.create(
+                        user=user, subscribed_to=author
+                    )
+            except IntegrityError:
+                return Response(
+                    {'detail': 'Вы уже подписаны на этого пользователя!'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            author.is_subscribed = True
             serializer = FollowReadSerializer(
-                author_annotated,
+                author,
                 context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -120,6 +210,77 @@ class UserViewSet(UserViewSet):
             status=status.HTTP_404_NOT_FOUND
         )
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='subscribe',
+        url_name='subscribe-batch',
+    )
+    def subscribe_batch(self, request):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        results = []
+        if request.method == 'POST':
+            found = dict(
+                User.objects.filter(id__in=ids).annotate(
+                    is_subscribed=Exists(
+                        Subscription.objects.filter(
+                            user=user, subscribed_to=OuterRef('pk')
+                        )
+                    )
+                ).values_list('id', 'is_subscribed')
+            )
+            subscriptions = []
+            for author_id in ids:
+                if author_id not in found:
+                    result = BATCH_NOT_FOUND
+                elif author_id == user.id:
+                    result = BATCH_SELF
+                elif found[author_id]:
+                    result = BATCH_EXISTS
+                else:
+                    result = BATCH_CREATED
+                    subscriptions.append(
+                        Subscription(user=user, subscribed_to_id=author_id)
+                    )
+                results.append({'id': author_id, 'status': result})
+            with transaction.atomic():
+                Subscription.objects.bulk_create(
+                    subscriptions, ignore_conflicts=True
+                )
+                outbox.record_many(
+                    outbox.TOPIC_SUBSCRIPTION,
+                    outbox.ACTION_ADD,
+                    [
+                        (subscription.subscribed_to_id, {'user': user.id})
+                        for subscription in subscriptions
+                    ],
+                )
+            return Response(results, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            subscribed = set(
+                Subscription.objects.filter(
+                    user=user, subscribed_to_id__in=ids
+                ).values_list('subscribed_to_id', flat=True)
+            )
+            Subscription.objects.filter(
+                user=user, subscribed_to_id__in=subscribed
+            ).delete()
+        results = [
+            {
+                'id': author_id,
+                'status': (
+                    BATCH_DELETED if author_id in subscribed
+                    else BATCH_MISSING
+                ),
+            }
+            for author_id in ids
+        ]
+        return Response(results, status=status.HTTP_200_OK)
+
     @action(
         detail=False,
         methods=['GET'],
@@ -130,7 +291,8 @@ class UserViewSet(UserViewSet):
     def get_subscriptions(self, request):
         user = request.user
         queryset = User.objects.filter(subscribers__user=user).annotate(
-            recipes_count=Count('recipes')
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True),
         )
         pages = self.paginate_queryset(queryset)
         serializer = FollowReadSerializer(
@@ -139,9 +301,13 @@ class UserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
-    """Представление ингредиентов."""
+class IngredientViewSet(PrecompressedListMixin, ReadOnlyModelViewSet):
+    """
+    Представление ингредиентов. С ?fuzzy=true поиск по name
+    нечеткий: не более limit ингредиентов, лучшие первыми.
+    """
 
+    catalog_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
@@ -149,6 +315,21 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        fuzzy = request.query_params.get('fuzzy', '').lower()
+        if not name or fuzzy not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+        try:
+            limit = int(request.query_params.get('limit', FUZZY_LIMIT))
+        except ValueError:
+            limit = FUZZY_LIMIT
+        serializer = self.get_serializer(
+            search_ingredients(name, max(1, min(limit, FUZZY_MAX_LIMIT))),
+            many=True,
+        )
+        return Response(serializer.data)
+
 
 class RecipeViewSet(ModelViewSet):
     """Представление рецептов."""
@@ -158,20 +339,92 @@ class RecipeViewSet(ModelViewSet):
     pagination_class = SpecificPagination
     permission_classes = [IsAdminOrAuthorOrReadOnly]
     queryset = Recipe.objects.select_related('author').prefetch_related(
-        'ingredients', 'tags'
+        'tags'
     )
 
+    def get_queryset(self):
+        """
+        Для чтения нужны только id, автор и флаги пользователя:
+        остальное берется из готовых документов рецептов.
+        """
+        if self.action not in ('list', 'retrieve'):
+            return super().get_queryset()
+        queryset = Recipe.objects.only('id', 'author')
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        fields = requested_fields(
+            self.request, RecipeReadSerializer.Meta.fields
+        )
+        if 'is_favorited' in fields:
+            queryset = queryset.annotate(is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
+        if 'is_in_shopping_cart' in fields:
+            queryset = queryset.annotate(is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
+        if 'author' in fields:
+            queryset = queryset.annotate(author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, subscribed_to=OuterRef('author')
+                )
+            ))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(render_recipes(list(queryset), request))
+        return self.get_paginated_response(render_recipes(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        data = render_recipes([self.get_object()], request)
+        if not data:
+            raise Http404
+        return Response(data[0])
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve', 'get-link'):
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    def perform_create(self, serializer):
+        serializer.save()
+        build_on_commit(serializer.instance.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        build_on_commit(serializer.instance.pk)
+        changes = serializer.changes
+        logger.info(
+            'Recipe %s updated: fields %s, ingredients +%s ~%s -%s, '
+            'tags %s',
+            serializer.instance.pk,
+            ','.join(changes['fields']) or '-',
+            len(changes['ingredients']['created']),
+            len(changes['ingredients']['updated']),
+            len(changes['ingredients']['deleted']),
+            'changed' if changes['tags'] else 'kept',
+        )
+
     @staticmethod
     def _add_relation(request, pk, model, serializer_class, relation_name):
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-
-        if model.objects.filter(recipe=recipe, user=user).exists():
+        """
+        Добавляет связь одной вставкой: повторный запрос или гонка
+        двойного клика упираются в уникальный индекс и дают 400.
+        """
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+            pk=pk
+        )
+        try:
+            with transaction.atomic():
+                relation = model.objects.create(
+                    recipe=recipe, user=request.user
+                )
+        except IntegrityError:
             return Response(
                 {
                     'detail': f'Рецепт "{recipe.name}" уже добавлен '
@@ -179,12 +432,9 @@ class RecipeViewSet(ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
         serializer = serializer_class(
-            data={'recipe': recipe.id, 'user': user.id}
+            relation, context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save(recipe=recipe, user=user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
@@ -202,6 +452,61 @@ class RecipeViewSet(ModelViewSet):
             status=status.HTTP_404_NOT_FOUND,
         )
 
+    @staticmethod
+    def _batch_relations(request, model):
+        """Пакетное добавление или удаление рецептов по списку id."""
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        results = []
+        if request.method == 'POST':
+            found = dict(
+                Recipe.objects.filter(id__in=ids).annotate(
+                    is_added=Exists(
+                        model.objects.filter(user=user, recipe=OuterRef('pk'))
+                    )
+                ).values_list('id', 'is_added')
+            )
+            relations = []
+            for recipe_id in ids:
+                if recipe_id not in found:
+                    result = BATCH_NOT_FOUND
+                elif found[recipe_id]:
+                    result = BATCH_EXISTS
+                else:
+                    result = BATCH_CREATED
+                    relations.append(model(user=user, recipe_id=recipe_id))
+                results.append({'id': recipe_id, 'status': result})
+            with transaction.atomic():
+                model.objects.bulk_create(relations, ignore_conflicts=True)
+                outbox.record_many(
+                    outbox.RELATION_TOPICS[model],
+                    outbox.ACTION_ADD,
+                    [
+                        (relation.recipe_id, {'user': user.id})
+                        for relation in relations
+                    ],
+                )
+            return Response(results, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            added = set(
+                model.objects.filter(
+                    user=user, recipe_id__in=ids
+                ).values_list('recipe_id', flat=True)
+            )
+            model.objects.filter(user=user, recipe_id__in=added).delete()
+        results = [
+            {
+                'id': recipe_id,
+                'status': (
+                    BATCH_DELETED if recipe_id in added else BATCH_MISSING
+                ),
+            }
+            for recipe_id in ids
+        ]
+        return Response(results, status=status.HTTP_200_OK)
+
     @action(
         detail=False,
         methods=['GET'],
@@ -232,9 +537,10 @@ class RecipeViewSet(ModelViewSet):
         url_name='get-link',
     )
     def get_link(self, request, pk=None):
-        view_name = self.request.resolver_match.view_name
-        base_url = reverse(view_name, kwargs={'pk': pk})
-        short_link = self.request.build_absolute_uri(base_url)
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        short_link = request.build_absolute_uri(
+            reverse('short_link', args=[short_links.encode(recipe.id)])
+        )
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
 
     @action(
@@ -271,6 +577,46 @@ class RecipeViewSet(ModelViewSet):
             request, pk, ShoppingCart, 'списке покупок'
         )
 
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite',
+        url_name='favorite-batch',
+    )
+    def favorite_batch(self, request):
+        return self._batch_relations(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='shopping_cart-batch',
+    )
+    def shopping_cart_batch(self, request):
+        return self._batch_relations(request, ShoppingCart)
+
+    @action(
+        detail=True,
+        methods=['GET'],
+        permission_classes=[AllowAny],
+        url_path='similar',
+        url_name='similar',
+    )
+    def similar(self, request, pk=None):
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        try:
+            limit = int(request.query_params.get('limit', PAGE_SIZE))
+        except ValueError:
+            limit = PAGE_SIZE
+        serializer = ShortRecipeSerializer(
+            similar_recipes(recipe, max(1, min(limit, SIMILAR_MAX_LIMIT))),
+            many=True,
+            context={'request': request},
+        )
+        return Response(serializer.data)
+
     @staticmethod
     def add_shopping_list_to_txt(ingredients):
         return '\n'.join(
@@ -280,10 +626,86 @@ class RecipeViewSet(ModelViewSet):
         )
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(PrecompressedListMixin, ReadOnlyModelViewSet):
     """Представление тегов."""
 
+    catalog_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAdminOrAuthorOrReadOnly]
     pagination_class = None
+
+
+class UploadViewSet(ViewSet):
+    """
+    Загрузка изображения до создания рецепта или смены аватара.
+    POST с multipart-полем file принимает файл целиком, POST с size
+    открывает загрузку частями: каждая часть отправляется PATCH с
+    телом-байтами и заголовком Content-Range, GET возвращает принятое
+    смещение для докачки. Готовый token передается в поле image/avatar.
+    """
+
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = '[0-9a-f]{32}'
+
+    def get_upload(self, pk):
+        upload = get_upload(pk, self.request.user)
+        if upload is None:
+            raise Http404
+        return upload
+
+    def create(self, request):
+        serializer = UploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if 'file' in data:
+            upload_id = save_uploaded_file(request.user, data['file'])
+        else:
+            upload_id = start_upload(
+                request.user, data['size'], data['name']
+            )
+        return Response(
+            get_upload(upload_id, request.user),
+            status=status.HTTP_201_CREATED
+        )
+
+    def retrieve(self, request, pk=None):
+        return Response(self.get_upload(pk))
+
+    def partial_update(self, request, pk=None):
+        upload = self.get_upload(pk)
+        match = CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+        if match is None:
+            return Response(
+                {'detail': 'Нужен заголовок Content-Range: bytes a-b/size.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, size = map(int, match.groups())
+        if size != upload['size'] or not start <= end < size:
+            return Response(
+                {'detail': 'Content-Range не соответствует загрузке.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.stream is None:
+            return Response(
+                {'detail': 'Пустое тело запроса.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            append_chunk(upload, request.stream, start, end - start + 1)
+        except FileNotFoundError:
+            raise Http404
+        except UploadConflict:
+            return Response(
+                {
+                    **self.get_upload(pk),
+                    'detail': 'Продолжите загрузку с offset.',
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(self.get_upload(pk))
+
+    def destroy(self, request, pk=None):
+        self.get_upload(pk)
+        delete_upload(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
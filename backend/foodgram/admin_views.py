@@ -0,0 +1,246 @@
+"""
+Служебные страницы админки: профили запросов, медленные запросы к
+БД, пул соединений и отказы ограничения запросов. Доступны
+сотрудникам через admin.site.admin_view, как и остальная админка.
+"""
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.views.decorators.http import require_POST
+
+from api.throttling import rejected_counts
+from foodgram.backends.postgresql_pool.pool import pool_stats
+from foodgram.profiling import (
+    CATEGORIES,
+    delete_profile,
+    list_profiles,
+    load_profile,
+    pstats_path,
+)
+from foodgram.slow_queries import top_fingerprints
+
+
+PROFILES_PER_PAGE = 50
+SLOW_QUERY_HOURS = (1, 6, 24, 24 * 7)
+SLOW_QUERY_TOP = 100
+
+
+def _context(request, title, **context):
+    return {**admin.site.each_context(request), 'title': title, **context}
+
+
+def _prepare(profile):
+    """Миллисекунды и дата для шаблонов."""
+    profile['started_at'] = datetime.fromisoformat(profile['started_at'])
+    profile['time_ms'] = profile['time'] * 1000
+    profile['queries']['time_ms'] = profile['queries']['time'] * 1000
+    return profile
+
+
+def profile_list(request):
+    page = Paginator(list_profiles(), PROFILES_PER_PAGE).get_page(
+        request.GET.get('page')
+    )
+    profiles = [
+        _prepare(profile)
+        for profile in map(load_profile, page.object_list)
+        if profile is not None
+    ]
+    return TemplateResponse(
+        request,
+        'admin/profiles/list.html',
+        _context(
+            request, 'Профили запросов', page=page, profiles=profiles
+        ),
+    )
+
+
+def profile_detail(request, profile_id):
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise Http404
+    profile = _prepare(profile)
+    measured = sum(profile['categories'].values()) or 1
+    categories = [
+        {
+            'label': label,
+            'time_ms': profile['categories'].get(category, 0) * 1000,
+            'percent': profile['categories'].get(category, 0)
+            / measured * 100,
+        }
+        for category, label in CATEGORIES.items()
+    ]
+    for section in ('serializers', 'functions'):
+        for function in profile[section]:
+            function['cumulative_ms'] = function['cumulative'] * 1000
+            function['own_ms'] = function.get('own', 0) * 1000
+    for query in profile['queries']['slowest']:
+        query['time_ms'] = query['time'] * 1000
+    return TemplateResponse(
+        request,
+        'admin/profiles/detail.html',
+        _context(
+            request,
+            f'{profile["method"]} {profile["path"]}',
+            profile=profile,
+            categories=categories,
+        ),
+    )
+
+
+def profile_download(request, profile_id):
+    path = pstats_path(profile_id)
+    if path is None:
+        raise Http404
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof'
+    )
+
+
+@require_POST
+def profile_delete(request, profile_id):
+    delete_profile(profile_id)
+    return redirect('admin-profiles')
+
+
+def _hours(request):
+    try:
+        hours = int(request.GET.get('hours', 24))
+    except ValueError:
+        hours = 24
+    return hours if hours in SLOW_QUERY_HOURS else 24
+
+
+def _prepare_group(group):
+    for field in ('total', 'max', 'mean'):
+        group[f'{field}_ms'] = group[field] * 1000
+    group['last_seen'] = datetime.fromisoformat(group['last_seen'])
+    group['views'] = group['views'].most_common()
+    group['callers'] = group['callers'].most_common()
+    return group
+
+
+def slow_query_list(request):
+    hours = _hours(request)
+    groups = [
+        _prepare_group(group)
+        for group in top_fingerprints(hours, SLOW_QUERY_TOP)
+    ]
+    return TemplateResponse(
+        request,
+        'admin/slow_queries/list.html',
+        _context(
+            request,
+            'Медленные запросы',
+            groups=groups,
+            hours=hours,
+            hour_choices=SLOW_QUERY_HOURS,
+        ),
+    )
+
+
+def slow_query_detail(request, fingerprint):
+    hours = _hours(request)
+    for group in top_fingerprints(hours):
+        if group['fingerprint'] == fingerprint:
+            break
+    else:
+        raise Http404
+    group = _prepare_group(group)
+    for plan in group['plans']:
+        plan['time'] = datetime.fromisoformat(plan['time'])
+        plan['duration_ms'] = plan['duration'] * 1000
+    group['plans'].reverse()
+    return TemplateResponse(
+        request,
+        'admin/slow_queries/detail.html',
+        _context(
+            request,
+            f'Медленный запрос {fingerprint}',
+            group=group,
+            hours=hours,
+        ),
+    )
+
+
+def db_pool(request):
+    """Метрики пулов соединений воркера, обслужившего запрос."""
+    return TemplateResponse(
+        request,
+        'admin/db_pool.html',
+        _context(
+            request,
+            'Пул соединений',
+            pools=sorted(pool_stats().items()),
+            pid=os.getpid(),
+        ),
+    )
+
+
+def throttling(request):
+    """Лимиты областей ограничения запросов и число отказов."""
+    rejected = rejected_counts()
+    rates = settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+    return TemplateResponse(
+        request,
+        'admin/throttling.html',
+        _context(
+            request,
+            'Ограничение запросов',
+            scopes=[
+                (scope, rate, rejected.get(scope, 0))
+                for scope, rate in sorted(rates.items())
+            ],
+        ),
+    )
+
+
+urlpatterns = [
+    path(
+        'profiles/',
+        admin.site.admin_view(profile_list),
+        name='admin-profiles',
+    ),
+    path(
+        'profiles/<slug:profile_id>/',
+        admin.site.admin_view(profile_detail),
+        name='admin-profile',
+    ),
+    path(
+        'profiles/<slug:profile_id>/download/',
+        admin.site.admin_view(profile_download),
+        name='admin-profile-download',
+    ),
+    path(
+        'profiles/<slug:profile_id>/delete/',
+        admin.site.admin_view(profile_delete),
+        name='admin-profile-delete',
+    ),
+    path(
+        'slow-queries/',
+        admin.site.admin_view(slow_query_list),
+        name='admin-slow-queries',
+    ),
+    path(
+        'slow-queries/<slug:fingerprint>/',
+        admin.site.admin_view(slow_query_detail),
+        name='admin-slow-query',
+    ),
+    path(
+        'db-pool/',
+        admin.site.admin_view(db_pool),
+        name='admin-db-pool',
+    ),
+    path(
+        'throttling/',
+        admin.site.admin_view(throttling),
+        name='admin-throttling',
+    ),
+]
@@ -0,0 +1,62 @@
+from functools import partial
+
+from django.db.backends.postgresql.base import (
+    DatabaseWrapper as PostgresDatabaseWrapper,
+)
+from django.utils.asyncio import async_unsafe
+
+from foodgram.backends.postgresql_pool.pool import get_pool
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    Бэкенд PostgreSQL, который берет соединения из пула процесса
+    и возвращает их туда вместо закрытия.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        pool = self.pool
+        if pool.min_size:
+            pool.fill(connect)
+        connection = pool.getconn(
+            connect,
+            check=self._is_connection_usable
+            if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+        )
+        # Для соединения из пула get_new_connection() родителя не вызывался,
+        # а isolation_level должен быть выставлен до set_autocommit().
+        self.isolation_level = self._configured_isolation_level()
+        return connection
+
+    def _configured_isolation_level(self):
+        from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+        return IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', IsolationLevel.READ_COMMITTED
+            )
+        )
+
+    @staticmethod
+    def _is_connection_usable(connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
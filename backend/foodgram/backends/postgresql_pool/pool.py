@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    """Не удалось получить соединение из пула за отведенное время."""
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений psycopg2 с ограничением размера,
+    таймаутом ожидания и счетчиками ожиданий. Свободные соединения
+    хранятся вместе со временем возврата в пул.
+    """
+
+    def __init__(self, min_size, max_size, timeout, slow_wait=0.1,
+                 check_after=30):
+        if min_size > max_size:
+            raise ValueError('min_size не может быть больше max_size.')
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.slow_wait = slow_wait
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._size = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._checks = 0
+        self._discarded = 0
+
+    def _check_fork(self):
+        """
+        После fork() сокеты родителя нельзя использовать в дочернем
+        процессе: забываем их, не закрывая.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+
+    def getconn(self, connect, check=None):
+        """
+        Выдает свободное соединение или открывает новое через connect.
+        Соединение, пролежавшее в пуле не меньше check_after секунд,
+        сначала проверяется через check(connection): непригодное
+        закрывается, и берется следующее. Только что использованные
+        соединения не проверяются, лишнего запроса к БД нет.
+        """
+        while True:
+            connection, idle_since = self._checkout(connect)
+            if check is None or idle_since is None or (
+                time.monotonic() - idle_since < self.check_after
+            ):
+                return connection
+            with self._cond:
+                self._checks += 1
+            if check(connection):
+                return connection
+            with self._cond:
+                self._discarded += 1
+            self.discard(connection)
+
+    def _checkout(self, connect):
+        """Свободное соединение и время его возврата (None - новое)."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            self._check_fork()
+            while True:
+                if self._idle:
+                    connection, idle_since = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection = idle_since = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f'Пул соединений исчерпан ({self.max_size}), '
+                        f'ожидание превысило {self.timeout} с.'
+                    )
+                self._cond.wait(remaining)
+            self._record_checkout(time.monotonic() - started)
+        if connection is None:
+            try:
+                connection = connect()
+            except Exception:
+                self._release_slot()
+                raise
+        return connection, idle_since
+
+    def putconn(self, connection):
+        """Возвращает соединение в пул, битые соединения закрываются."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+        if connection.closed or not self._reset_connection(connection):
+            self.discard(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, connection):
+        """Закрывает соединение и освобождает место в пуле."""
+        try:
+            if not connection.closed:
+                connection.close()
+        finally:
+            self._release_slot()
+
+    def fill(self, connect):
+        """Открывает min_size соединений заранее."""
+        while True:
+            with self._cond:
+                self._check_fork()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = connect()
+            except Exception:
+                self._release_slot()
+                raise
+            with self._cond:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._size -= 1
+                if not connection.closed:
+                    connection.close()
+            self._cond.notify_all()
+
+    def stats(self):
+        """Метрики пула для логов и мониторинга."""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'max_wait': round(self._max_wait, 6),
+                'timeouts': self._timeouts,
+                'health_checks': self._checks,
+                'discarded': self._discarded,
+            }
+
+    def _release_slot(self):
+        with self._cond:
+            if self._size > 0:
+                self._size -= 1
+            self._cond.notify()
+
+    def _record_checkout(self, waited):
+        self._checkouts += 1
+        if waited <= 0.001:
+            return
+        self._waits += 1
+        self._wait_time += waited
+        self._max_wait = max(self._max_wait, waited)
+        if waited >= self.slow_wait:
+            logger.warning(
+                'Ожидание соединения из пула %.3f с (занято %s из %s).',
+                waited, self._size - len(self._idle), self.max_size
+            )
+
+    @staticmethod
+    def _reset_connection(connection):
+        """Откатывает незавершенную транзакцию перед возвратом в пул."""
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        try:
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """Возвращает пул для алиаса БД, создавая его при первом обращении."""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = settings_dict.get('POOL', {})
+            pool = ConnectionPool(
+                min_size=int(options.get('MIN_SIZE', 0)),
+                max_size=int(options.get('MAX_SIZE', 10)),
+                timeout=float(options.get('TIMEOUT', 5)),
+                slow_wait=float(options.get('SLOW_WAIT', 0.1)),
+                check_after=float(options.get('CHECK_AFTER', 30)),
+            )
+            _pools[alias] = pool
+        return pool
+
+
+def pool_stats():
+    """Метрики всех пулов текущего процесса."""
+    with _pools_lock:
+        return {alias: pool.stats() for alias, pool in _pools.items()}
@@ -0,0 +1,28 @@
+from django.db.backends.sqlite3.base import (
+    DatabaseWrapper as SQLiteDatabaseWrapper,
+)
+from django.utils.asyncio import async_unsafe
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+    """
+    Бэкенд SQLite для работы под несколькими воркерами: на каждом
+    соединении выполняются PRAGMA из настройки PRAGMAS (WAL, synchronous,
+    mmap_size, cache_size, busy_timeout), а транзакции atomic() с
+    IMMEDIATE_TRANSACTIONS открываются BEGIN IMMEDIATE. Такая транзакция
+    берет блокировку записи сразу и ждет ее busy_timeout, а не падает
+    с «database is locked» при попытке повысить чтение до записи.
+    """
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.settings_dict.get('IMMEDIATE_TRANSACTIONS'):
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
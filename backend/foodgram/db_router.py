@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Разрешено ли текущему запросу читать с реплик. Выставляется
+# ReplicaRoutingMiddleware только для безопасных методов без «прилипания».
+_use_replicas = ContextVar('use_replicas', default=False)
+
+_lag_cache = {}
+_lag_lock = threading.Lock()
+
+POSTGRES_LAG_SQL = (
+    'SELECT CASE WHEN pg_is_in_recovery() THEN COALESCE('
+    'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) '
+    'ELSE 0 END'
+)
+
+
+def allow_replica_reads(allowed):
+    """Включает чтение с реплик для текущего контекста."""
+    return _use_replicas.set(allowed)
+
+
+def reset_replica_reads(token):
+    _use_replicas.reset(token)
+
+
+def pin_to_primary():
+    """После записи все чтения до конца запроса идут в основную БД."""
+    _use_replicas.set(False)
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах, None - реплика недоступна."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except Exception:
+        return None
+
+
+def healthy_replicas():
+    """
+    Реплики, отставание которых не превышает REPLICA_MAX_LAG.
+    Результат проверки кешируется в процессе на REPLICA_LAG_CHECK_INTERVAL.
+    """
+    now = time.monotonic()
+    interval = settings.REPLICA_LAG_CHECK_INTERVAL
+    healthy = []
+    for alias in settings.REPLICA_DATABASES:
+        with _lag_lock:
+            checked_at, lag = _lag_cache.get(alias, (None, None))
+        if checked_at is None or now - checked_at >= interval:
+            lag = replica_lag(alias)
+            with _lag_lock:
+                _lag_cache[alias] = (now, lag)
+        if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+            healthy.append(alias)
+    return healthy
+
+
+class ReplicaRouter:
+    """
+    Направляет чтения безопасных запросов на реплики,
+    все записи и миграции - в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replicas.get():
+            return DEFAULT_DB_ALIAS
+        replicas = healthy_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
@@ -0,0 +1,147 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from foodgram.db_router import allow_replica_reads, reset_replica_reads
+from foodgram.profiling import profile_request, requested_mode
+from foodgram.slow_queries import reset_view, set_view, view_label
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_CACHE_KEY = 'db-pin:{}'
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'text/',
+)
+
+
+def accepts_gzip(request):
+    """Разрешает ли клиент gzip с учетом q-значений Accept-Encoding."""
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = params.strip().lower()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов. После записи
+    клиент «прилипает» к основной БД на REPLICA_PIN_SECONDS, чтобы
+    сразу видеть свои изменения (read-your-writes).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        is_safe = request.method in SAFE_METHODS
+        token = allow_replica_reads(is_safe and not self._is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica_reads(token)
+        if not is_safe:
+            self._pin(request, response)
+        return response
+
+    @staticmethod
+    def _client_key(request):
+        """Ключ клиента по заголовку Authorization (токен DRF)."""
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return PIN_CACHE_KEY.format(
+            hashlib.sha1(authorization.encode()).hexdigest()
+        )
+
+    def _is_pinned(self, request):
+        if request.COOKIES.get(settings.REPLICA_PIN_COOKIE):
+            return True
+        key = self._client_key(request)
+        return bool(key and cache.get(key))
+
+    def _pin(self, request, response):
+        seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(
+            settings.REPLICA_PIN_COOKIE,
+            '1',
+            max_age=seconds,
+            httponly=True,
+            samesite='Lax',
+        )
+        key = self._client_key(request)
+        if key:
+            cache.set(key, True, seconds)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZip для текстовых ответов не меньше COMPRESSION_MIN_SIZE байт.
+    Уже сжатые ответы (Content-Encoding) пропускаются без изменений.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and (
+            len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        if not response.get('Content-Type', '').startswith(
+            COMPRESSIBLE_TYPES
+        ):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not accepts_gzip(request):
+            return response
+        return super().process_response(request, response)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос по флагу сотрудника или случайной выборкой,
+    см. foodgram.profiling.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode, requested = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        return profile_request(request, self.get_response, mode, requested)
+
+
+class SlowQueryMiddleware:
+    """
+    Запоминает представление и действие запроса для журнала
+    медленных запросов, см. foodgram.slow_queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = set_view(request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_view(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_view(view_label(view_func, request.method))
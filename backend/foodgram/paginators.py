@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+POSTGRES_ESTIMATE_SQL = (
+    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+)
+
+
+def estimated_count(queryset):
+    """
+    Оценка числа строк таблицы по статистике планировщика PostgreSQL.
+    Возвращает None для других СУБД, для запросов с условиями и для
+    таблиц, по которым еще не собрана статистика.
+    """
+    if queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            POSTGRES_ESTIMATE_SQL,
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки: для больших таблиц без фильтров число строк
+    берется из статистики, а не из COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= settings.ESTIMATED_COUNT_MIN:
+            return estimate
+        return super().count
@@ -0,0 +1,367 @@
+"""
+Профилирование отдельных запросов. Сотрудник (is_staff) включает его
+заголовком X-Profile или параметром ?profile= со значением cprofile
+(детерминированный профилировщик, по умолчанию) или sample
+(сэмплирующий). Доля PROFILE_SAMPLE_RATE всех запросов профилируется
+сэмплирующим профилировщиком: он лишь раз в PROFILE_SAMPLE_INTERVAL
+снимает стек потока запроса из фонового потока.
+
+Сводка (время по ORM, сериализаторам и отрисовке, методы
+сериализаторов, запросы к БД, самые тяжелые функции) сохраняется в
+PROFILE_DIR вместе с файлом pstats; хранятся последние
+PROFILE_MAX_FILES профилей. Смотреть их можно в админке.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+PARAM = 'profile'
+MODE_CPROFILE = 'cprofile'
+MODE_SAMPLE = 'sample'
+MODES = (MODE_CPROFILE, MODE_SAMPLE)
+
+CATEGORY_ORM = 'orm'
+CATEGORY_SERIALIZERS = 'serializers'
+CATEGORY_RENDERING = 'rendering'
+CATEGORY_OTHER = 'other'
+CATEGORIES = {
+    CATEGORY_ORM: 'ORM и БД',
+    CATEGORY_SERIALIZERS: 'Сериализаторы',
+    CATEGORY_RENDERING: 'Отрисовка',
+    CATEGORY_OTHER: 'Остальное',
+}
+# Части путей файлов; первое совпадение определяет категорию.
+CATEGORY_PATHS = (
+    (CATEGORY_ORM, ('/django/db/', '/psycopg2/', '/sqlite3/')),
+    (CATEGORY_SERIALIZERS, (
+        '/rest_framework/serializers.py',
+        '/rest_framework/fields.py',
+        '/rest_framework/relations.py',
+        '/drf_extra_fields/',
+        'serializers.py',
+    )),
+    (CATEGORY_RENDERING, (
+        '/rest_framework/renderers.py',
+        '/rest_framework/utils/encoders.py',
+        '/json/',
+        '/django/template/',
+    )),
+)
+TOP_FUNCTIONS = 30
+TOP_QUERIES = 10
+SQL_LENGTH = 500
+
+
+def _category(filename):
+    filename = filename.replace('\\', '/')
+    for category, parts in CATEGORY_PATHS:
+        if any(part in filename for part in parts):
+            return category
+    return CATEGORY_OTHER
+
+
+def _short_path(filename):
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        return filename[len(base):]
+    for marker in ('site-packages' + os.sep, 'lib' + os.sep):
+        if marker in filename:
+            return filename.rsplit(marker, 1)[1]
+    return filename
+
+
+def _is_project_serializer(filename):
+    return (
+        filename.endswith('serializers.py')
+        and filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+    )
+
+
+class QueryTimer:
+    """execute_wrapper: время и текст каждого запроса к БД."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started, sql))
+
+    def summary(self):
+        slowest = sorted(self.queries, key=lambda query: -query[0])
+        return {
+            'count': len(self.queries),
+            'time': sum(duration for duration, _ in self.queries),
+            'slowest': [
+                {'time': duration, 'sql': sql[:SQL_LENGTH]}
+                for duration, sql in slowest[:TOP_QUERIES]
+            ],
+        }
+
+
+class Sampler:
+    """
+    Сэмплирующий профилировщик: фоновый поток раз в interval снимает
+    стек потока запроса. Сам запрос при этом не замедляется.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(stack)] += 1
+
+    @staticmethod
+    def _label(code):
+        name = getattr(code, 'co_qualname', code.co_name)
+        return (
+            f'{_short_path(code.co_filename)}:{code.co_firstlineno} {name}'
+        )
+
+    def summary(self, elapsed):
+        total = sum(self.stacks.values())
+        if not total:
+            return {
+                'samples': 0,
+                'categories': {},
+                'serializers': [],
+                'functions': [],
+            }
+        share = elapsed / total
+        categories = defaultdict(float)
+        own = Counter()
+        cumulative = Counter()
+        serializers = Counter()
+        for stack, count in self.stacks.items():
+            categories[_category(stack[0].co_filename)] += count * share
+            own[stack[0]] += count
+            for code in set(stack):
+                cumulative[code] += count
+                if _is_project_serializer(code.co_filename):
+                    serializers[code] += count
+        return {
+            'samples': total,
+            'categories': dict(categories),
+            'serializers': [
+                {
+                    'function': self._label(code),
+                    'calls': None,
+                    'cumulative': count * share,
+                }
+                for code, count in serializers.most_common(TOP_FUNCTIONS)
+            ],
+            'functions': [
+                {
+                    'function': self._label(code),
+                    'calls': None,
+                    'own': own[code] * share,
+                    'cumulative': count * share,
+                }
+                for code, count in cumulative.most_common(TOP_FUNCTIONS)
+            ],
+        }
+
+
+def _cprofile_summary(profiler):
+    stats = pstats.Stats(profiler).stats
+    categories = defaultdict(float)
+    functions = []
+    serializers = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in (
+        stats.items()
+    ):
+        categories[_category(filename)] += own
+        function = {
+            'function': f'{_short_path(filename)}:{line} {name}',
+            'calls': calls,
+            'own': own,
+            'cumulative': cumulative,
+        }
+        functions.append(function)
+        if _is_project_serializer(filename):
+            serializers.append(function)
+    functions.sort(key=lambda function: -function['cumulative'])
+    serializers.sort(key=lambda function: -function['cumulative'])
+    return {
+        'categories': dict(categories),
+        'serializers': serializers[:TOP_FUNCTIONS],
+        'functions': functions[:TOP_FUNCTIONS],
+    }
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    return keyword == 'Token' and Token.objects.filter(
+        key=key.strip(), user__is_staff=True, user__is_active=True
+    ).exists()
+
+
+def requested_mode(request):
+    """
+    Режим профилирования запроса (None - без профилирования) и признак
+    того, что профиль запросил сотрудник.
+    """
+    flag = request.headers.get(HEADER) or request.GET.get(PARAM)
+    if flag and _is_staff(request):
+        return (flag if flag in MODES else MODE_CPROFILE), True
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return MODE_SAMPLE, False
+    return None, False
+
+
+def _path(profile_id, extension):
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+
+
+def _write(path, writer):
+    temporary = f'{path}.{uuid.uuid4().hex}.tmp'
+    writer(temporary)
+    os.replace(temporary, path)
+
+
+def save_profile(summary, profiler=None):
+    """Сохраняет профиль и удаляет самые старые сверх лимита."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profile_id = summary['id']
+    if profiler is not None:
+        _write(_path(profile_id, 'prof'), profiler.dump_stats)
+        summary['pstats'] = True
+
+    def write_summary(path):
+        with open(path, 'w') as file:
+            json.dump(summary, file, ensure_ascii=False)
+
+    _write(_path(profile_id, 'json'), write_summary)
+    for stale in list_profiles()[settings.PROFILE_MAX_FILES:]:
+        delete_profile(stale)
+
+
+def list_profiles():
+    """id сохраненных профилей, новые первыми."""
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (name[:-5] for name in names if name.endswith('.json')),
+        reverse=True,
+    )
+
+
+def load_profile(profile_id):
+    try:
+        with open(_path(profile_id, 'json')) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def pstats_path(profile_id):
+    path = _path(profile_id, 'prof')
+    return path if os.path.exists(path) else None
+
+
+def delete_profile(profile_id):
+    for extension in ('json', 'prof'):
+        try:
+            os.remove(_path(profile_id, extension))
+        except FileNotFoundError:
+            pass
+
+
+def profile_request(request, get_response, mode, requested):
+    """
+    Выполняет запрос под профилировщиком и сохраняет результат;
+    сотруднику id профиля возвращается в заголовке X-Profile-Id.
+    """
+    queries = QueryTimer()
+    if mode == MODE_CPROFILE:
+        profiler = cProfile.Profile()
+    else:
+        profiler = Sampler(settings.PROFILE_SAMPLE_INTERVAL)
+    started_at = timezone.now()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+    # Время сортируемо в имени файла: список профилей не читает их.
+    profile_id = (
+        f'{started_at:%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}'
+    )
+    if mode == MODE_CPROFILE:
+        summary = _cprofile_summary(profiler)
+    else:
+        summary = profiler.summary(elapsed)
+    user = getattr(request, 'user', None)
+    summary.update({
+        'id': profile_id,
+        'mode': mode,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'user': user.get_username() if user and user.is_authenticated
+        else None,
+        'status': response.status_code,
+        'started_at': started_at.isoformat(),
+        'time': elapsed,
+        'queries': queries.summary(),
+    })
+    try:
+        save_profile(
+            summary, profiler if mode == MODE_CPROFILE else None
+        )
+    except OSError:
+        logger.exception('Could not save profile %s', profile_id)
+        return response
+    if requested:
+        response['X-Profile-Id'] = profile_id
+    return response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from django.core.management.utils import get_random_secret_key
 from pathlib import Path
@@ -42,10 +43,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.middleware.SlowQueryMiddleware',
+    'foodgram.middleware.ProfilingMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +60,7 @@ ROOT_URLCONF = 'foodgram.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -74,6 +79,8 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+SQLITE_ENGINES = ('django.db.backends.sqlite3', 'foodgram.backends.sqlite')
+
 if os.getenv('TESTING_WITH_SQLITE3', 'true').lower() == 'true':
     DATABASES = {
         'default': {
@@ -85,6 +92,24 @@ if os.getenv('TESTING_WITH_SQLITE3', 'true').lower() == 'true':
             'PORT': ''
         }
     }
+    # Single-node profile: WAL lets readers run alongside the writer,
+    # synchronous=NORMAL fsyncs only on checkpoints, and atomic() blocks
+    # take the write lock up front with BEGIN IMMEDIATE.
+    if os.getenv('SQLITE_TUNING', 'true').lower() == 'true':
+        DATABASES['default'].update({
+            'ENGINE': 'foodgram.backends.sqlite',
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+                'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),
+                'mmap_size': int(
+                    os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+                ),
+                'temp_store': 'MEMORY',
+            },
+            'IMMEDIATE_TRANSACTIONS': True,
+        })
 else:
     DATABASES = {
         'default': {
@@ -97,6 +122,61 @@ else:
         }
     }
 
+# Persistent connections: DB_CONN_MAX_AGE seconds (0 - close after each
+# request, -1 - unlimited). With DB_POOL=true connections are returned to
+# the in-process pool on close, so CONN_MAX_AGE defaults to 0.
+DB_POOL = (
+    os.getenv('DB_POOL', 'false').lower() == 'true'
+    and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+)
+_conn_max_age = int(os.getenv('DB_CONN_MAX_AGE', 0 if DB_POOL else 60))
+DATABASES['default'].update({
+    'CONN_MAX_AGE': None if _conn_max_age < 0 else _conn_max_age,
+    'CONN_HEALTH_CHECKS': (
+        os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+    ),
+})
+if DB_POOL:
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram.backends.postgresql_pool',
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'SLOW_WAIT': float(os.getenv('DB_POOL_SLOW_WAIT', 0.1)),
+            # Idle connections are checked with SELECT 1 only after this
+            # many seconds in the pool.
+            'CHECK_AFTER': float(os.getenv('DB_POOL_CHECK_AFTER', 30)),
+        },
+    })
+
+# Read replicas: DB_REPLICAS is a comma-separated list of replica hosts
+# (database file names for SQLite). Each one becomes a 'replica_N' alias
+# with the same credentials as 'default'.
+REPLICA_DATABASES = []
+for _number, _replica in enumerate(
+    filter(None, map(str.strip, os.getenv('DB_REPLICAS', '').split(','))),
+    start=1
+):
+    _alias = f'replica_{_number}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASES['default']['ENGINE'] in SQLITE_ENGINES:
+        DATABASES[_alias]['NAME'] = BASE_DIR / _replica
+    else:
+        DATABASES[_alias]['HOST'] = _replica
+    REPLICA_DATABASES.append(_alias)
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(
+    os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', 5)
+)
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+REPLICA_PIN_COOKIE = 'db_pin'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -129,8 +209,74 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+    # Client IP for throttling is taken from X-Forwarded-For set by this
+    # many proxies in front of gunicorn (nginx in infra/nginx.conf).
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.IPTokenBucketThrottle',
+    ),
+    # '<scope>' limits a user (anonymous clients by IP), '<scope>_ip' limits
+    # an IP address regardless of the user.
+    'DEFAULT_THROTTLE_RATES': {
+        'catalog': os.getenv('THROTTLE_CATALOG', '120/min'),
+        'catalog_ip': os.getenv('THROTTLE_CATALOG_IP', '600/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', '20/min'),
+        'recipe_write_ip': os.getenv('THROTTLE_RECIPE_WRITE_IP', '60/min'),
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', '10/min'),
+        'shopping_cart_ip': os.getenv('THROTTLE_SHOPPING_CART_IP', '30/min'),
+        'avatar': os.getenv('THROTTLE_AVATAR', '10/min'),
+        'upload': os.getenv('THROTTLE_UPLOAD', '30/min'),
+    },
 }
 
+# Token buckets of all gunicorn workers on the host (api.throttling).
+THROTTLE_DB_PATH = os.getenv(
+    'THROTTLE_DB_PATH',
+    os.path.join(tempfile.gettempdir(), 'foodgram_throttle.sqlite3')
+)
+
+# Throttle scope per '<router basename>.<viewset action>'.
+THROTTLE_SCOPES = {
+    'ingredients.list': 'catalog',
+    'recipes.create': 'recipe_write',
+    'recipes.update': 'recipe_write',
+    'recipes.partial_update': 'recipe_write',
+    'recipes.download_shopping_cart': 'shopping_cart',
+    'users.avatar_put': 'avatar',
+    'uploads.create': 'upload',
+}
+
+# The default cache keeps state every worker must see: read-your-writes
+# pins, user profiles, catalog versions and short-link lookups. The file
+# cache is shared by the workers of one host; with several backend hosts
+# use django.core.cache.backends.redis.RedisCache. A per-process
+# LocMemCache is only fit for a single worker (see api.checks).
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+    },
+}
+if CACHE_BACKEND.endswith('.FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+    }
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+# Unfiltered ingredient and tag lists are rendered and gzipped once per
+# catalog version; the in-memory copy is also rebuilt after this timeout.
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 300))
+# Admin changelists of tables at least this large show the planner's
+# row estimate instead of running COUNT(*) (PostgreSQL only).
+ESTIMATED_COUNT_MIN = int(os.getenv('ESTIMATED_COUNT_MIN', 10000))
+
 DJOSER = {
     'SERIALIZERS': {
         'user_create': 'api.serializers.UserCreateSerializer',
@@ -166,6 +312,43 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Images uploaded through /api/uploads/ wait here until a recipe or avatar
+# uses them; must be shared by all workers, ideally on the media volume
+# so that the final save is a rename.
+UPLOAD_TEMP_DIR = os.getenv(
+    'UPLOAD_TEMP_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_uploads')
+)
+UPLOAD_TTL = int(os.getenv('UPLOAD_TTL', 24 * 60 * 60))
+
+# Staff profile a single request with the X-Profile header or ?profile=
+# (cprofile or sample); PROFILE_SAMPLE_RATE of all requests go through the
+# low-overhead sampler. Only the newest PROFILE_MAX_FILES profiles are kept,
+# they are listed in the admin under /admin/profiles/.
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_profiles')
+)
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 200))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+# Queries slower than this are logged with their fingerprint, view and
+# calling frame into hourly files kept for SLOW_QUERY_KEEP_HOURS; 0 turns
+# the wrapper off. Plans are captured for the first occurrence of each
+# fingerprint per process and for SLOW_QUERY_EXPLAIN_RATE of the rest;
+# EXPLAIN ANALYZE runs the query again, so it is only used for SELECT
+# without row locks, on replicas and when SLOW_QUERY_EXPLAIN_ANALYZE is
+# on, and is always rolled back.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_DIR = os.getenv(
+    'SLOW_QUERY_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram_slow_queries')
+)
+SLOW_QUERY_KEEP_HOURS = int(os.getenv('SLOW_QUERY_KEEP_HOURS', 7 * 24))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.05))
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv(
+    'SLOW_QUERY_EXPLAIN_ANALYZE', 'false'
+).lower() == 'true'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
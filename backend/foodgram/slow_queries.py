@@ -0,0 +1,301 @@
+"""
+Журнал медленных запросов к БД. Обертка execute_wrapper ставится на
+каждое соединение и замеряет все запросы; запрос дольше
+SLOW_QUERY_THRESHOLD_MS пишется в лог и в почасовой файл NDJSON в
+SLOW_QUERY_DIR вместе с отпечатком (SQL без литералов и длины
+списков IN), представлением и действием, из которых он выполнен, и
+ближайшим кадром кода проекта (например FollowReadSerializer.get_recipes).
+
+Для доли SLOW_QUERY_EXPLAIN_RATE запросов и для первого запроса
+каждого отпечатка в процессе снимается план EXPLAIN отдельным курсором;
+EXPLAIN ANALYZE выполняет запрос повторно, поэтому используется только
+для SELECT без блокировок строк, на репликах или при
+SLOW_QUERY_EXPLAIN_ANALYZE (по умолчанию выключено), и всегда
+откатывается.
+Хранятся файлы за последние SLOW_QUERY_KEEP_HOURS часов.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+FILE_PREFIX = 'slow-'
+ROW_LOCK = re.compile(
+    r'\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b'
+)
+SQL_LENGTH = 2000
+PLAN_LENGTH = 20000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+# Представление и действие текущего запроса, см. SlowQueryMiddleware.
+_view = ContextVar('slow_query_view', default=None)
+_explained = set()
+_write_lock = threading.Lock()
+
+
+def set_view(label):
+    return _view.set(label)
+
+
+def reset_view(token):
+    _view.reset(token)
+
+
+def view_label(view_func, method):
+    """Представление и действие: UserViewSet.subscriptions и т.п."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def normalize(sql):
+    """SQL без литералов, длин списков IN и лишних пробелов."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def _is_project_frame(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and filename != __file__
+    )
+
+
+def caller():
+    """Ближайший к запросу кадр кода проекта: Класс.метод и строка."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if _is_project_frame(code.co_filename):
+            owner = frame.f_locals.get('self', frame.f_locals.get('cls'))
+            if owner is not None:
+                owner = owner if isinstance(owner, type) else type(owner)
+                name = f'{owner.__name__}.{code.co_name}'
+            else:
+                name = getattr(code, 'co_qualname', code.co_name)
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            return f'{name} ({path}:{frame.f_lineno})'
+        frame = frame.f_back
+    return None
+
+
+def is_plain_select(sql):
+    """SELECT без FOR UPDATE/SHARE: повторное выполнение безопасно."""
+    statement = sql.lstrip().upper()
+    return statement.startswith('SELECT') and not ROW_LOCK.search(statement)
+
+
+def _explain(connection, sql, params):
+    """План запроса отдельным курсором, минуя execute_wrapper."""
+    analyze = (
+        connection.vendor == 'postgresql'
+        and is_plain_select(sql)
+        and (
+            connection.alias in settings.REPLICA_DATABASES
+            or settings.SLOW_QUERY_EXPLAIN_ANALYZE
+        )
+    )
+    options = {'analyze': True} if analyze else {}
+    prefix = connection.ops.explain_query_prefix(**options)
+    # Ошибка EXPLAIN внутри транзакции не должна ее испортить, а все,
+    # что сделал запрос при ANALYZE (например, функции), откатывается.
+    savepoint = (
+        transaction.atomic(using=connection.alias)
+        if analyze or connection.in_atomic_block else nullcontext()
+    )
+    with savepoint:
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        if analyze:
+            transaction.set_rollback(True, using=connection.alias)
+    plan = '\n'.join(
+        ' '.join(str(column) for column in row) for row in rows
+    )
+    return plan[:PLAN_LENGTH], analyze
+
+
+def _path(hour):
+    return os.path.join(
+        settings.SLOW_QUERY_DIR, f'{FILE_PREFIX}{hour:%Y%m%d%H}.ndjson'
+    )
+
+
+def _rotate(now):
+    oldest = _path(now - timedelta(hours=settings.SLOW_QUERY_KEEP_HOURS))
+    for name in os.listdir(settings.SLOW_QUERY_DIR):
+        path = os.path.join(settings.SLOW_QUERY_DIR, name)
+        if name.startswith(FILE_PREFIX) and path < oldest:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _store(event, now):
+    line = (json.dumps(event, ensure_ascii=False) + '\n').encode()
+    path = _path(now)
+    with _write_lock:
+        os.makedirs(settings.SLOW_QUERY_DIR, exist_ok=True)
+        is_new = not os.path.exists(path)
+        # Одна запись в файл с O_APPEND: строки воркеров не перемешиваются.
+        descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(descriptor, line)
+        finally:
+            os.close(descriptor)
+        if is_new:
+            _rotate(now)
+
+
+def record(connection, sql, params, many, duration):
+    normalized = normalize(sql)
+    key = fingerprint(normalized)
+    event = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'fingerprint': key,
+        'sql': normalized[:SQL_LENGTH],
+        'duration': duration,
+        'database': connection.alias,
+        'view': _view.get(),
+        'caller': caller(),
+    }
+    logger.warning(
+        'Slow query %s %.1f ms in %s from %s',
+        key, duration * 1000, event['view'], event['caller'],
+    )
+    # Только SELECT: EXPLAIN ANALYZE выполняет запрос еще раз.
+    explain = not many and normalized[:6].upper() == 'SELECT' and (
+        key not in _explained
+        or random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+    )
+    if explain:
+        _explained.add(key)
+        try:
+            event['plan'], event['analyze'] = _explain(
+                connection, sql, params
+            )
+        except Exception as error:
+            event['plan'] = f'EXPLAIN failed: {error}'
+    _store(event, datetime.now(timezone.utc))
+
+
+class SlowQueryWrapper:
+    """execute_wrapper соединения, записывает медленные запросы."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            try:
+                record(self.connection, sql, params, many, duration)
+            except Exception:
+                logger.exception('Could not record slow query')
+        return result
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    """Ставит обертку один раз на объект соединения."""
+    if settings.SLOW_QUERY_THRESHOLD_MS <= 0:
+        return
+    if not any(
+        isinstance(wrapper, SlowQueryWrapper)
+        for wrapper in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(SlowQueryWrapper(connection))
+
+
+def read_events(hours):
+    """События за последние hours часов."""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    oldest = _path(since)
+    try:
+        names = sorted(os.listdir(settings.SLOW_QUERY_DIR))
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(settings.SLOW_QUERY_DIR, name)
+        if not name.startswith(FILE_PREFIX) or path < oldest:
+            continue
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if datetime.fromisoformat(event['time']) >= since:
+                    yield event
+
+
+def top_fingerprints(hours, limit=None):
+    """Отпечатки по убыванию суммарного времени."""
+    groups = {}
+    for event in read_events(hours):
+        group = groups.setdefault(event['fingerprint'], {
+            'fingerprint': event['fingerprint'],
+            'sql': event['sql'],
+            'count': 0,
+            'total': 0.0,
+            'max': 0.0,
+            'last_seen': event['time'],
+            'views': Counter(),
+            'callers': Counter(),
+            'plans': [],
+        })
+        group['count'] += 1
+        group['total'] += event['duration']
+        group['max'] = max(group['max'], event['duration'])
+        group['last_seen'] = max(group['last_seen'], event['time'])
+        group['views'][event['view'] or '-'] += 1
+        group['callers'][event['caller'] or '-'] += 1
+        if event.get('plan'):
+            group['plans'].append({
+                'time': event['time'],
+                'duration': event['duration'],
+                'database': event['database'],
+                'analyze': event.get('analyze', False),
+                'plan': event['plan'],
+            })
+    result = sorted(groups.values(), key=lambda group: -group['total'])
+    for group in result:
+        group['mean'] = group['total'] / group['count']
+    return result[:limit] if limit else result
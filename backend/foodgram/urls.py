@@ -3,9 +3,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import short_link_redirect
+
 urlpatterns = [
+    path('admin/', include('foodgram.admin_views')),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('s/<str:code>', short_link_redirect, name='short_link'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,101 @@
+"""
+Прогрев процесса до приема запросов. Через WSGI-обработчик проходят
+несколько типичных GET-запросов: так импортируются приложения и
+представления, строятся маршруты роутера, сериализаторы, готовые
+документы справочников тегов и ингредиентов и индекс нечеткого поиска
+ингредиентов. При gunicorn --preload прогрев выполняется в мастере,
+а gc.freeze() переносит созданные объекты в постоянное поколение,
+чтобы сборщик мусора воркеров не трогал их страницы и они оставались
+общими после fork.
+"""
+import gc
+import io
+import logging
+import sys
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.urls import get_resolver
+
+from recipes.models import Ingredient
+from recipes.similarity import _ingredient_hashes
+
+
+logger = logging.getLogger(__name__)
+
+WARMUP_URLS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?fuzzy=true&name=a',
+    '/api/recipes/?limit=1',
+)
+
+
+def internal_host():
+    """Имя хоста из ALLOWED_HOSTS для запросов внутри процесса."""
+    host = settings.ALLOWED_HOSTS[0].strip() if settings.ALLOWED_HOSTS else ''
+    return 'localhost' if host in ('', '*') else host.lstrip('.')
+
+
+def call(application, url):
+    """Выполняет GET url внутри процесса; возвращает статус и время."""
+    path, _, query = url.partition('?')
+    host = internal_host()
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'HTTP_ACCEPT_ENCODING': 'gzip',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    started = time.perf_counter()
+    response = application(
+        environ, lambda status, headers, *args: statuses.append(status)
+    )
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return statuses[0], time.perf_counter() - started
+
+
+def warm_up(application=None):
+    """Прогревает процесс и закрывает соединения с БД перед fork."""
+    started = time.perf_counter()
+    application = application or WSGIHandler()
+    get_resolver().url_patterns
+    try:
+        for url in WARMUP_URLS:
+            status, _ = call(application, url)
+            if not status.startswith('200'):
+                logger.warning('Warmup %s returned %s', url, status)
+        for ingredient_id in Ingredient.objects.values_list(
+            'id', flat=True
+        ).iterator():
+            _ingredient_hashes(ingredient_id)
+    except Exception:
+        logger.exception('Warmup failed, starting cold')
+    finally:
+        connections.close_all()
+    return time.perf_counter() - started
+
+
+def freeze():
+    """Фиксирует кучу мастера перед fork воркеров."""
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,128 @@
+"""
+Настройки gunicorn для продакшена. Число воркеров и потоков
+подбирается по доступным процессору и памяти (с учетом лимитов
+cgroup контейнера), любое значение можно задать переменной окружения.
+GUNICORN_WORKER_CLASS: sync (по умолчанию), gthread или asgi
+(uvicorn.workers.UvicornWorker, нужен пакет uvicorn).
+"""
+import math
+import multiprocessing
+import os
+
+
+def _cpu_count():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as file:
+            quota, period = file.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _memory_mb():
+    for path in (
+        '/sys/fs/cgroup/memory.max',
+        '/sys/fs/cgroup/memory/memory.limit_in_bytes',
+    ):
+        try:
+            with open(path) as file:
+                limit = int(file.read())
+        except (OSError, ValueError):
+            continue
+        # Без лимита cgroup v1 отдает число около 2 ** 63.
+        if limit < 1 << 60:
+            return limit // 2 ** 20
+    try:
+        with open('/proc/meminfo') as file:
+            for line in file:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _default_workers(kind, cpus, memory):
+    if kind == 'sync':
+        workers = 2 * cpus + 1
+    elif kind == 'gthread':
+        workers = cpus + 1
+    else:
+        workers = cpus
+    if memory:
+        # 80% памяти на воркеры, остальное - мастер и запас.
+        per_worker = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 150))
+        workers = min(workers, int(memory * 0.8) // per_worker)
+    return max(1, workers)
+
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'asgi': 'uvicorn.workers.UvicornWorker',
+}
+
+_kind = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+if _kind not in WORKER_CLASSES:
+    raise RuntimeError(
+        f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}'
+    )
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8080')
+worker_class = WORKER_CLASSES[_kind]
+wsgi_app = (
+    'foodgram.asgi:application' if _kind == 'asgi'
+    else 'foodgram.wsgi:application'
+)
+workers = int(
+    os.getenv('GUNICORN_WORKERS')
+    or _default_workers(_kind, _cpu_count(), _memory_mb())
+)
+threads = int(
+    os.getenv('GUNICORN_THREADS', 4 if _kind == 'gthread' else 1)
+)
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+# Воркер перезапускается после max_requests (+ случайный сдвиг, чтобы
+# воркеры не уходили на перезапуск одновременно) - защита от утечек.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+warmup = os.getenv('GUNICORN_WARMUP', 'true').lower() == 'true'
+
+
+def when_ready(server):
+    """С --preload прогрев выполняется один раз в мастере до fork."""
+    if not (warmup and preload_app):
+        return
+    from foodgram.warmup import freeze, warm_up
+
+    application = server.app.wsgi() if _kind != 'asgi' else None
+    elapsed = warm_up(application)
+    freeze()
+    server.log.info('Warmed up in %.2f s', elapsed)
+
+
+def post_worker_init(worker):
+    """Без --preload каждый воркер прогревается сам."""
+    if not warmup or preload_app:
+        return
+    from foodgram.warmup import warm_up
+
+    application = worker.wsgi if _kind != 'asgi' else None
+    elapsed = warm_up(application)
+    worker.log.info('Worker warmed up in %.2f s', elapsed)
+
+
+def on_starting(server):
+    server.log.info(
+        'Starting %s %s worker(s), %s thread(s), preload=%s',
+        workers, _kind, threads, preload_app
+    )
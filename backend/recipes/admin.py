@@ -1,6 +1,10 @@
 from django.contrib import admin
-from django.db.models import Count
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+
+from foodgram.paginators import EstimatedCountPaginator
 from recipes.models import (
+    Change,
+    ChangeConsumer,
     Favorite,
     Ingredient,
     IngredientInRecipe,
@@ -15,9 +19,11 @@ class IngredientAdmin(admin.ModelAdmin):
     """Админ панель для модели Ingredient."""
 
     list_display = ('name', 'measurement_unit')
-    search_fields = ('name',)
+    search_fields = ('^name',)
     list_filter = ('measurement_unit',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(IngredientInRecipe)
@@ -25,9 +31,12 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     """Админ панель для модели IngredientInRecipe."""
 
     list_display = ('recipe', 'ingredient', 'amount')
-    search_fields = ('ingredient__name',)
-    list_filter = ('ingredient',)
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('^ingredient__name', '^recipe__name')
+    autocomplete_fields = ('recipe', 'ingredient')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -44,6 +53,7 @@ class TagAdmin(admin.ModelAdmin):
 
 class RecipeIngredientInline(admin.TabularInline):
     model = IngredientInRecipe
+    autocomplete_fields = ('ingredient',)
     extra = 1
     min_num = 1
     validate_min = True
@@ -58,24 +68,32 @@ class RecipeAdmin(admin.ModelAdmin):
         'name', 'author', 'cooking_time', 'favorited_by_count'
     )
     list_display_links = ('name', 'author')
-    search_fields = ('name', 'author__username', 'tags__name')
-    list_filter = ('author', 'tags')
+    list_select_related = ('author',)
+    search_fields = ('^name', '^author__username')
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
     filter_horizontal = ('tags',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
-        return (
-            super()
-            .get_queryset(request)
-            .select_related('author')
-            .prefetch_related('tags', 'ingredients')
-            .annotate(favorited_by_count=Count('favorited_by'))
+        # Подзапрос считается только для строк текущей страницы,
+        # а не группировкой по всей таблице избранного.
+        favorites = (
+            Favorite.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(
+            favorited_by_count=Subquery(favorites, output_field=IntegerField())
         )
 
     def favorited_by_count(self, obj):
-        return obj.favorited_by_count
+        return obj.favorited_by_count or 0
     favorited_by_count.short_description = 'В избранном'
-    favorited_by_count.admin_order_field = 'favorited_by_count'
 
 
 @admin.register(Favorite)
@@ -84,7 +102,12 @@ class FavoriteAdmin(admin.ModelAdmin):
 
     list_display = ['user', 'recipe', 'created_at']
     list_display_links = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
@@ -93,4 +116,40 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 
     list_display = ['user', 'recipe']
     list_display_links = ['user', 'recipe']
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """Записи пишет само приложение, в админке только просмотр."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Change)
+class ChangeAdmin(ReadOnlyAdmin):
+    """Админ панель для журнала изменений."""
+
+    list_display = (
+        'id', 'txid', 'topic', 'object_id', 'action', 'created_at'
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(ChangeConsumer)
+class ChangeConsumerAdmin(ReadOnlyAdmin):
+    """Админ панель для курсоров потребителей журнала изменений."""
+
+    list_display = ('name', 'txid', 'position', 'updated_at')
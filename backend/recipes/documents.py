@@ -0,0 +1,27 @@
+"""
+Сброс готовых документов рецептов (RecipeDocument). Когда и где
+документы собираются заново, описано в api.documents.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.models import RecipeDocument
+
+
+def invalidate_documents(**lookup):
+    """
+    Сбрасывает документы по условию lookup и увеличивает их версию
+    сразу и после коммита. Сборка, прочитавшая данные до коммита,
+    сохраняет документ только при прежней версии, поэтому старые
+    данные не вернутся в документ.
+    """
+    def reset():
+        RecipeDocument.objects.filter(**lookup).update(
+            document=None,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+
+    reset()
+    transaction.on_commit(reset)
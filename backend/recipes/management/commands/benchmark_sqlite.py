@@ -0,0 +1,236 @@
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+
+# Доли запросов в смеси, близкой к реальному трафику API.
+WORKLOAD = (
+    ('list', 50),
+    ('detail', 20),
+    ('favorite', 12),
+    ('shopping_cart', 12),
+    ('create', 6),
+)
+HOST = '127.0.0.1'
+
+
+def _image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def _worker(number, token, seconds, seed_data, results):
+    """Процесс-воркер: гоняет смесь запросов через тестовый клиент."""
+    connections.close_all()
+    settings.THROTTLE_SCOPES = {}
+    # Ошибки считаются ниже, трассировки django.request только мешают.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    client = Client(HTTP_HOST=HOST, HTTP_AUTHORIZATION=f'Token {token}')
+    generator = random.Random(number)
+    kinds, weights = zip(*WORKLOAD)
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        kind = generator.choices(kinds, weights)[0]
+        recipe_id = generator.choice(seed_data['recipes'])
+        started = time.monotonic()
+        try:
+            if kind == 'list':
+                response = client.get(
+                    '/api/recipes/', {'page': generator.randint(1, 3)}
+                )
+            elif kind == 'detail':
+                response = client.get(f'/api/recipes/{recipe_id}/')
+            elif kind == 'create':
+                response = client.post(
+                    '/api/recipes/',
+                    {
+                        'name': f'benchmark {number}',
+                        'text': 'benchmark',
+                        'cooking_time': 5,
+                        'image': seed_data['image'],
+                        'tags': seed_data['tags'][:1],
+                        'ingredients': [
+                            {'id': ingredient_id, 'amount': 10}
+                            for ingredient_id in generator.sample(
+                                seed_data['ingredients'],
+                                min(3, len(seed_data['ingredients'])),
+                            )
+                        ],
+                    },
+                    content_type='application/json',
+                )
+            else:
+                url = f'/api/recipes/{recipe_id}/{kind}/'
+                response = client.post(url)
+                if response.status_code == 400:
+                    response = client.delete(url)
+            if response.status_code >= 500:
+                errors[f'HTTP {response.status_code}'] += 1
+                continue
+        except Exception as error:
+            errors[str(error).splitlines()[0][:60]] += 1
+            continue
+        timings[kind].append(time.monotonic() - started)
+    results.put((dict(timings), dict(errors)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the API read/write mix from several processes against a '
+        'scratch copy of the SQLite database and report lock errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument(
+            '--plain',
+            action='store_true',
+            help=(
+                'Compare with stock settings: rollback journal, no '
+                'PRAGMAs, deferred transactions'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite')
+        scratch = tempfile.mkdtemp(prefix='foodgram-sqlite-')
+        try:
+            self.prepare(connection, scratch, options['plain'])
+            self.report(self.run(options['workers'], options['seconds']))
+        finally:
+            connections.close_all()
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def prepare(self, connection, scratch, plain):
+        """Копирует базу в scratch и переключает на нее соединение."""
+        path = os.path.join(scratch, 'benchmark.sqlite3')
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.execute(
+            'PRAGMA journal_mode = ' + ('DELETE' if plain else 'WAL')
+        )
+        target.close()
+        connection.close()
+        connection.settings_dict['NAME'] = path
+        if plain:
+            connection.settings_dict['PRAGMAS'] = {}
+            connection.settings_dict['IMMEDIATE_TRANSACTIONS'] = False
+        settings.MEDIA_ROOT = os.path.join(scratch, 'media')
+
+    def seed(self, workers):
+        tags = list(Tag.objects.values_list('id', flat=True)[:3])
+        if not tags:
+            tags = [Tag.objects.create(name='benchmark', slug='benchmark').id]
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:50]
+        )
+        if not ingredients:
+            ingredients = [
+                Ingredient.objects.create(
+                    name=f'benchmark {number}', measurement_unit='g'
+                ).id
+                for number in range(10)
+            ]
+        tokens = []
+        author = None
+        for number in range(workers):
+            user = User.objects.create_user(
+                username=f'sqlite-benchmark-{number}',
+                email=f'sqlite-benchmark-{number}@example.com',
+                password=None,
+            )
+            author = author or user
+            tokens.append(Token.objects.create(user=user).key)
+        recipes = list(Recipe.objects.values_list('id', flat=True)[:100])
+        for number in range(len(recipes), 20):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'benchmark {number}',
+                text='benchmark',
+                image='recipes/images/benchmark.png',
+                cooking_time=5,
+            )
+            recipe.tags.set(tags[:1])
+            recipes.append(recipe.id)
+        return tokens, {
+            'recipes': recipes,
+            'tags': tags,
+            'ingredients': ingredients,
+            'image': _image(),
+        }
+
+    def run(self, workers, seconds):
+        tokens, seed_data = self.seed(workers)
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(number, token, seconds, seed_data, results),
+            )
+            for number, token in enumerate(tokens)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        return collected, seconds
+
+    def report(self, result):
+        collected, seconds = result
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        for worker_timings, worker_errors in collected:
+            for kind, values in worker_timings.items():
+                timings[kind].extend(values)
+            for message, count in worker_errors.items():
+                errors[message] += count
+        total = sum(len(values) for values in timings.values())
+        for kind, _ in WORKLOAD:
+            values = sorted(timings.get(kind, []))
+            if not values:
+                continue
+            p95 = values[max(0, int(len(values) * 0.95) - 1)]
+            self.stdout.write(
+                f'{kind:>14}: {len(values):6} requests, '
+                f'median {statistics.median(values) * 1000:7.1f} ms, '
+                f'p95 {p95 * 1000:7.1f} ms'
+            )
+        self.stdout.write(f'{total / seconds:.0f} requests/s')
+        if errors:
+            for message, count in errors.items():
+                self.stdout.write(self.style.ERROR(f'{count} x {message}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No errors'))
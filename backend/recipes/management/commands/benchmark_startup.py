@@ -0,0 +1,78 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.warmup import WARMUP_URLS
+
+
+# Выполняется в новом интерпретаторе: время импорта приложения,
+# прогрева и первых запросов, как у только что запущенного воркера.
+SCRIPT = '''
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+from foodgram.wsgi import application
+imported = time.perf_counter()
+from foodgram.warmup import call, warm_up
+if sys.argv[1] == 'warm':
+    warm_up(application)
+warmed = time.perf_counter()
+first = [call(application, url)[1] for url in json.loads(sys.argv[2])]
+print(json.dumps({
+    'import': imported - started,
+    'warmup': warmed - imported,
+    'first': first,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure worker start-up: import time and first-request latency '
+        'with and without warmup, each run in a fresh interpreter'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Fresh interpreters per mode',
+        )
+
+    def handle(self, *args, **options):
+        urls = json.dumps(WARMUP_URLS)
+        for mode in ('cold', 'warm'):
+            results = [self.run(mode, urls) for _ in range(options['runs'])]
+            self.stdout.write(self.style.SUCCESS(mode))
+            self.write('import', [result['import'] for result in results])
+            if mode == 'warm':
+                self.write(
+                    'warmup', [result['warmup'] for result in results]
+                )
+            for index, url in enumerate(WARMUP_URLS):
+                self.write(
+                    f'first {url}',
+                    [result['first'][index] for result in results],
+                )
+
+    @staticmethod
+    def run(mode, urls):
+        process = subprocess.run(
+            [sys.executable, '-c', SCRIPT, mode, urls],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr)
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def write(self, label, values):
+        self.stdout.write(
+            f'  {label:<28} median {statistics.median(values) * 1000:8.1f} ms'
+        )
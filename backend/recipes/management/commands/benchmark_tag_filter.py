@@ -0,0 +1,118 @@
+import random
+import time
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.constants import PAGE_SIZE
+from recipes.models import Recipe, Tag
+from recipes.tag_masks import filter_by_tags, tag_mask
+
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare tag filtering through the M2M join with the tag_mask '
+        'column on the current database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            metavar='N',
+            help=(
+                'Add N synthetic recipes for the run; they are rolled '
+                'back afterwards'
+            ),
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Runs of every query',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                self.run(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        tags = list(Tag.objects.all())
+        for number in range(len(tags), 3):
+            tags.append(
+                Tag.objects.create(
+                    name=f'benchmark-{number}', slug=f'benchmark-{number}'
+                )
+            )
+        author = User.objects.create(
+            username='tag-benchmark', email='tag-benchmark@example.com'
+        )
+        generator = random.Random(0)
+        for start in range(0, count, 1000):
+            recipe_tags = [
+                generator.sample(tags, generator.randint(1, len(tags)))
+                for _ in range(min(1000, count - start))
+            ]
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=f'benchmark {start + number}',
+                    text='benchmark',
+                    image='recipes/images/benchmark.png',
+                    cooking_time=1,
+                    tag_mask=tag_mask(tag.id for tag in chosen),
+                )
+                for number, chosen in enumerate(recipe_tags)
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+                for recipe, chosen in zip(recipes, recipe_tags)
+                for tag in chosen
+            )
+
+    def run(self, repeat):
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:3])
+        self.stdout.write(
+            f'{Recipe.objects.count()} recipes, {len(tag_ids)} tags'
+        )
+        for size in range(1, len(tag_ids) + 1):
+            for selected in combinations(tag_ids, size):
+                selected = list(selected)
+                join = Recipe.objects.filter(tags__in=selected).distinct()
+                mask = filter_by_tags(Recipe.objects.all(), selected)
+                join_time, join_count = self.measure(join, repeat)
+                mask_time, mask_count = self.measure(mask, repeat)
+                style = (
+                    self.style.SUCCESS if join_count == mask_count
+                    else self.style.ERROR
+                )
+                self.stdout.write(style(
+                    f'tags {selected}: {join_count} recipes, '
+                    f'join {join_time:.2f} ms, mask {mask_time:.2f} ms '
+                    f'({mask_count} recipes)'
+                ))
+
+    @staticmethod
+    def measure(queryset, repeat):
+        """Среднее время страницы и подсчета, как у списка рецептов."""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.values_list('id', flat=True)[:PAGE_SIZE])
+            count = queryset.count()
+        return (time.perf_counter() - started) * 1000 / repeat, count
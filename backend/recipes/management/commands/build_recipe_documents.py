@@ -0,0 +1,109 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch, Q
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.constants import RECIPE_DOCUMENT_CHUNK_SIZE
+from api.documents import build_documents, render_recipes
+from api.serializers import RecipeReadSerializer
+from foodgram.warmup import internal_host
+from recipes.models import IngredientInRecipe, Recipe, RecipeDocument
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the precomputed recipe documents served by '
+        '/api/recipes/ list and detail'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Drop all documents and build them again',
+        )
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            metavar='N',
+            help=(
+                'Do not build anything, compare rendering N recipes with '
+                'RecipeReadSerializer and from documents'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'])
+        started = time.monotonic()
+        if options['rebuild']:
+            RecipeDocument.objects.all().delete()
+        missing = Recipe.objects.filter(
+            Q(document__isnull=True) | Q(document__document__isnull=True)
+        ).order_by('id').values_list('id', flat=True)
+        built = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                missing.filter(id__gt=last_id)[:RECIPE_DOCUMENT_CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+            built += len(build_documents(chunk))
+            last_id = chunk[-1]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Built {built} recipe documents in '
+                f'{time.monotonic() - started:.1f} s'
+            )
+        )
+
+    def benchmark(self, count):
+        request = Request(
+            APIRequestFactory().get('/api/recipes/', HTTP_HOST=internal_host())
+        )
+        recipe_ids = list(
+            Recipe.objects.order_by('-created_at').values_list(
+                'id', flat=True
+            )[:count]
+        )
+        build_documents(
+            list(
+                Recipe.objects.filter(
+                    Q(document__isnull=True)
+                    | Q(document__document__isnull=True),
+                    id__in=recipe_ids,
+                ).values_list('id', flat=True)
+            )
+        )
+        started = time.monotonic()
+        recipes = Recipe.objects.filter(id__in=recipe_ids).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+        RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+        serializer_time = time.monotonic() - started
+        started = time.monotonic()
+        render_recipes(
+            list(Recipe.objects.filter(id__in=recipe_ids).only(
+                'id', 'author'
+            )),
+            request,
+        )
+        documents_time = time.monotonic() - started
+        self.stdout.write(
+            f'{len(recipe_ids)} recipes: serializer '
+            f'{serializer_time * 1000:.1f} ms, documents '
+            f'{documents_time * 1000:.1f} ms'
+        )
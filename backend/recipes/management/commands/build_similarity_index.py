@@ -0,0 +1,132 @@
+import random
+import time
+import uuid
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.constants import SIMILAR_BENCHMARK_INGREDIENTS, SIMILAR_CHUNK_SIZE
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeBucket,
+)
+from recipes.similarity import recipe_buckets
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild MinHash/LSH buckets used by /api/recipes/{id}/similar/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            metavar='N',
+            help=(
+                'Seed N synthetic recipes, time the full rebuild and roll '
+                'everything back'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'])
+        started = time.monotonic()
+        with transaction.atomic():
+            recipes, rows = self.build()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Indexed {recipes} recipes in '
+                f'{time.monotonic() - started:.1f} s'
+            )
+        )
+
+    def build(self):
+        """
+        Пересобирает корзины всех рецептов; вызывается внутри транзакции.
+        Возвращает число рецептов и записанных корзин.
+        """
+        ingredient_rows = (
+            IngredientInRecipe.objects.order_by('recipe_id')
+            .values_list('recipe_id', 'ingredient_id')
+            .iterator(chunk_size=SIMILAR_CHUNK_SIZE)
+        )
+        recipes = rows = 0
+        buckets = []
+        RecipeBucket.objects.all().delete()
+        for recipe_id, group in groupby(ingredient_rows, key=itemgetter(0)):
+            buckets.extend(
+                recipe_buckets(recipe_id, [row[1] for row in group])
+            )
+            recipes += 1
+            if len(buckets) >= SIMILAR_CHUNK_SIZE:
+                RecipeBucket.objects.bulk_create(buckets)
+                rows += len(buckets)
+                buckets = []
+        RecipeBucket.objects.bulk_create(buckets)
+        return recipes, rows + len(buckets)
+
+    def seed(self, count):
+        """
+        Синтетический автор, справочник ингредиентов и count рецептов
+        по 3-15 ингредиентов; сигналы не вызываются (bulk_create).
+        """
+        generator = random.Random(0)
+        prefix = uuid.uuid4().hex[:8]
+        author = User.objects.create(
+            username=f'benchmark-{prefix}',
+            email=f'benchmark-{prefix}@example.com',
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark-{prefix}-{number}',
+                       measurement_unit='г')
+            for number in range(SIMILAR_BENCHMARK_INGREDIENTS)
+        )
+        ingredient_ids = [ingredient.pk for ingredient in ingredients]
+        for start in range(0, count, SIMILAR_CHUNK_SIZE):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=f'benchmark {number}',
+                    image='recipes/images/benchmark.png',
+                    text='benchmark',
+                    cooking_time=1,
+                )
+                for number in range(
+                    start, min(start + SIMILAR_CHUNK_SIZE, count)
+                )
+            )
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=1
+                )
+                for recipe in recipes
+                for ingredient_id in generator.sample(
+                    ingredient_ids, generator.randint(3, 15)
+                )
+            )
+
+    def benchmark(self, count):
+        with transaction.atomic():
+            started = time.monotonic()
+            self.seed(count)
+            seeded = time.monotonic() - started
+            started = time.monotonic()
+            recipes, rows = self.build()
+            elapsed = time.monotonic() - started
+            transaction.set_rollback(True)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Seeded {count} recipes in {seeded:.1f} s; indexed '
+                f'{recipes} recipes ({rows} buckets) in {elapsed:.1f} s: '
+                f'{recipes / elapsed:.0f} recipes/s, {rows / elapsed:.0f} '
+                f'rows/s. Rolled back'
+            )
+        )
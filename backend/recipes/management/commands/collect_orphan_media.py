@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.constants import (
+    MEDIA_ORPHAN_CHUNK_SIZE,
+    MEDIA_ORPHAN_GRACE_HOURS,
+    MEDIA_ORPHAN_WORKERS,
+)
+from recipes.media import (
+    media_directories,
+    referenced,
+    referenced_names,
+    remove,
+    walk,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete recipe images and avatars that no row references and that '
+        'are older than the grace period'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=MEDIA_ORPHAN_GRACE_HOURS,
+            help=(
+                'Keep files changed within this many hours '
+                f'(default: {MEDIA_ORPHAN_GRACE_HOURS})'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report orphaned files',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=MEDIA_ORPHAN_WORKERS,
+            help=f'Parallel deletions (default: {MEDIA_ORPHAN_WORKERS})',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=MEDIA_ORPHAN_CHUNK_SIZE,
+            help=(
+                'Rows and files handled per batch '
+                f'(default: {MEDIA_ORPHAN_CHUNK_SIZE})'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        chunk_size = max(1, options['chunk_size'])
+        # Порог берется до чтения ссылок: файл, сохраненный позже,
+        # моложе него. ctime меняется и при переносе загрузки в media.
+        cutoff = time.time() - options['grace_hours'] * 60 * 60
+        known = referenced_names(chunk_size)
+        self.orphaned = self.freed = 0
+        scanned = 0
+        chunk = []
+        with ThreadPoolExecutor(max(1, options['workers'])) as executor:
+            self.executor = executor
+            for directory in media_directories():
+                for name, info in walk(directory):
+                    scanned += 1
+                    if name in known or (
+                        max(info.st_mtime, info.st_ctime) >= cutoff
+                    ):
+                        continue
+                    chunk.append((name, info.st_size))
+                    if len(chunk) >= chunk_size:
+                        self.collect(chunk)
+                        chunk = []
+            self.collect(chunk)
+        action = 'Found' if self.dry_run else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action} {self.orphaned} orphaned files '
+                f'({self.freed / 1024 / 1024:.1f} MB) of {scanned} scanned '
+                f'in {time.monotonic() - started:.1f} s'
+            )
+        )
+
+    def collect(self, chunk):
+        # Ссылка могла появиться после чтения всех имен.
+        still_used = referenced(name for name, _ in chunk)
+        chunk = [
+            (name, size) for name, size in chunk if name not in still_used
+        ]
+        if self.verbosity > 1:
+            for name, _ in chunk:
+                self.stdout.write(name)
+        if self.dry_run:
+            self.orphaned += len(chunk)
+            self.freed += sum(size for _, size in chunk)
+            return
+        for size in self.executor.map(remove, [name for name, _ in chunk]):
+            if size:
+                self.orphaned += 1
+                self.freed += size
@@ -0,0 +1,125 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.constants import OUTBOX_BATCH_SIZE
+from recipes import outbox
+from recipes.ndjson import dumps
+from recipes.similarity import reindex_changes
+
+
+HANDLERS = ('log', 'similarity')
+
+
+class Command(BaseCommand):
+    help = (
+        'Read the change feed with a durable per-consumer cursor and pass '
+        'new events to a handler; --stats reports consumer lag'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'consumer',
+            nargs='?',
+            help='Consumer name; its cursor is stored in the database',
+        )
+        parser.add_argument(
+            '--handler',
+            choices=HANDLERS,
+            default='log',
+            help=(
+                'log: print events as NDJSON; similarity: reindex '
+                'recipes whose ingredients changed'
+            ),
+        )
+        parser.add_argument(
+            '--topic',
+            action='append',
+            help='Print only these topics (log handler, repeatable)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Keep polling for new events',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls with --follow',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Move the cursor to the end of the feed and exit',
+        )
+        parser.add_argument(
+            '--position',
+            type=int,
+            help='Move the cursor to this event id (0 replays the feed)',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print position, pending events and lag of every consumer',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.stats()
+        name = options['consumer']
+        if not name:
+            raise CommandError('Consumer name is required')
+        if options['reset'] or options['position'] is not None:
+            position = outbox.reset(name, options['position'])
+            self.stderr.write(f'{name}: cursor moved to {position}')
+            return
+        if options['handler'] == 'log':
+            topics = set(options['topic'] or ())
+            handler = self.log_handler(topics)
+        else:
+            handler = reindex_changes
+        total = 0
+        try:
+            while True:
+                count = outbox.consume(
+                    name, handler, options['batch_size']
+                )
+                total += count
+                if count < options['batch_size']:
+                    if not options['follow']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stderr.write(f'{name}: {total} events consumed')
+
+    def log_handler(self, topics):
+        def handler(changes):
+            for change in changes:
+                if topics and change.topic not in topics:
+                    continue
+                self.stdout.write(dumps({
+                    'id': change.id,
+                    'topic': change.topic,
+                    'object_id': change.object_id,
+                    'action': change.action,
+                    'payload': change.payload,
+                    'created_at': change.created_at,
+                }))
+            self.stdout.flush()
+        return handler
+
+    def stats(self):
+        consumers = outbox.lag()
+        if not consumers:
+            self.stdout.write('No consumers')
+        for consumer in consumers:
+            self.stdout.write(
+                f'{consumer["name"]:<24} position {consumer["position"]:>10}'
+                f'  pending {consumer["pending"]:>8}'
+                f'  lag {consumer["age"]:>9.1f} s'
+            )
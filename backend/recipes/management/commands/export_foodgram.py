@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from api.constants import NDJSON_CHUNK_SIZE
+from recipes.ndjson import export_lines, open_stream
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream recipes, users, subscriptions, favorites and shopping '
+        'carts to an NDJSON file (gzip for *.gz, "-" for stdout)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file, *.gz or "-"')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=NDJSON_CHUNK_SIZE,
+            help='Rows fetched per server-side cursor round trip',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        counts = Counter()
+        stream = open_stream(path, 'w')
+        try:
+            for label, line in export_lines(options['chunk_size']):
+                stream.write(line)
+                stream.write('\n')
+                counts[label] += 1
+        finally:
+            if path == '-':
+                stream.flush()
+                stream.detach()
+            else:
+                stream.close()
+        counts.pop(None, None)
+        # При выгрузке в stdout отчет уходит в stderr.
+        report = self.stderr if path == '-' else self.stdout
+        for label, count in counts.items():
+            report.write(f'{label}: {count}')
+        report.write(self.style.SUCCESS(f'Exported to {path}'))
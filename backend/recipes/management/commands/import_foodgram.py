@@ -0,0 +1,264 @@
+import json
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from api.catalog import bump_catalog_version
+from api.constants import NDJSON_CHUNK_SIZE
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from recipes.ndjson import FORMAT, MODELS, VERSION, keep_auto_now, open_stream
+from recipes.tag_masks import tag_mask
+
+
+MODELS_BY_LABEL = {model._meta.label_lower: model for model in MODELS}
+# Справочники читаются заново даже при продолжении с контрольной точки:
+# по ним строится соответствие id из выгрузки и id в этой базе.
+CATALOG_LABELS = {Tag._meta.label_lower, Ingredient._meta.label_lower}
+# Остальные строки сохраняют id из выгрузки, поэтому загружаются только
+# в пустые таблицы: иначе строка с занятым id молча пропустилась бы, а
+# ссылки на нее указали бы на чужие данные.
+DATA_MODELS = [
+    model for model in (*MODELS, IngredientInRecipe, Recipe.tags.through)
+    if model._meta.label_lower not in CATALOG_LABELS
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load an NDJSON dump made by export_foodgram into an empty '
+        'database with batched bulk_create; an interrupted load resumes '
+        'from its checkpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, *.gz or "-"')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=NDJSON_CHUNK_SIZE,
+            help='Objects per bulk_create and per checkpoint',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file (default: <path>.checkpoint)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore an existing checkpoint and load from the start',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.checkpoint = options['checkpoint']
+        if self.checkpoint is None and path != '-':
+            self.checkpoint = f'{path}.checkpoint'
+        self.done = 0 if options['restart'] else self.read_checkpoint()
+        if not self.done:
+            self.check_empty()
+        self.tag_ids = {}
+        self.ingredient_ids = {}
+        self.counts = Counter()
+        with open_stream(path, 'r') as stream, keep_auto_now(MODELS):
+            self.check_header(stream.readline())
+            self.load(stream, options['batch_size'])
+        self.reset_sequences()
+        bump_catalog_version('ingredients')
+        bump_catalog_version('tags')
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        for label, count in self.counts.items():
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Import completed. Copy the media files and run '
+                'build_similarity_index and update_trending --full.'
+            )
+        )
+
+    def read_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint, encoding='utf-8') as file:
+            done = int(file.read().strip() or 0)
+        self.stdout.write(f'Resuming after line {done}')
+        return done
+
+    def write_checkpoint(self, number):
+        if number <= self.done:
+            return
+        self.done = number
+        if not self.checkpoint:
+            return
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(str(number))
+        os.replace(temporary, self.checkpoint)
+
+    @staticmethod
+    def check_empty():
+        filled = [
+            model._meta.label_lower for model in DATA_MODELS
+            if model.objects.exists()
+        ]
+        if filled:
+            raise CommandError(
+                'The target database already has data in '
+                f'{", ".join(filled)}; import into a freshly migrated '
+                'database (tags and ingredients may exist) and create '
+                'the superuser afterwards'
+            )
+
+    @staticmethod
+    def check_header(line):
+        try:
+            header = json.loads(line)
+        except ValueError:
+            header = None
+        if (
+            not isinstance(header, dict)
+            or header.get('format') != FORMAT
+        ):
+            raise CommandError('Not an export_foodgram dump')
+        if header.get('version') != VERSION:
+            raise CommandError(
+                f'Unsupported dump version {header.get("version")}'
+            )
+
+    def load(self, stream, batch_size):
+        label = None
+        batch = []
+        number = 1
+        for number, line in enumerate(stream, start=2):
+            item = json.loads(line)
+            if item['model'] not in MODELS_BY_LABEL:
+                raise CommandError(
+                    f'Line {number}: unknown model {item["model"]}'
+                )
+            if number <= self.done and item['model'] not in CATALOG_LABELS:
+                continue
+            if item['model'] != label or len(batch) >= batch_size:
+                self.flush(label, batch, number - 1)
+                label = item['model']
+                batch = []
+            batch.append(item['fields'])
+        self.flush(label, batch, number)
+
+    def flush(self, label, rows, number):
+        """Вставляет пачку одной модели и сдвигает контрольную точку."""
+        if not rows:
+            return
+        model = MODELS_BY_LABEL[label]
+        loader = getattr(
+            self, f'load_{model._meta.model_name}', self.load_objects
+        )
+        with transaction.atomic():
+            loader(model, rows)
+        self.counts[label] += len(rows)
+        self.write_checkpoint(number)
+
+    @staticmethod
+    def load_objects(model, rows):
+        model.objects.bulk_create(
+            [model(**fields) for fields in rows], ignore_conflicts=True
+        )
+
+    @staticmethod
+    def check_conflicts(title, conflicts):
+        """
+        Строка справочника, пропущенная ignore_conflicts, но не найденная
+        по ключу, столкнулась с существующей по уникальному названию
+        (или id) при другой единице измерения или slug.
+        """
+        if conflicts:
+            raise CommandError(
+                f'{title} conflict with existing rows of the same name '
+                f'or id: {", ".join(conflicts)}; rename or remove them '
+                'and run the import again'
+            )
+
+    def load_tag(self, model, rows):
+        self.load_objects(model, rows)
+        existing = dict(
+            Tag.objects.filter(
+                slug__in=[fields['slug'] for fields in rows]
+            ).values_list('slug', 'id')
+        )
+        self.check_conflicts(
+            'Tags', [
+                f'{fields["name"]} ({fields["slug"]})' for fields in rows
+                if fields['slug'] not in existing
+            ]
+        )
+        for fields in rows:
+            self.tag_ids[fields['id']] = existing[fields['slug']]
+
+    def load_ingredient(self, model, rows):
+        self.load_objects(model, rows)
+        existing = {
+            (name, unit): ingredient_id
+            for name, unit, ingredient_id in Ingredient.objects.filter(
+                name__in=[fields['name'] for fields in rows]
+            ).values_list('name', 'measurement_unit', 'id')
+        }
+        self.check_conflicts(
+            'Ingredients', [
+                f'{fields["name"]} ({fields["measurement_unit"]})'
+                for fields in rows
+                if (fields['name'], fields['measurement_unit'])
+                not in existing
+            ]
+        )
+        for fields in rows:
+            self.ingredient_ids[fields['id']] = existing[
+                fields['name'], fields['measurement_unit']
+            ]
+
+    def load_recipe(self, model, rows):
+        """Рецепты вместе с ингредиентами и тегами одной пачкой."""
+        recipes = []
+        ingredients = []
+        tags = []
+        for fields in rows:
+            fields = dict(fields)
+            recipe_id = fields['id']
+            tag_ids = [
+                self.tag_ids.get(tag_id, tag_id)
+                for tag_id in fields.pop('tags')
+            ]
+            ingredients.extend(
+                IngredientInRecipe(
+                    id=link_id,
+                    recipe_id=recipe_id,
+                    ingredient_id=self.ingredient_ids.get(
+                        ingredient_id, ingredient_id
+                    ),
+                    amount=amount,
+                )
+                for link_id, ingredient_id, amount in fields.pop(
+                    'ingredients'
+                )
+            )
+            tags.extend(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in tag_ids
+            )
+            recipes.append(Recipe(**fields, tag_mask=tag_mask(tag_ids)))
+        Recipe.objects.bulk_create(recipes, ignore_conflicts=True)
+        IngredientInRecipe.objects.bulk_create(
+            ingredients, ignore_conflicts=True
+        )
+        Recipe.tags.through.objects.bulk_create(tags, ignore_conflicts=True)
+
+    @staticmethod
+    def reset_sequences():
+        """Сдвигает последовательности id после вставки с явными id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [*MODELS, IngredientInRecipe, Recipe.tags.through]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -2,6 +2,7 @@ import csv
 from pathlib import Path
 from django.core.management.base import BaseCommand
 
+from api.catalog import bump_catalog_version
 from recipes.models import Ingredient
 
 
@@ -10,6 +11,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
         self.load_ingredients()
+        bump_catalog_version('ingredients')
         self.stdout.write(
             self.style.SUCCESS('Loading of ingredients is completed')
         )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.constants import OUTBOX_RETENTION_DAYS
+from recipes import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete change feed events older than the retention period that '
+        'every consumer has already read'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=OUTBOX_RETENTION_DAYS,
+            help=f'Retention in days (default: {OUTBOX_RETENTION_DAYS})',
+        )
+
+    def handle(self, *args, **options):
+        deleted = outbox.prune(options['days'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} change feed events')
+        )
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+class Command(BaseCommand):
+    help = (
+        'SQLite maintenance: refresh planner statistics, checkpoint the '
+        'WAL and optionally VACUUM the database file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database alias (default: "default")',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run a full ANALYZE instead of PRAGMA optimize',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            choices=CHECKPOINT_MODES,
+            default='TRUNCATE',
+            help='wal_checkpoint mode (default: TRUNCATE)',
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help=(
+                'Rebuild the file with VACUUM; blocks writers and needs '
+                'free space equal to the database size'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                f'Database "{options["database"]}" is not SQLite'
+            )
+        with connection.cursor() as cursor:
+            if options['analyze']:
+                self.run(cursor, 'ANALYZE')
+            else:
+                self.run(cursor, 'PRAGMA optimize')
+            if options['vacuum']:
+                self.run(cursor, 'VACUUM')
+            busy, log, checkpointed = self.run(
+                cursor, f'PRAGMA wal_checkpoint({options["checkpoint"]})'
+            )
+        if busy:
+            self.stdout.write(
+                self.style.WARNING(
+                    'Checkpoint could not finish: database is busy'
+                )
+            )
+        elif log >= 0:
+            self.stdout.write(
+                f'WAL: {checkpointed} of {log} frames checkpointed'
+            )
+
+    def run(self, cursor, statement):
+        started = time.monotonic()
+        cursor.execute(statement)
+        row = cursor.fetchone()
+        self.stdout.write(
+            f'{statement}: {time.monotonic() - started:.2f} s'
+        )
+        return row
@@ -0,0 +1,144 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.constants import (
+    TRENDING_CHUNK_SIZE,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_OVERLAP_MINUTES,
+    TRENDING_REBASE_EXPONENT,
+)
+from recipes.models import RecipeScore, TrendingState
+from recipes.trending import WEIGHTS, contribution, decay_rate
+
+
+class Command(BaseCommand):
+    help = (
+        'Incrementally update trending recipe scores from new favorites '
+        'and shopping cart additions; rows of the last '
+        f'{TRENDING_OVERLAP_MINUTES} minutes are recounted on every run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Drop all scores and rebuild them from scratch',
+        )
+        parser.add_argument(
+            '--half-life',
+            type=float,
+            default=TRENDING_HALF_LIFE_HOURS,
+            help='Score half-life in hours (changing it forces --full)',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        state = TrendingState.objects.select_for_update().first()
+        if state is None:
+            state = TrendingState.objects.create()
+        now = timezone.now()
+        half_life = options['half_life']
+        if options['full'] or state.half_life_hours != half_life:
+            RecipeScore.objects.all().delete()
+            state.settled_until = None
+            state.half_life_hours = half_life
+            state.epoch = now
+        decay = decay_rate(half_life)
+        self.rebase(state, now, decay)
+
+        # Строка с created_at позже cutoff может стать видимой позже
+        # строк с большим временем (ее транзакция еще не зафиксирована),
+        # поэтому такие строки пересчитываются каждый раз, а в base
+        # попадают на следующих запусках.
+        cutoff = now - timedelta(minutes=TRENDING_OVERLAP_MINUTES)
+        if state.settled_until is not None:
+            cutoff = max(cutoff, state.settled_until)
+        settled = defaultdict(float)
+        recent = defaultdict(float)
+        for model, weight in WEIGHTS.items():
+            self.collect(
+                model, weight, state, decay, cutoff, settled, recent
+            )
+        updated = self.apply(settled, recent)
+        state.settled_until = cutoff
+        state.save()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Trending scores updated for {updated} recipes'
+            )
+        )
+
+    @staticmethod
+    def rebase(state, now, decay):
+        """
+        Переносит точку отсчета, пока множитель exp(decay * t) не
+        вышел за пределы float: все рейтинги умножаются на одно число.
+        """
+        exponent = decay * (now - state.epoch).total_seconds()
+        if exponent < TRENDING_REBASE_EXPONENT:
+            return
+        factor = math.exp(-exponent)
+        RecipeScore.objects.update(
+            base=F('base') * factor, score=F('score') * factor
+        )
+        state.epoch = now
+
+    @staticmethod
+    def collect(model, weight, state, decay, cutoff, settled, recent):
+        """
+        Вклады строк model после settled_until: до cutoff - в settled,
+        новее - в recent.
+        """
+        rows = model.objects.all()
+        if state.settled_until is not None:
+            rows = rows.filter(created_at__gte=state.settled_until)
+        for recipe_id, created_at in rows.values_list(
+            'recipe_id', 'created_at'
+        ).iterator(chunk_size=TRENDING_CHUNK_SIZE):
+            target = settled if created_at < cutoff else recent
+            target[recipe_id] += contribution(
+                weight, created_at, state.epoch, decay
+            )
+
+    @staticmethod
+    def apply(settled, recent):
+        """
+        Добавляет settled к base и ставит score = base + recent. Рецепты,
+        у которых недавние строки исчезли, возвращаются к base.
+        """
+        recipe_ids = sorted(
+            set(settled) | set(recent) | set(
+                RecipeScore.objects.exclude(score=F('base'))
+                .values_list('recipe_id', flat=True)
+            )
+        )
+        for start in range(0, len(recipe_ids), TRENDING_CHUNK_SIZE):
+            chunk = recipe_ids[start:start + TRENDING_CHUNK_SIZE]
+            scores = RecipeScore.objects.in_bulk(chunk)
+            now = timezone.now()
+            for recipe_id, recipe_score in scores.items():
+                recipe_score.base += settled.get(recipe_id, 0)
+                recipe_score.score = (
+                    recipe_score.base + recent.get(recipe_id, 0)
+                )
+                recipe_score.updated_at = now
+            RecipeScore.objects.bulk_update(
+                scores.values(), ['base', 'score', 'updated_at']
+            )
+            RecipeScore.objects.bulk_create(
+                RecipeScore(
+                    recipe_id=recipe_id,
+                    base=settled.get(recipe_id, 0),
+                    score=settled.get(recipe_id, 0)
+                    + recent.get(recipe_id, 0),
+                )
+                for recipe_id in chunk
+                if recipe_id not in scores
+            )
+        return len(recipe_ids)
@@ -0,0 +1,110 @@
+"""
+Файлы изображений рецептов и аватаров. Замененный или удаленный файл
+удаляется из хранилища только после фиксации транзакции и только если
+на него больше не ссылается ни одна строка: при откате старый файл
+остается на месте. Сирот, оставшихся от прошлого, находит команда
+collect_orphan_media.
+"""
+import logging
+import os
+
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+
+from recipes.models import Recipe, User
+
+
+logger = logging.getLogger(__name__)
+
+MEDIA_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def stored_name(instance, field):
+    """Имя файла в поле или None, если поле не загружено."""
+    if field not in instance.__dict__:
+        return None
+    value = instance.__dict__[field]
+    return getattr(value, 'name', value) or ''
+
+
+def media_directories():
+    """Каталоги upload_to файловых полей относительно MEDIA_ROOT."""
+    return sorted({
+        model._meta.get_field(field).upload_to.strip('/')
+        for model, field in MEDIA_FIELDS
+    })
+
+
+def referenced(names):
+    """Какие из имен файлов записаны в полях моделей в основной БД."""
+    names = list(names)
+    result = set()
+    for model, field in MEDIA_FIELDS:
+        result.update(
+            model.objects.using(router.db_for_write(model))
+            .filter(**{f'{field}__in': names})
+            .values_list(field, flat=True)
+        )
+    return result
+
+
+def referenced_names(chunk_size):
+    """Все имена файлов в полях моделей, читаются порциями."""
+    names = set()
+    for model, field in MEDIA_FIELDS:
+        names.update(
+            model.objects.using(router.db_for_write(model))
+            .exclude(**{field: ''})
+            .values_list(field, flat=True)
+            .iterator(chunk_size=chunk_size)
+        )
+    return names
+
+
+def walk(directory):
+    """
+    Файлы каталога хранилища и его подкаталогов по одному, без
+    чтения дерева целиком: пары (имя, os.stat_result).
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(default_storage.path(current))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f'{current}/{entry.name}'
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(name)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield name, entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+
+
+def remove(name):
+    """Удаляет файл; возвращает число освобожденных байт."""
+    path = default_storage.path(name)
+    try:
+        size = os.stat(path).st_size
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def _delete_unreferenced(name):
+    try:
+        if name not in referenced([name]):
+            remove(name)
+    except Exception:
+        logger.exception('Could not delete media file %s', name)
+
+
+def delete_on_commit(name):
+    """Удаляет файл после фиксации текущей транзакции."""
+    if name:
+        transaction.on_commit(lambda: _delete_unreferenced(name))
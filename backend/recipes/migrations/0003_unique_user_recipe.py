@@ -0,0 +1,53 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:35
+
+from django.db import migrations, models
+from django.db.models import Min
+import django.utils.timezone
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name in ('Favorite', 'ShoppingCart'):
+        model = apps.get_model('recipes', model_name)
+        keep_ids = (
+            model.objects.values('user', 'recipe')
+            .annotate(keep_id=Min('id'))
+            .values('keep_id')
+        )
+        model.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'ordering': ('-created_at',), 'verbose_name': 'Избранный рецепт', 'verbose_name_plural': 'Избранные рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'default_related_name': 'recipes', 'ordering': ('-created_at',), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'ordering': ('-created_at',), 'verbose_name': 'Рецепт в корзине', 'verbose_name_plural': 'Рецепты в корзине'},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_shoppingcart'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_unique_user_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(db_index=True, default=0, verbose_name='Рейтинг')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг рецепта',
+                'verbose_name_plural': 'Рейтинги рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_favorite_id', models.BigIntegerField(default=0)),
+                ('last_shopping_cart_id', models.BigIntegerField(default=0)),
+                ('half_life_hours', models.FloatField(default=0)),
+                ('epoch', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Состояние рейтинга',
+                'verbose_name_plural': 'Состояние рейтинга',
+            },
+        ),
+    ]
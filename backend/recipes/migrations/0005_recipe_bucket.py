@@ -0,0 +1,28 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Полоса')),
+                ('bucket', models.BigIntegerField(verbose_name='Корзина')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_buckets', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Корзина похожих рецептов',
+                'verbose_name_plural': 'Корзины похожих рецептов',
+                'indexes': [models.Index(fields=['band', 'bucket'], name='recipebucket_band_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLinkHits',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='short_link_hits', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('hits', models.PositiveBigIntegerField(default=0, verbose_name='Переходы')),
+            ],
+            options={
+                'verbose_name': 'Переходы по короткой ссылке',
+                'verbose_name_plural': 'Переходы по коротким ссылкам',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+INDEXES = (
+    # '^name' у рецептов и '^recipe__name' у избранного, списков
+    # покупок и ингредиентов рецепта: UPPER("name"::text) LIKE 'X%'.
+    ('recipes_recipe_name_upper_idx', 'recipes_recipe', 'name'),
+    # '^name' в справочнике и '^ingredient__name' у ингредиентов рецепта.
+    ('recipes_ingredient_name_upper_idx', 'recipes_ingredient', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'((UPPER({column}::text)) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_short_link_hits'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
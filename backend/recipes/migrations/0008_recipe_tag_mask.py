@@ -0,0 +1,38 @@
+# Generated by Django 4.2.18 on 2026-10-19 07:49
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from api.constants import TAG_MASK_BITS
+
+
+def fill_tag_masks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    masks = defaultdict(int)
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+        'recipe_id', 'tag_id'
+    ).iterator():
+        if 0 < tag_id <= TAG_MASK_BITS:
+            masks[recipe_id] |= 1 << (tag_id - 1)
+    by_mask = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        by_mask[mask].append(recipe_id)
+    for mask, ids in by_mask.items():
+        Recipe.objects.filter(id__in=ids).update(tag_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:01
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_tag_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('topic', models.CharField(max_length=32, verbose_name='Тема')),
+                ('object_id', models.BigIntegerField(verbose_name='Объект')),
+                ('action', models.CharField(max_length=16, verbose_name='Действие')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата события')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeConsumer',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Потребитель')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Последнее событие')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Потребитель изменений',
+                'verbose_name_plural': 'Потребители изменений',
+            },
+        ),
+    ]
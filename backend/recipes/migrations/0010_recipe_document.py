@@ -0,0 +1,26 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('document', models.JSONField(verbose_name='Документ')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата сборки')),
+            ],
+            options={
+                'verbose_name': 'Документ рецепта',
+                'verbose_name_plural': 'Документы рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Нечеткий поиск ингредиентов использует оператор pg_trgm %>, который
+# ускоряет только GIN-индекс с gin_trgm_ops. В остальных БД
+# поиск идет по индексу триграмм в памяти процесса.
+INDEX_NAME = 'recipes_ingredient_name_trgm_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON recipes_ingredient USING gin (name gin_trgm_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_document'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_index, drop_index),
+    ]
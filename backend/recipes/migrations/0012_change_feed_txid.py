@@ -0,0 +1,27 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredient_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(default=0, verbose_name='Транзакция'),
+        ),
+        migrations.AddField(
+            model_name='changeconsumer',
+            name='txid',
+            field=models.BigIntegerField(default=0, verbose_name='Транзакция последнего события'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['txid', 'id'], name='recipes_change_txid_id_idx'),
+        ),
+    ]
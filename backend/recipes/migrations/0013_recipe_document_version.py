@@ -0,0 +1,23 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_change_feed_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipedocument',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Версия'),
+        ),
+        migrations.AlterField(
+            model_name='recipedocument',
+            name='document',
+            field=models.JSONField(null=True, verbose_name='Документ'),
+        ),
+    ]
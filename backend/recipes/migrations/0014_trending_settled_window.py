@@ -0,0 +1,41 @@
+# Generated by Django 4.2.18 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+def reset_scores(apps, schema_editor):
+    """
+    Старые рейтинги учитывали строки по курсору id: следующий запуск
+    update_trending пересчитает их с нуля.
+    """
+    apps.get_model('recipes', 'RecipeScore').objects.all().delete()
+    apps.get_model('recipes', 'TrendingState').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_document_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_scores, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='trendingstate',
+            name='last_favorite_id',
+        ),
+        migrations.RemoveField(
+            model_name='trendingstate',
+            name='last_shopping_cart_id',
+        ),
+        migrations.AddField(
+            model_name='recipescore',
+            name='base',
+            field=models.FloatField(default=0, verbose_name='Учтенный рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='trendingstate',
+            name='settled_until',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
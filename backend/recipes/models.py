@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models import UniqueConstraint
+from django.utils import timezone
 
 from api.constants import (
     AMOUNT_MAX,
@@ -98,6 +99,12 @@ class Recipe(models.Model):
         Tag,
         verbose_name='Теги'
     )
+    tag_mask = models.BigIntegerField(
+        verbose_name='Маска тегов',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
     cooking_time = models.PositiveSmallIntegerField(
         validators=[
             MinValueValidator(
@@ -186,7 +193,7 @@ class ShoppingCart(UserRecipeBaseModel):
         related_name='in_shopping_cart',
     )
 
-    class Meta:
+    class Meta(UserRecipeBaseModel.Meta):
         verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Рецепты в корзине'
 
@@ -212,7 +219,7 @@ class Favorite(UserRecipeBaseModel):
         related_name='favorited_by',
     )
 
-    class Meta:
+    class Meta(UserRecipeBaseModel.Meta):
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
 
@@ -220,3 +227,170 @@ class Favorite(UserRecipeBaseModel):
         return (
             f'{self.user.username} добавил в корзину {self.recipe.name}'
         )
+
+
+class RecipeScore(models.Model):
+    """
+    Рейтинг популярности рецепта. Хранится как сумма весов добавлений
+    в избранное и корзину с экспоненциальным затуханием, приведенная
+    к моменту TrendingState.epoch, поэтому старые строки не пересчитываются.
+    base - вклад строк до TrendingState.settled_until, score - base
+    плюс пересчитываемый каждый раз вклад более новых строк.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    base = models.FloatField('Учтенный рейтинг', default=0)
+    score = models.FloatField('Рейтинг', default=0, db_index=True)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score}'
+
+
+class TrendingState(models.Model):
+    """
+    Состояние пересчета рейтинга: граница учтенных в RecipeScore.base
+    строк и параметры затухания.
+    """
+
+    settled_until = models.DateTimeField(null=True)
+    half_life_hours = models.FloatField(default=0)
+    epoch = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга'
+        verbose_name_plural = 'Состояние рейтинга'
+
+    def __str__(self):
+        return f'Рейтинг на {self.updated_at}'
+
+
+class RecipeBucket(models.Model):
+    """LSH-корзина MinHash-сигнатуры ингредиентов рецепта."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarity_buckets',
+        verbose_name='Рецепт',
+    )
+    band = models.PositiveSmallIntegerField('Полоса')
+    bucket = models.BigIntegerField('Корзина')
+
+    class Meta:
+        verbose_name = 'Корзина похожих рецептов'
+        verbose_name_plural = 'Корзины похожих рецептов'
+        indexes = [
+            models.Index(
+                fields=('band', 'bucket'),
+                name='recipebucket_band_bucket'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.bucket}'
+
+
+class ShortLinkHits(models.Model):
+    """Счетчик переходов по короткой ссылке рецепта."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='short_link_hits',
+        verbose_name='Рецепт',
+    )
+    hits = models.PositiveBigIntegerField('Переходы', default=0)
+
+    class Meta:
+        verbose_name = 'Переходы по короткой ссылке'
+        verbose_name_plural = 'Переходы по коротким ссылкам'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.hits}'
+
+
+class RecipeDocument(models.Model):
+    """
+    Готовое представление рецепта без полей, зависящих от пользователя.
+    Сбрасывается при изменении рецепта с увеличением версии и
+    собирается заново при чтении.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт',
+    )
+    document = models.JSONField('Документ', null=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Дата сборки', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.version}'
+
+
+class Change(models.Model):
+    """
+    Событие исходящей очереди изменений. Пишется в той же транзакции,
+    что и само изменение, поэтому потребители видят только
+    зафиксированные изменения и не теряют их. txid - номер транзакции
+    PostgreSQL (в других БД 0): журнал читается в порядке (txid, id).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField('Транзакция', default=0)
+    topic = models.CharField('Тема', max_length=32)
+    object_id = models.BigIntegerField('Объект')
+    action = models.CharField('Действие', max_length=16)
+    payload = models.JSONField('Данные', default=dict)
+    created_at = models.DateTimeField(
+        'Дата события', default=timezone.now, db_index=True
+    )
+
+    class Meta:
+        ordering = ('id',)
+        indexes = (
+            models.Index(
+                fields=('txid', 'id'), name='recipes_change_txid_id_idx'
+            ),
+        )
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+
+    def __str__(self):
+        return f'{self.id}: {self.topic} {self.object_id} {self.action}'
+
+
+class ChangeConsumer(models.Model):
+    """Курсор потребителя журнала изменений: (txid, position)."""
+
+    name = models.CharField('Потребитель', max_length=64, primary_key=True)
+    txid = models.BigIntegerField('Транзакция последнего события', default=0)
+    position = models.BigIntegerField('Последнее событие', default=0)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Потребитель изменений'
+        verbose_name_plural = 'Потребители изменений'
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
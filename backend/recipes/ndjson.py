@@ -0,0 +1,166 @@
+"""
+Потоковая выгрузка данных в NDJSON: первая строка - заголовок, далее
+по одному объекту {"model": ..., "fields": {...}} на строку. Разделы
+идут в порядке зависимостей (теги, ингредиенты, пользователи,
+подписки, рецепты, избранное, корзины), поэтому загрузка вставляет
+строки пачками без отложенных ссылок. Рецепт несет ингредиенты и теги
+внутри себя. Все таблицы читаются в одной транзакции (в PostgreSQL -
+REPEATABLE READ), поэтому ссылки в выгрузке согласованы даже при
+параллельной записи. Изображения и аватары хранятся как пути в
+хранилище медиафайлов, сами файлы переносятся отдельно.
+"""
+import datetime
+import gzip
+import io
+import json
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription, User
+
+
+FORMAT = 'foodgram-ndjson'
+VERSION = 1
+
+MODELS = (
+    Tag, Ingredient, User, Subscription, Recipe, Favorite, ShoppingCart
+)
+# Поля, которые не выгружаются: маска тегов пересчитывается при загрузке.
+EXCLUDED_FIELDS = {Recipe: {'tag_mask'}}
+
+
+def model_fields(model):
+    """attname всех собственных полей модели, включая внешние ключи."""
+    excluded = EXCLUDED_FIELDS.get(model, set())
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.name not in excluded
+    ]
+
+
+def open_stream(path, mode):
+    """Открывает файл или stdin/stdout ('-'); .gz сжимается gzip."""
+    if path == '-':
+        if mode == 'r':
+            stream = sys.stdin.buffer
+        else:
+            stream = sys.stdout.buffer
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def header():
+    return {'format': FORMAT, 'version': VERSION}
+
+
+class DumpEncoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder обрезает их до мс."""
+
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def dumps(obj):
+    return json.dumps(obj, cls=DumpEncoder, ensure_ascii=False)
+
+
+@contextmanager
+def snapshot(database):
+    """
+    Транзакция только для чтения с одним снимком данных на все
+    запросы. В SQLite с IMMEDIATE_TRANSACTIONS она держит блокировку
+    записи до конца выгрузки.
+    """
+    connection = connections[database]
+    with transaction.atomic(using=database):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ '
+                    'READ ONLY'
+                )
+        yield
+
+
+def export_lines(chunk_size):
+    """
+    Пары (модель, строка) выгрузки, для заголовка модель - None.
+    Каждая таблица читается серверным курсором из одного снимка.
+    """
+    database = router.db_for_read(Recipe)
+    yield None, dumps(header())
+    with snapshot(database):
+        for model in MODELS:
+            label = model._meta.label_lower
+            for fields in export_rows(model, chunk_size, database):
+                yield label, dumps({'model': label, 'fields': fields})
+
+
+def export_rows(model, chunk_size, database):
+    rows = (
+        model.objects.using(database).order_by('pk')
+        .values(*model_fields(model))
+        .iterator(chunk_size=chunk_size)
+    )
+    if model is not Recipe:
+        yield from rows
+        return
+    while chunk := list(islice(rows, chunk_size)):
+        recipe_ids = [row['id'] for row in chunk]
+        ingredients = defaultdict(list)
+        for recipe_id, *values in IngredientInRecipe.objects.using(
+            database
+        ).filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id', 'id', 'ingredient_id', 'amount'
+        ):
+            ingredients[recipe_id].append(values)
+        tags = defaultdict(list)
+        for recipe_id, tag_id in Recipe.tags.through.objects.using(
+            database
+        ).filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'tag_id'):
+            tags[recipe_id].append(tag_id)
+        for row in chunk:
+            row['ingredients'] = ingredients[row['id']]
+            row['tags'] = tags[row['id']]
+            yield row
+
+
+@contextmanager
+def keep_auto_now(models):
+    """
+    Временно отключает auto_now/auto_now_add, чтобы bulk_create
+    сохранил даты из выгрузки, а не текущее время.
+    """
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            for attr in ('auto_now', 'auto_now_add'):
+                if getattr(field, attr, False):
+                    setattr(field, attr, False)
+                    changed.append((field, attr))
+    try:
+        yield
+    finally:
+        for field, attr in changed:
+            setattr(field, attr, True)
@@ -0,0 +1,184 @@
+"""
+Журнал изменений (transactional outbox). record() пишет событие в
+таблицу Change в текущей транзакции, поэтому событие появляется
+тогда и только тогда, когда зафиксировано само изменение.
+Потребители читают журнал пачками по своему курсору
+ChangeConsumer.position и сдвигают его в той же транзакции, что и
+собственные записи: при ошибке пачка будет прочитана повторно.
+
+id событий выдаются при вставке, а транзакции фиксируются в другом
+порядке, и событие с меньшим id может стать видимым позже большего.
+Поэтому в PostgreSQL событие хранит номер своей транзакции, журнал
+читается в порядке (txid, id) и только ниже xmin текущего снимка:
+транзакции с меньшим номером уже завершены, и новые события за
+курсором не появятся. Долгая незавершенная транзакция задерживает
+чтение, но не приводит к потере событий. В SQLite транзакции записи
+идут по одной, порядок id совпадает с порядком фиксации, txid = 0.
+"""
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import BigIntegerField, Func, Min, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from api.constants import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_PRUNE_CHUNK_SIZE,
+    OUTBOX_RETENTION_DAYS,
+)
+from recipes.models import (
+    Change,
+    ChangeConsumer,
+    Favorite,
+    ShoppingCart,
+)
+
+
+TOPIC_FAVORITE = 'favorite'
+TOPIC_RECIPE = 'recipe'
+TOPIC_RECIPE_INGREDIENTS = 'recipe_ingredients'
+TOPIC_RECIPE_TAGS = 'recipe_tags'
+TOPIC_SHOPPING_CART = 'shopping_cart'
+TOPIC_SUBSCRIPTION = 'subscription'
+TOPIC_USER_AVATAR = 'user_avatar'
+
+RELATION_TOPICS = {
+    Favorite: TOPIC_FAVORITE,
+    ShoppingCart: TOPIC_SHOPPING_CART,
+}
+
+ACTION_ADD = 'add'
+ACTION_CLEAR = 'clear'
+ACTION_CREATE = 'create'
+ACTION_DELETE = 'delete'
+ACTION_REMOVE = 'remove'
+ACTION_UPDATE = 'update'
+
+
+def _is_postgresql():
+    return connections[router.db_for_write(Change)].vendor == 'postgresql'
+
+
+def _txid():
+    """Номер текущей транзакции для новых событий."""
+    if _is_postgresql():
+        return Func(function='txid_current', output_field=BigIntegerField())
+    return 0
+
+
+def record(topic, object_id, action, **payload):
+    """Записывает событие в текущей транзакции."""
+    Change.objects.create(
+        txid=_txid(), topic=topic, object_id=object_id, action=action,
+        payload=payload,
+    )
+
+
+def record_many(topic, action, items):
+    """Записывает события одной вставкой; items - пары (id, payload)."""
+    txid = _txid()
+    Change.objects.bulk_create([
+        Change(txid=txid, topic=topic, object_id=object_id, action=action,
+               payload=payload)
+        for object_id, payload in items
+    ])
+
+
+def after(txid, position):
+    """События за курсором (txid, position)."""
+    return Change.objects.filter(
+        Q(txid__gt=txid) | Q(txid=txid, id__gt=position)
+    )
+
+
+def read(txid, position, batch_size=OUTBOX_BATCH_SIZE):
+    """Следующие события за курсором, уже точно зафиксированные."""
+    queryset = after(txid, position)
+    if _is_postgresql():
+        queryset = queryset.filter(txid__lt=RawSQL(
+            'txid_snapshot_xmin(txid_current_snapshot())', []
+        ))
+    return list(queryset.order_by('txid', 'id')[:batch_size])
+
+
+def consume(name, handler, batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Передает handler следующую пачку событий потребителя name и
+    сдвигает его курсор. Строка курсора блокируется, так что два
+    процесса одного потребителя не обработают пачку дважды.
+    Возвращает число обработанных событий.
+    """
+    with transaction.atomic():
+        consumer, _ = (
+            ChangeConsumer.objects.select_for_update()
+            .get_or_create(name=name)
+        )
+        changes = read(consumer.txid, consumer.position, batch_size)
+        if changes:
+            handler(changes)
+            consumer.txid = changes[-1].txid
+            consumer.position = changes[-1].id
+            consumer.save(update_fields=('txid', 'position', 'updated_at'))
+    return len(changes)
+
+
+def reset(name, position=None):
+    """
+    Ставит курсор на событие position или на конец журнала; с
+    position = 0 журнал читается заново.
+    """
+    if position is None:
+        last = Change.objects.order_by('txid', 'id').last()
+        txid, position = (last.txid, last.id) if last else (0, 0)
+    else:
+        txid = Change.objects.filter(id=position).values_list(
+            'txid', flat=True
+        ).first() or 0
+    ChangeConsumer.objects.update_or_create(
+        name=name, defaults={'txid': txid, 'position': position}
+    )
+    return position
+
+
+def lag():
+    """
+    Отставание потребителей: число непрочитанных событий и возраст
+    самого старого из них в секундах.
+    """
+    now = timezone.now()
+    result = []
+    for consumer in ChangeConsumer.objects.order_by('name'):
+        pending = after(consumer.txid, consumer.position)
+        oldest = pending.aggregate(Min('created_at'))['created_at__min']
+        result.append({
+            'name': consumer.name,
+            'position': consumer.position,
+            'pending': pending.count(),
+            'age': (now - oldest).total_seconds() if oldest else 0,
+        })
+    return result
+
+
+def prune(days=OUTBOX_RETENTION_DAYS, chunk_size=OUTBOX_PRUNE_CHUNK_SIZE):
+    """
+    Удаляет события старше days, которые прочитали все потребители.
+    Удаляет порциями, чтобы не держать долгих блокировок.
+    """
+    queryset = Change.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=days)
+    )
+    slowest = ChangeConsumer.objects.order_by('txid', 'position').first()
+    if slowest is not None:
+        queryset = queryset.filter(
+            Q(txid__lt=slowest.txid)
+            | Q(txid=slowest.txid, id__lte=slowest.position)
+        )
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list(
+            'id', flat=True
+        )[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += Change.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,184 @@
+"""
+Короткие ссылки на рецепты. Код - base62 от перемешанного id рецепта,
+поэтому раскодируется без обращения к БД. Существование рецепта
+проверяется по памяти процесса, затем по общему кешу и только потом
+по БД. Память процесса помнит рецепт SHORT_LINK_MEMORY_TTL секунд:
+удаление в другом воркере сбрасывает только общий кеш. Отсутствие
+рецепта тоже кешируется, на SHORT_LINK_MISS_TIMEOUT секунд, чтобы
+перебор кодов не доходил до БД; запись сбрасывается при создании
+рецепта.
+
+Переходы копятся в памяти и пишутся в ShortLinkHits фоновым потоком
+процесса, запрос их не ждет. Счетчик увеличивается через F(), так что
+одновременные сбросы разных воркеров не теряют переходы.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from api.constants import (
+    SHORT_LINK_ALPHABET,
+    SHORT_LINK_CACHE_TIMEOUT,
+    SHORT_LINK_FLUSH_HITS,
+    SHORT_LINK_FLUSH_INTERVAL,
+    SHORT_LINK_LENGTH,
+    SHORT_LINK_MEMORY_SIZE,
+    SHORT_LINK_MEMORY_TTL,
+    SHORT_LINK_MISS_TIMEOUT,
+    SHORT_LINK_MULTIPLIER,
+)
+from recipes.models import Recipe, ShortLinkHits
+
+
+logger = logging.getLogger(__name__)
+
+BASE = len(SHORT_LINK_ALPHABET)
+MODULUS = BASE ** SHORT_LINK_LENGTH
+INVERSE = pow(SHORT_LINK_MULTIPLIER, -1, MODULUS)
+CACHE_KEY = 'short-link:{}'
+
+_known = OrderedDict()
+_known_lock = threading.Lock()
+
+_hits = Counter()
+_hits_lock = threading.Lock()
+_flush_due = threading.Event()
+_flusher_pid = None
+
+
+def encode(recipe_id):
+    """Код короткой ссылки для id рецепта."""
+    number = recipe_id * SHORT_LINK_MULTIPLIER % MODULUS
+    chars = []
+    for _ in range(SHORT_LINK_LENGTH):
+        number, remainder = divmod(number, BASE)
+        chars.append(SHORT_LINK_ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """id рецепта по коду или None для некорректного кода."""
+    if len(code) != SHORT_LINK_LENGTH:
+        return None
+    number = 0
+    for char in code:
+        index = SHORT_LINK_ALPHABET.find(char)
+        if index < 0:
+            return None
+        number = number * BASE + index
+    recipe_id = number * INVERSE % MODULUS
+    return recipe_id or None
+
+
+def _remember(recipe_id):
+    with _known_lock:
+        _known[recipe_id] = time.monotonic() + SHORT_LINK_MEMORY_TTL
+        _known.move_to_end(recipe_id)
+        if len(_known) > SHORT_LINK_MEMORY_SIZE:
+            _known.popitem(last=False)
+
+
+def recipe_exists(recipe_id):
+    """Проверяет рецепт: память процесса, затем кеш, затем БД."""
+    with _known_lock:
+        if _known.get(recipe_id, 0) > time.monotonic():
+            return True
+    key = CACHE_KEY.format(recipe_id)
+    exists = cache.get(key)
+    if exists is None:
+        exists = Recipe.objects.filter(id=recipe_id).exists()
+        cache.set(
+            key,
+            exists,
+            SHORT_LINK_CACHE_TIMEOUT if exists else SHORT_LINK_MISS_TIMEOUT,
+        )
+    if exists:
+        _remember(recipe_id)
+    return exists
+
+
+def forget(recipe_id):
+    """
+    Убирает рецепт из памяти процесса и общего кеша: после удаления
+    и после создания (сбрасывает закешированный промах). Память других
+    воркеров устареет за SHORT_LINK_MEMORY_TTL.
+    """
+    with _known_lock:
+        _known.pop(recipe_id, None)
+    cache.delete(CACHE_KEY.format(recipe_id))
+
+
+def _start_flusher():
+    """Фоновый поток сброса переходов, один на процесс (и после fork)."""
+    global _flusher_pid
+    with _hits_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(
+        target=_flush_loop, name='short-link-hits', daemon=True
+    ).start()
+
+
+def _flush_loop():
+    while True:
+        _flush_due.wait(SHORT_LINK_FLUSH_INTERVAL)
+        _flush_due.clear()
+        try:
+            flush_hits()
+        except Exception:
+            logger.exception('Could not flush short link hits')
+        finally:
+            connection.close()
+
+
+def count_hit(recipe_id):
+    """Учитывает переход; в БД счетчики уходят из фонового потока."""
+    _start_flusher()
+    with _hits_lock:
+        _hits[recipe_id] += 1
+        due = sum(_hits.values()) >= SHORT_LINK_FLUSH_HITS
+    if due:
+        _flush_due.set()
+
+
+def _add_hits(recipe_id, hits):
+    """
+    Прибавляет переходы рецепту. Строку, которой еще нет, вставляет;
+    если ее успел вставить другой воркер, повторяет UPDATE. Переходы
+    удаленного рецепта отбрасываются.
+    """
+    counter = ShortLinkHits.objects.filter(recipe_id=recipe_id)
+    if counter.update(hits=F('hits') + hits):
+        return
+    try:
+        with transaction.atomic():
+            ShortLinkHits.objects.create(recipe_id=recipe_id, hits=hits)
+    except IntegrityError:
+        counter.update(hits=F('hits') + hits)
+
+
+def flush_hits():
+    """Записывает накопленные переходы одним UPDATE на рецепт."""
+    with _hits_lock:
+        pending = dict(_hits)
+        _hits.clear()
+    for recipe_id, hits in pending.items():
+        _add_hits(recipe_id, hits)
+
+
+def _flush_at_exit():
+    try:
+        flush_hits()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
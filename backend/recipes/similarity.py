@@ -0,0 +1,150 @@
+"""
+Поиск похожих рецептов по набору ингредиентов: MinHash-сигнатура
+и LSH-корзины (SIMILAR_BANDS полос по SIMILAR_ROWS значений). Кандидаты
+из общих корзин ранжируются по точному коэффициенту Жаккара, теги
+используются для разрешения равенства.
+"""
+import hashlib
+import random
+import struct
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db.models import Count, Q
+
+from api.constants import (
+    SIMILAR_BANDS,
+    SIMILAR_CANDIDATES,
+    SIMILAR_ROWS,
+    SIMILAR_SEED,
+)
+from recipes.models import IngredientInRecipe, Recipe, RecipeBucket
+from recipes.outbox import TOPIC_RECIPE_INGREDIENTS
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+NUM_PERMUTATIONS = SIMILAR_BANDS * SIMILAR_ROWS
+
+_random = random.Random(SIMILAR_SEED)
+PERMUTATIONS = [
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+_BAND_FORMAT = struct.Struct(f'<{SIMILAR_ROWS}Q')
+
+
+@lru_cache(maxsize=None)
+def _ingredient_hashes(ingredient_id):
+    """Значения всех хеш-перестановок для одного ингредиента."""
+    return tuple(
+        (a * ingredient_id + b) % MERSENNE_PRIME for a, b in PERMUTATIONS
+    )
+
+
+def minhash(ingredient_ids):
+    """
+    MinHash-сигнатура множества id ингредиентов: поэлементный минимум
+    закешированных векторов хешей (справочник ингредиентов невелик).
+    """
+    return list(map(min, zip(*map(_ingredient_hashes, ingredient_ids))))
+
+
+def band_buckets(ingredient_ids):
+    """Пары (полоса, корзина) для множества ингредиентов."""
+    if not ingredient_ids:
+        return []
+    signature = minhash(ingredient_ids)
+    buckets = []
+    for band in range(SIMILAR_BANDS):
+        rows = signature[band * SIMILAR_ROWS:(band + 1) * SIMILAR_ROWS]
+        digest = hashlib.blake2b(
+            _BAND_FORMAT.pack(*rows), digest_size=8
+        ).digest()
+        buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return buckets
+
+
+def recipe_buckets(recipe_id, ingredient_ids):
+    return [
+        RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+        for band, bucket in band_buckets(set(ingredient_ids))
+    ]
+
+
+def index_recipe(recipe_id, ingredient_ids):
+    """Пересчитывает корзины одного рецепта после создания или правки."""
+    RecipeBucket.objects.filter(recipe_id=recipe_id).delete()
+    RecipeBucket.objects.bulk_create(
+        recipe_buckets(recipe_id, ingredient_ids)
+    )
+
+
+def reindex_changes(changes):
+    """
+    Обработчик журнала изменений: пересчитывает корзины рецептов,
+    состав которых менялся, в том числе правок из админки.
+    """
+    recipe_ids = {
+        change.object_id for change in changes
+        if change.topic == TOPIC_RECIPE_INGREDIENTS
+    }
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].append(ingredient_id)
+    for recipe_id in Recipe.objects.filter(
+        id__in=recipe_ids
+    ).values_list('id', flat=True):
+        index_recipe(recipe_id, ingredients[recipe_id])
+
+
+def _jaccard(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+def similar_recipes(recipe, limit):
+    """Похожие рецепты, отсортированные по сходству ингредиентов и тегов."""
+    ingredients = set(
+        recipe.recipe_ingredients.order_by().values_list(
+            'ingredient_id', flat=True
+        )
+    )
+    buckets = band_buckets(ingredients)
+    if not buckets:
+        return []
+    condition = Q()
+    for band, bucket in buckets:
+        condition |= Q(band=band, bucket=bucket)
+    candidate_ids = list(
+        RecipeBucket.objects.filter(condition)
+        .exclude(recipe_id=recipe.id)
+        .values('recipe_id')
+        .annotate(hits=Count('id'))
+        .order_by('-hits')
+        .values_list('recipe_id', flat=True)[:SIMILAR_CANDIDATES]
+    )
+    candidate_ingredients = defaultdict(set)
+    for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+        recipe_id__in=candidate_ids
+    ).order_by().values_list('recipe_id', 'ingredient_id'):
+        candidate_ingredients[recipe_id].add(ingredient_id)
+    tags = set(recipe.tags.values_list('id', flat=True))
+    candidate_tags = defaultdict(set)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=candidate_ids
+    ).values_list('recipe_id', 'tag_id'):
+        candidate_tags[recipe_id].add(tag_id)
+    ranked = sorted(
+        candidate_ids,
+        key=lambda recipe_id: (
+            _jaccard(ingredients, candidate_ingredients[recipe_id]),
+            _jaccard(tags, candidate_tags[recipe_id]),
+        ),
+        reverse=True,
+    )[:limit]
+    recipes = Recipe.objects.only(
+        'id', 'name', 'image', 'cooking_time'
+    ).in_bulk(ranked)
+    return [recipes[recipe_id] for recipe_id in ranked if recipe_id in recipes]
@@ -0,0 +1,93 @@
+"""
+Теги рецепта в виде битовой маски Recipe.tag_mask: тег с id N - бит
+N - 1. Фильтр «любой из тегов» превращается в tag_mask IN (...) по
+всем маскам, пересекающимся с выбранной, и идет по обычному индексу
+без JOIN с таблицей тегов и без DISTINCT. Теги с id больше
+TAG_MASK_BITS в маску не попадают и фильтруются подзапросом.
+"""
+from collections import defaultdict
+
+from django.db.models import Exists, F, OuterRef, Q
+
+from api.constants import TAG_MASK_BITS, TAG_MASK_IN_LIMIT
+from recipes.models import Recipe, Tag
+
+
+def tag_bit(tag_id):
+    if 0 < tag_id <= TAG_MASK_BITS:
+        return 1 << (tag_id - 1)
+    return 0
+
+
+def tag_mask(tag_ids):
+    """Битовая маска набора id тегов."""
+    mask = 0
+    for tag_id in tag_ids:
+        mask |= tag_bit(tag_id)
+    return mask
+
+
+def matching_masks(selected, available):
+    """Все подмаски available, пересекающиеся с selected."""
+    masks = []
+    mask = available
+    while mask:
+        if mask & selected:
+            masks.append(mask)
+        mask = (mask - 1) & available
+    return masks
+
+
+def filter_by_tags(queryset, tag_ids):
+    """Рецепты, у которых есть хотя бы один из тегов tag_ids."""
+    selected = tag_mask(tag_ids)
+    condition = Q()
+    if selected:
+        available = tag_mask(Tag.objects.values_list('id', flat=True))
+        total = bin(available).count('1')
+        rest = bin(available & ~selected).count('1')
+        # Число подходящих масок растет экспоненциально; при большом
+        # справочнике пересечение проверяется выражением по строкам.
+        if (1 << total) - (1 << rest) <= TAG_MASK_IN_LIMIT:
+            condition |= Q(tag_mask__in=matching_masks(selected, available))
+        else:
+            queryset = queryset.alias(
+                selected_tags=F('tag_mask').bitand(selected)
+            )
+            condition |= Q(selected_tags__gt=0)
+    overflow = [tag_id for tag_id in tag_ids if not tag_bit(tag_id)]
+    if overflow:
+        condition |= Q(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef('pk'), tag_id__in=overflow
+                )
+            )
+        )
+    if not condition:
+        return queryset.none()
+    return queryset.filter(condition)
+
+
+def sync_tag_masks(recipe_ids):
+    """Пересчитывает маски рецептов по таблице связей с тегами."""
+    masks = dict.fromkeys(recipe_ids, 0)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=masks
+    ).values_list('recipe_id', 'tag_id'):
+        masks[recipe_id] |= tag_bit(tag_id)
+    by_mask = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        by_mask[mask].append(recipe_id)
+    for mask, ids in by_mask.items():
+        Recipe.objects.filter(id__in=ids).update(tag_mask=mask)
+    return masks
+
+
+def clear_tag_bit(tag_id):
+    """Снимает бит тега у всех рецептов (удаление тега, tag.recipes.clear)."""
+    bit = tag_bit(tag_id)
+    if bit:
+        Recipe.objects.alias(
+            has_tag=F('tag_mask').bitand(bit)
+        ).filter(has_tag__gt=0).update(tag_mask=F('tag_mask') - bit)
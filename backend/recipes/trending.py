@@ -0,0 +1,65 @@
+"""
+Рейтинг популярности рецептов (RecipeScore). Вклад строки избранного
+или корзины - вес, затухающий с периодом полураспада, в масштабе
+момента TrendingState.epoch. Строки старше TrendingState.settled_until
+уже сложены в RecipeScore.base, поэтому при их удалении вклад
+вычитается сразу; более новые строки update_trending каждый раз
+пересчитывает заново.
+"""
+import math
+
+from django.db import connections, router
+from django.db.models import F
+
+from api.constants import TRENDING_CART_WEIGHT, TRENDING_FAVORITE_WEIGHT
+from recipes.models import Favorite, RecipeScore, ShoppingCart, TrendingState
+
+
+WEIGHTS = {
+    Favorite: TRENDING_FAVORITE_WEIGHT,
+    ShoppingCart: TRENDING_CART_WEIGHT,
+}
+
+
+def decay_rate(half_life_hours):
+    return math.log(2) / (half_life_hours * 3600)
+
+
+def contribution(weight, created_at, epoch, decay):
+    """Вклад строки, созданной в created_at, в масштабе epoch."""
+    return weight * math.exp(decay * (created_at - epoch).total_seconds())
+
+
+def _shared_state():
+    """
+    Состояние под разделяемой блокировкой (в PostgreSQL FOR SHARE):
+    удаления не мешают друг другу, но ждут update_trending, который
+    держит строку FOR UPDATE, и видят уже сдвинутые им границы.
+    """
+    database = router.db_for_write(TrendingState)
+    if connections[database].vendor != 'postgresql':
+        return TrendingState.objects.using(database).first()
+    table = TrendingState._meta.db_table
+    return next(iter(TrendingState.objects.using(database).raw(
+        f'SELECT * FROM {table} ORDER BY id LIMIT 1 FOR SHARE'
+    )), None)
+
+
+def retract(model, instance):
+    """Вычитает вклад удаленной строки, если он уже в base."""
+    state = _shared_state()
+    if (
+        state is None
+        or state.settled_until is None
+        or instance.created_at >= state.settled_until
+    ):
+        return
+    amount = contribution(
+        WEIGHTS[model],
+        instance.created_at,
+        state.epoch,
+        decay_rate(state.half_life_hours),
+    )
+    RecipeScore.objects.filter(recipe_id=instance.recipe_id).update(
+        base=F('base') - amount, score=F('score') - amount
+    )
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from foodgram.backends.postgresql_pool.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """Соединение psycopg2 без сервера: только то, что нужно пулу."""
+
+    def __init__(self):
+        self.closed = False
+        self.info = mock.Mock(transaction_status=0)
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        pass
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_returned_connection_is_reused(self):
+        pool = ConnectionPool(min_size=0, max_size=2, timeout=1)
+        connection = pool.getconn(self.connect)
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(self.connect), connection)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['checkouts'], 2)
+
+    def test_fill_opens_min_size(self):
+        pool = ConnectionPool(min_size=2, max_size=3, timeout=1)
+        pool.fill(self.connect)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle']), (2, 2))
+
+    def test_timeout_when_exhausted(self):
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=0.05)
+        pool.getconn(self.connect)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(self.connect)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=2)
+        connection = pool.getconn(self.connect)
+        timer = threading.Timer(0.05, pool.putconn, (connection,))
+        timer.start()
+        self.assertIs(pool.getconn(self.connect), connection)
+        timer.join()
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['max_wait'], 0)
+
+    def test_broken_connection_is_not_returned(self):
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=1)
+        connection = pool.getconn(self.connect)
+        connection.closed = True
+        pool.putconn(connection)
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertIsNot(pool.getconn(self.connect), connection)
+
+    def test_recently_used_connection_is_not_checked(self):
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=1,
+                              check_after=60)
+        check = mock.Mock(return_value=True)
+        pool.putconn(pool.getconn(self.connect, check))
+        pool.getconn(self.connect, check)
+        check.assert_not_called()
+
+    def test_idle_connection_is_checked_and_replaced(self):
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=1,
+                              check_after=0.01)
+        stale = pool.getconn(self.connect)
+        pool.putconn(stale)
+        time.sleep(0.02)
+        connection = pool.getconn(self.connect, lambda connection: False)
+        self.assertIsNot(connection, stale)
+        self.assertTrue(stale.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['health_checks'], stats['discarded']), (1, 1))
+        self.assertEqual(stats['size'], 1)
+
+    def test_pool_forgets_parent_connections_after_fork(self):
+        pool = ConnectionPool(min_size=0, max_size=1, timeout=1)
+        pool.putconn(pool.getconn(self.connect))
+        with mock.patch.object(os, 'getpid', return_value=-1):
+            connection = pool.getconn(self.connect)
+        self.assertIs(connection, self.opened[-1])
+        self.assertEqual(len(self.opened), 2)
+        self.assertFalse(self.opened[0].closed)
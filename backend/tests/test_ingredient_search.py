@@ -0,0 +1,81 @@
+from django.test import TestCase, override_settings
+
+from api import ingredient_search
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from users.models import User
+
+
+NAMES = (
+    ('картофель', 'г'),
+    ('капуста', 'г'),
+    ('абрикосовое варенье', 'г'),
+    ('вишневое варенье', 'г'),
+    ('соль морская', 'г'),
+    ('соль каменная', 'г'),
+)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}})
+class TrigramIndexTests(TestCase):
+
+    def setUp(self):
+        ingredient_search._index = None
+        self.ingredients = {
+            name: Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in NAMES
+        }
+
+    def tearDown(self):
+        ingredient_search._index = None
+
+    def search(self, query):
+        return [
+            ingredient.name
+            for ingredient in ingredient_search.search_ingredients(query)
+        ]
+
+    def test_typo(self):
+        self.assertEqual(self.search('картофил')[0], 'картофель')
+
+    def test_word_order(self):
+        self.assertEqual(
+            self.search('варенье абрикосовое')[0], 'абрикосовое варенье'
+        )
+
+    def test_query_without_trigrams(self):
+        for query in ('', '  ', '--', '!?'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+    def test_usage_ranking(self):
+        """При близком сходстве выше ингредиент из большего числа рецептов."""
+        self.assertEqual(
+            self.search('соль'), ['соль морская', 'соль каменная']
+        )
+        author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p'
+        )
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Готовить',
+                cooking_time=10, image='recipes/images/dish.png',
+            )
+            IngredientInRecipe.objects.create(
+                recipe=recipe,
+                ingredient=self.ingredients['соль каменная'],
+                amount=5,
+            )
+        ingredient_search._index = None
+        self.assertEqual(
+            self.search('соль'), ['соль каменная', 'соль морская']
+        )
+
+    def test_index_rebuilds_on_catalog_change(self):
+        index = ingredient_search.get_index()
+        self.assertIs(ingredient_search.get_index(), index)
+        self.assertEqual(self.search('свекла'), [])
+        Ingredient.objects.create(name='свекла', measurement_unit='г')
+        self.assertIsNot(ingredient_search.get_index(), index)
+        self.assertEqual(self.search('свекла'), ['свекла'])
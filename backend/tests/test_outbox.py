@@ -0,0 +1,48 @@
+from django.test import TestCase
+
+from recipes import outbox
+from recipes.models import Change, ChangeConsumer
+
+
+class ChangeFeedTests(TestCase):
+
+    def add(self, change_id, txid, object_id):
+        return Change.objects.create(
+            id=change_id, txid=txid, topic=outbox.TOPIC_RECIPE,
+            object_id=object_id, action=outbox.ACTION_UPDATE,
+        )
+
+    def consumed(self, name='test'):
+        seen = []
+        outbox.consume(name, lambda changes: seen.extend(
+            change.object_id for change in changes
+        ))
+        return seen
+
+    def test_feed_is_read_in_transaction_order(self):
+        """Событие поздней по id, но ранней транзакции идет первым."""
+        self.add(1, 20, 1)
+        self.add(2, 10, 2)
+        self.assertEqual(self.consumed(), [2, 1])
+
+    def test_late_commit_of_earlier_id_is_not_lost(self):
+        """Событие с меньшим id из более поздней транзакции не теряется."""
+        self.add(5, 10, 1)
+        self.add(6, 10, 2)
+        self.assertEqual(self.consumed(), [1, 2])
+        self.add(4, 11, 3)
+        self.assertEqual(self.consumed(), [3])
+
+    def test_reset_and_prune_follow_cursor(self):
+        self.add(1, 10, 1)
+        self.add(2, 5, 2)
+        self.assertEqual(outbox.reset('test'), 1)
+        self.assertEqual(self.consumed(), [])
+        outbox.reset('test', 2)
+        self.assertEqual(self.consumed(), [1])
+        outbox.reset('slow', 2)
+        self.assertEqual(outbox.prune(days=0), 1)
+        self.assertEqual(
+            list(Change.objects.values_list('object_id', flat=True)), [1]
+        )
+        self.assertEqual(ChangeConsumer.objects.count(), 2)
@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase, override_settings
+
+from users import profile_cache
+from users.constants import PROFILE_CACHE_TIMEOUT, PROFILE_LOCAL_CACHE_TIMEOUT
+
+
+PROFILE = {
+    'id': 7,
+    'email': 'cook@example.com',
+    'username': 'cook',
+    'first_name': 'Иван',
+    'last_name': 'Петров',
+    'avatar': 'users/avatar.png',
+}
+
+
+class ProfileCacheTests(SimpleTestCase):
+
+    def test_user_fields_match_profile(self):
+        user = profile_cache._user_from_profile(PROFILE, 'replica_1')
+        for field, value in PROFILE.items():
+            self.assertEqual(getattr(user, field), value)
+        self.assertEqual(user._state.db, 'replica_1')
+        self.assertFalse(user._state.adding)
+
+    def test_other_fields_are_deferred(self):
+        user = profile_cache._user_from_profile(PROFILE, 'default')
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertNotIn('email', user.get_deferred_fields())
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_process_local_cache_keeps_profiles_briefly(self):
+        self.assertEqual(
+            profile_cache._timeout(), PROFILE_LOCAL_CACHE_TIMEOUT
+        )
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/tmp/foodgram-test-cache',
+    }})
+    def test_shared_cache_keeps_profiles(self):
+        self.assertEqual(profile_cache._timeout(), PROFILE_CACHE_TIMEOUT)
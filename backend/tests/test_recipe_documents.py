@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api import documents
+from recipes.documents import invalidate_documents
+from recipes.models import Recipe, RecipeDocument
+from users.models import User
+
+
+class RecipeDocumentTests(TestCase):
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p',
+            first_name='Иван', last_name='Петров',
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Борщ', text='Варить', cooking_time=60,
+            image='recipes/images/borsch.png',
+        )
+
+    def stored(self):
+        return RecipeDocument.objects.filter(
+            recipe=self.recipe, document__isnull=False
+        ).values_list('document', flat=True).first()
+
+    def test_document_is_built_and_stored(self):
+        built = documents.build_documents([self.recipe.id])
+        self.assertEqual(built[self.recipe.id]['name'], 'Борщ')
+        self.assertEqual(self.stored(), built[self.recipe.id])
+        self.assertEqual(documents.get_documents([self.recipe.id]), built)
+
+    def test_read_on_sqlite_or_replica_does_not_store(self):
+        self.assertFalse(documents.stores_on_read('default'))
+        self.assertFalse(documents.stores_on_read('replica_1'))
+        with self.assertNumQueries(4):
+            built = documents.get_documents([self.recipe.id])
+        self.assertEqual(built[self.recipe.id]['name'], 'Борщ')
+        self.assertIsNone(self.stored())
+        self.assertFalse(RecipeDocument.objects.exists())
+
+    def test_read_on_primary_stores(self):
+        with mock.patch.object(
+            documents, 'stores_on_read', return_value=True
+        ):
+            built = documents.get_documents([self.recipe.id])
+        self.assertEqual(self.stored(), built[self.recipe.id])
+
+    def test_invalidation_clears_document(self):
+        documents.build_documents([self.recipe.id])
+        invalidate_documents(recipe_id=self.recipe.id)
+        self.assertIsNone(self.stored())
+
+    def test_stale_build_is_not_stored(self):
+        """Сборка по данным до изменения не сохраняет документ."""
+        versions = documents.reserve_documents([self.recipe.id], 'default')
+        stale = {self.recipe.id: {'name': 'Борщ'}}
+        Recipe.objects.filter(id=self.recipe.id).update(name='Щи')
+        invalidate_documents(recipe_id=self.recipe.id)
+        documents.store_documents(stale, versions, 'default')
+        self.assertIsNone(self.stored())
+        built = documents.get_documents([self.recipe.id])
+        self.assertEqual(built[self.recipe.id]['name'], 'Щи')
@@ -0,0 +1,125 @@
+import base64
+import re
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeDocument,
+    Tag,
+)
+from users.models import User
+
+
+PNG = base64.b64encode(base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAC'
+    'hwGA60e6kgAAAABJRU5ErkJggg=='
+)).decode()
+IMAGE = f'data:image/png;base64,{PNG}'
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeUpdateTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p',
+            first_name='Иван', last_name='Петров',
+        )
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.author)
+        self.tags = [
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (('Завтрак', 'breakfast'), ('Обед', 'lunch'))
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ing{i}', measurement_unit='г')
+            for i in range(3)
+        ]
+        response = self.client.post('/api/recipes/', self.payload(
+            [(0, 10), (1, 20)], [self.tags[0].id]
+        ), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.recipe = Recipe.objects.get()
+
+    def payload(self, ingredients, tags, text='Варить'):
+        return {
+            'name': 'Борщ',
+            'text': text,
+            'cooking_time': 60,
+            'image': IMAGE,
+            'tags': tags,
+            'ingredients': [
+                {'id': self.ingredients[index].id, 'amount': amount}
+                for index, amount in ingredients
+            ],
+        }
+
+    def update(self, ingredients, tags, text='Варить'):
+        with self.assertLogs('api.views', 'INFO') as logs:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                self.payload(ingredients, tags, text),
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return logs.output[-1]
+
+    def test_ingredient_diff(self):
+        kept = IngredientInRecipe.objects.get(
+            recipe=self.recipe, ingredient=self.ingredients[0]
+        )
+        log = self.update([(0, 10), (1, 25), (2, 5)], [self.tags[0].id])
+        self.assertIn('ingredients +1 ~1 -0', log)
+        log = self.update([(1, 25), (2, 5)], [self.tags[0].id])
+        self.assertIn('ingredients +0 ~0 -1', log)
+        self.assertFalse(
+            IngredientInRecipe.objects.filter(pk=kept.pk).exists()
+        )
+        self.assertEqual(
+            dict(self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {self.ingredients[1].id: 25, self.ingredients[2].id: 5},
+        )
+
+    def test_unchanged_rows_are_kept(self):
+        rows = set(self.recipe.recipe_ingredients.values_list('id', flat=True))
+        links = set(
+            Recipe.tags.through.objects.values_list('id', flat=True)
+        )
+        log = self.update([(0, 10), (1, 20)], [self.tags[0].id], 'Тушить')
+        fields = re.search(r'fields ([\w,]+),', log).group(1)
+        self.assertEqual(sorted(fields.split(',')), ['image', 'text'])
+        self.assertIn('ingredients +0 ~0 -0, tags kept', log)
+        self.assertEqual(
+            set(self.recipe.recipe_ingredients.values_list('id', flat=True)),
+            rows,
+        )
+        self.assertEqual(
+            set(Recipe.tags.through.objects.values_list('id', flat=True)),
+            links,
+        )
+
+    def test_tags_change(self):
+        log = self.update([(0, 10), (1, 20)], [t.id for t in self.tags])
+        self.assertIn('tags changed', log)
+        self.assertEqual(self.recipe.tags.count(), 2)
+
+    def test_document_is_built_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.update([(0, 10)], [self.tags[0].id], 'Тушить')
+        document = RecipeDocument.objects.get(recipe=self.recipe).document
+        self.assertEqual(document['text'], 'Тушить')
+        self.assertEqual(len(document['ingredients']), 1)
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from foodgram import db_router
+from foodgram.middleware import ReplicaRoutingMiddleware
+from recipes.models import Recipe
+
+
+REPLICA = 'replica_1'
+CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    REPLICA_DATABASES=[REPLICA],
+    REPLICA_MAX_LAG=5,
+    REPLICA_LAG_CHECK_INTERVAL=0,
+    REPLICA_PIN_SECONDS=10,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    }},
+)
+class ReplicaRoutingTests(SimpleTestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        self.factory = RequestFactory()
+        self.lag = mock.patch.object(
+            db_router, 'replica_lag', return_value=0.0
+        )
+        self.lag.start()
+        self.addCleanup(self.lag.stop)
+        FileBasedCache(CACHE_DIR, {}).clear()
+
+    def middleware(self, write=False):
+        """Запрос через middleware: куда ушло чтение после записи."""
+        def view(request):
+            if write:
+                self.router.db_for_write(Recipe)
+            view.database = self.router.db_for_read(Recipe)
+            return HttpResponse()
+        return ReplicaRoutingMiddleware(view), view
+
+    def test_reads_go_to_primary_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_safe_request_reads_from_replica(self):
+        middleware, view = self.middleware()
+        middleware(self.factory.get('/api/recipes/'))
+        self.assertEqual(view.database, REPLICA)
+
+    def test_write_pins_rest_of_request_to_primary(self):
+        middleware, view = self.middleware(write=True)
+        middleware(self.factory.get('/api/recipes/'))
+        self.assertEqual(view.database, DEFAULT_DB_ALIAS)
+
+    def test_lagging_replica_is_out_of_rotation(self):
+        db_router.replica_lag.return_value = 30.0
+        middleware, view = self.middleware()
+        middleware(self.factory.get('/api/recipes/'))
+        self.assertEqual(view.database, DEFAULT_DB_ALIAS)
+
+    def test_unreachable_replica_is_out_of_rotation(self):
+        db_router.replica_lag.return_value = None
+        self.assertEqual(db_router.healthy_replicas(), [])
+
+    def test_write_sets_pin_cookie(self):
+        middleware, _ = self.middleware(write=True)
+        response = middleware(self.factory.post('/api/recipes/'))
+        cookie = response.cookies['db_pin']
+        self.assertEqual(cookie['max-age'], 10)
+        middleware, view = self.middleware()
+        middleware(self.factory.get(
+            '/api/recipes/', HTTP_COOKIE=f'db_pin={cookie.value}'
+        ))
+        self.assertEqual(view.database, DEFAULT_DB_ALIAS)
+
+    def test_token_client_is_pinned_in_every_worker(self):
+        """Закрепление по токену лежит в общем кеше, а не в процессе."""
+        middleware, _ = self.middleware(write=True)
+        middleware(self.factory.post(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token a'
+        ))
+        key = ReplicaRoutingMiddleware._client_key(
+            self.factory.get('/', HTTP_AUTHORIZATION='Token a')
+        )
+        self.assertTrue(FileBasedCache(CACHE_DIR, {}).get(key))
+        other, view = self.middleware()
+        other(self.factory.get(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token a'
+        ))
+        self.assertEqual(view.database, DEFAULT_DB_ALIAS)
+        other(self.factory.get(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token b'
+        ))
+        self.assertEqual(view.database, REPLICA)
+
+    def test_migrations_skip_replicas(self):
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'recipes'))
+        self.assertTrue(
+            self.router.allow_migrate(DEFAULT_DB_ALIAS, 'recipes')
+        )
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.constants import SHORT_LINK_ALPHABET, SHORT_LINK_LENGTH
+from recipes import short_links
+from recipes.models import Recipe
+from users.models import User
+
+
+class ShortLinkCodeTests(TestCase):
+
+    def test_round_trip(self):
+        ids = [1, 2, 3, 62, 1000, 123456, short_links.MODULUS - 1]
+        codes = [short_links.encode(recipe_id) for recipe_id in ids]
+        self.assertEqual(len(set(codes)), len(ids))
+        for recipe_id, code in zip(ids, codes):
+            self.assertEqual(len(code), SHORT_LINK_LENGTH)
+            self.assertTrue(set(code) <= set(SHORT_LINK_ALPHABET))
+            self.assertEqual(short_links.decode(code), recipe_id)
+
+    def test_bad_codes_are_rejected(self):
+        code = short_links.encode(42)
+        for bad in ('', code[:-1], code + 'a', code[:-1] + '-', 'абвгдеж'):
+            with self.subTest(code=bad):
+                self.assertIsNone(short_links.decode(bad))
+        self.assertIsNone(
+            short_links.decode(SHORT_LINK_ALPHABET[0] * SHORT_LINK_LENGTH)
+        )
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}})
+class RecipeExistsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        short_links._known.clear()
+        self.author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p'
+        )
+
+    def create_recipe(self, **kwargs):
+        return Recipe.objects.create(
+            author=self.author, name='Борщ', text='Варить',
+            cooking_time=60, image='recipes/images/borsch.png', **kwargs
+        )
+
+    def test_miss_is_cached(self):
+        self.assertFalse(short_links.recipe_exists(999))
+        with self.assertNumQueries(0):
+            self.assertFalse(short_links.recipe_exists(999))
+
+    def test_create_clears_cached_miss(self):
+        self.assertFalse(short_links.recipe_exists(999))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe(id=999)
+        self.assertTrue(short_links.recipe_exists(999))
+
+    def test_delete_clears_cached_hit(self):
+        recipe = self.create_recipe()
+        self.assertTrue(short_links.recipe_exists(recipe.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(short_links.recipe_exists(recipe.id))
+        recipe_id = recipe.id
+        recipe.delete()
+        self.assertFalse(short_links.recipe_exists(recipe_id))
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from foodgram import slow_queries
+
+
+def postgresql_connection():
+    connection = mock.Mock(
+        vendor='postgresql', alias='default', in_atomic_block=False
+    )
+    connection.ops.explain_query_prefix.side_effect = (
+        lambda **options: 'EXPLAIN ANALYZE' if options else 'EXPLAIN'
+    )
+    connection.create_cursor.return_value.fetchall.return_value = [
+        ('Seq Scan on recipes_recipe',)
+    ]
+    return connection
+
+
+@override_settings(REPLICA_DATABASES=[], SLOW_QUERY_EXPLAIN_ANALYZE=True)
+class ExplainTests(SimpleTestCase):
+
+    def executed(self, connection):
+        return connection.create_cursor.return_value.execute.call_args[0][0]
+
+    def test_plain_select(self):
+        self.assertTrue(slow_queries.is_plain_select('SELECT 1'))
+        self.assertTrue(
+            slow_queries.is_plain_select(' SELECT "t"."for" FROM "t"')
+        )
+
+    def test_statements_with_side_effects(self):
+        for sql in (
+            'UPDATE "t" SET "a" = 1',
+            'SELECT * FROM "t" FOR UPDATE',
+            'SELECT * FROM "t" FOR NO KEY UPDATE SKIP LOCKED',
+            'select * from "t" for share',
+            'WITH "x" AS (DELETE FROM "t" RETURNING *) SELECT * FROM "x"',
+        ):
+            with self.subTest(sql=sql):
+                self.assertFalse(slow_queries.is_plain_select(sql))
+
+    def test_locking_select_is_not_analyzed(self):
+        connection = postgresql_connection()
+        sql = 'SELECT * FROM "t" FOR UPDATE'
+        _, analyze = slow_queries._explain(connection, sql, [])
+        self.assertFalse(analyze)
+        self.assertEqual(self.executed(connection), f'EXPLAIN {sql}')
+
+    @override_settings(SLOW_QUERY_EXPLAIN_ANALYZE=False)
+    def test_primary_is_not_analyzed_by_default(self):
+        connection = postgresql_connection()
+        _, analyze = slow_queries._explain(connection, 'SELECT 1', [])
+        self.assertFalse(analyze)
@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.constants import TAG_MASK_BITS
+from recipes import tag_masks
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class TagMaskTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p'
+        )
+        self.breakfast, self.lunch, self.dinner = (
+            Tag.objects.create(id=tag_id, name=slug, slug=slug)
+            for tag_id, slug in ((1, 'breakfast'), (2, 'lunch'), (3, 'dinner'))
+        )
+        self.overflow = Tag.objects.create(
+            id=TAG_MASK_BITS + 1, name='overflow', slug='overflow'
+        )
+        self.porridge = self.create_recipe('Каша', self.breakfast)
+        self.soup = self.create_recipe('Суп', self.lunch, self.dinner)
+        self.special = self.create_recipe('Особое', self.overflow)
+        self.plain = self.create_recipe('Хлеб')
+
+    def create_recipe(self, name, *tags):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text='Готовить',
+            cooking_time=10, image='recipes/images/dish.png',
+        )
+        recipe.tags.set(tags)
+        return recipe
+
+    def mask(self, recipe):
+        return Recipe.objects.get(pk=recipe.pk).tag_mask
+
+    def matching(self, *tags):
+        queryset = tag_masks.filter_by_tags(
+            Recipe.objects.all(), [tag.id for tag in tags]
+        )
+        return queryset, set(queryset.values_list('name', flat=True))
+
+    def test_masks_follow_tags(self):
+        self.assertEqual(self.mask(self.porridge), 0b001)
+        self.assertEqual(self.mask(self.soup), 0b110)
+        self.assertEqual(self.mask(self.special), 0)
+        self.assertEqual(self.mask(self.plain), 0)
+
+    def test_matching_masks_intersect_selected(self):
+        self.assertEqual(
+            sorted(tag_masks.matching_masks(0b001, 0b111)),
+            [0b001, 0b011, 0b101, 0b111],
+        )
+        self.assertEqual(tag_masks.matching_masks(0b1000, 0b111), [])
+
+    def test_in_list_path(self):
+        queryset, names = self.matching(self.breakfast, self.dinner)
+        self.assertEqual(names, {'Каша', 'Суп'})
+        self.assertIn('"tag_mask" IN (', str(queryset.query))
+
+    def test_bitand_fallback(self):
+        with mock.patch.object(tag_masks, 'TAG_MASK_IN_LIMIT', 1):
+            queryset, names = self.matching(self.breakfast, self.dinner)
+        self.assertEqual(names, {'Каша', 'Суп'})
+        self.assertNotIn('"tag_mask" IN (', str(queryset.query))
+        self.assertIn('&', str(queryset.query))
+
+    def test_overflow_tag_uses_subquery(self):
+        queryset, names = self.matching(self.overflow)
+        self.assertEqual(names, {'Особое'})
+        self.assertIn('EXISTS', str(queryset.query))
+        _, names = self.matching(self.lunch, self.overflow)
+        self.assertEqual(names, {'Суп', 'Особое'})
+
+    def test_set_and_clear_keep_mask_in_sync(self):
+        self.soup.tags.set([self.breakfast, self.overflow])
+        self.assertEqual(self.mask(self.soup), 0b001)
+        self.assertEqual(self.matching(self.lunch)[1], set())
+        self.assertEqual(
+            self.matching(self.overflow)[1], {'Особое', 'Суп'}
+        )
+        self.soup.tags.clear()
+        self.assertEqual(self.mask(self.soup), 0)
+        self.assertEqual(self.matching(self.breakfast)[1], {'Каша'})
+
+    def test_reverse_clear_and_tag_delete(self):
+        self.porridge.tags.add(self.lunch)
+        self.lunch.recipes.clear()
+        self.assertEqual(self.mask(self.porridge), 0b001)
+        self.assertEqual(self.mask(self.soup), 0b100)
+        self.dinner.delete()
+        self.assertEqual(self.mask(self.soup), 0)
+        self.assertEqual(self.matching(self.lunch, self.breakfast)[1],
+                         {'Каша'})
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.request import Request
+
+from api import throttling
+
+
+THROTTLE_DIR = tempfile.mkdtemp()
+
+
+class View:
+    basename = 'recipes'
+    action = 'download_shopping_cart'
+
+
+@override_settings(
+    THROTTLE_DB_PATH=os.path.join(THROTTLE_DIR, 'throttle.sqlite3')
+)
+class TokenBucketTests(SimpleTestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(THROTTLE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        local = mock.patch.object(throttling, '_local', threading.local())
+        local.start()
+        self.addCleanup(local.stop)
+        rates = mock.patch.object(
+            throttling.TokenBucketThrottle, 'THROTTLE_RATES',
+            {'shopping_cart': '2/min', 'shopping_cart_ip': '3/min'},
+        )
+        rates.start()
+        self.addCleanup(rates.stop)
+        throttling._connection().executescript(
+            'DELETE FROM bucket; DELETE FROM rejected;'
+        )
+        self.factory = RequestFactory()
+
+    def request(self, ip='10.0.0.1', forwarded=None):
+        headers = {'REMOTE_ADDR': ip}
+        if forwarded:
+            headers['HTTP_X_FORWARDED_FOR'] = forwarded
+        request = Request(self.factory.get('/api/recipes/', **headers))
+        request.user = None
+        return request
+
+    def test_bucket_empties_and_counts_rejections(self):
+        throttle = throttling.UserTokenBucketThrottle()
+        self.assertTrue(throttle.allow_request(self.request(), View()))
+        self.assertTrue(throttle.allow_request(self.request(), View()))
+        with self.assertLogs('api.throttling', 'WARNING'):
+            self.assertFalse(
+                throttle.allow_request(self.request(), View())
+            )
+        self.assertAlmostEqual(throttle.wait(), 30, delta=1)
+        self.assertEqual(
+            throttling.rejected_counts(), {'shopping_cart': 1}
+        )
+
+    def test_bucket_refills_with_time(self):
+        with mock.patch.object(throttling.time, 'time', return_value=1000):
+            for _ in range(2):
+                throttling.take_token('shopping_cart', 'a', 2, 60)
+            self.assertGreater(
+                throttling.take_token('shopping_cart', 'a', 2, 60), 0
+            )
+        with mock.patch.object(throttling.time, 'time', return_value=1030):
+            self.assertEqual(
+                throttling.take_token('shopping_cart', 'a', 2, 60), 0
+            )
+
+    def test_buckets_are_shared_by_connections(self):
+        """Второе соединение (другой воркер) видит списанные токены."""
+        throttling.take_token('shopping_cart', 'a', 1, 60)
+        with mock.patch.object(throttling, '_local', threading.local()):
+            self.assertGreater(
+                throttling.take_token('shopping_cart', 'a', 1, 60), 0
+            )
+
+    def test_full_buckets_are_pruned(self):
+        with mock.patch.object(throttling.time, 'time', return_value=1000):
+            throttling.take_token('shopping_cart', 'a', 2, 60)
+        with mock.patch.object(throttling.time, 'time', return_value=2000):
+            throttling.take_token('shopping_cart', 'b', 2, 60)
+        keys = throttling._connection().execute(
+            'SELECT key FROM bucket'
+        ).fetchall()
+        self.assertEqual(keys, [('shopping_cart:b',)])
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+    def test_ip_bucket_uses_forwarded_address(self):
+        throttle = throttling.IPTokenBucketThrottle()
+        request = self.request(ip='172.18.0.5', forwarded='1.2.3.4')
+        self.assertEqual(throttle.get_ident_key(request), 'ip-1.2.3.4')
@@ -0,0 +1,81 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from api.constants import TRENDING_OVERLAP_MINUTES
+from recipes.models import Favorite, Recipe, RecipeScore, ShoppingCart
+from users.models import User
+
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p'
+        )
+        self.fan = User.objects.create_user(
+            username='fan', email='fan@example.com', password='p'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Борщ', text='Варить',
+            cooking_time=60, image='recipes/images/borsch.png',
+        )
+
+    def update(self, *args):
+        call_command('update_trending', *args, stdout=StringIO())
+
+    def score(self):
+        return RecipeScore.objects.get(recipe=self.recipe).score
+
+    def settle(self, relation):
+        """Переносит строку за окно пересчета."""
+        type(relation).objects.filter(pk=relation.pk).update(
+            created_at=timezone.now()
+            - timedelta(minutes=2 * TRENDING_OVERLAP_MINUTES)
+        )
+
+    def test_add_remove_and_add_again_recent(self):
+        self.update('--full')
+        favorite = Favorite.objects.create(user=self.fan, recipe=self.recipe)
+        self.update()
+        self.assertAlmostEqual(self.score(), 1, places=3)
+        favorite.delete()
+        self.update()
+        self.assertAlmostEqual(self.score(), 0, places=3)
+        Favorite.objects.create(user=self.fan, recipe=self.recipe)
+        self.update()
+        self.update()
+        self.assertAlmostEqual(self.score(), 1, places=3)
+
+    def test_add_remove_and_add_again_settled(self):
+        favorite = Favorite.objects.create(user=self.fan, recipe=self.recipe)
+        cart = ShoppingCart.objects.create(user=self.fan, recipe=self.recipe)
+        self.settle(favorite)
+        self.update('--full')
+        settled = RecipeScore.objects.get(recipe=self.recipe).base
+        self.assertGreater(settled, 0)
+        self.assertAlmostEqual(self.score(), settled + 2, places=3)
+        Favorite.objects.get(pk=favorite.pk).delete()
+        self.assertAlmostEqual(self.score(), 2, places=3)
+        for _ in range(3):
+            Favorite.objects.filter(user=self.fan).delete()
+            Favorite.objects.create(user=self.fan, recipe=self.recipe)
+        self.update()
+        self.assertAlmostEqual(self.score(), 3, places=3)
+        cart.delete()
+        self.update()
+        self.assertAlmostEqual(self.score(), 1, places=3)
+
+    def test_late_row_inside_window_is_counted(self):
+        """Строка, ставшая видимой после запуска, но моложе окна."""
+        self.update('--full')
+        self.update()
+        favorite = Favorite.objects.create(user=self.fan, recipe=self.recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.update()
+        self.assertAlmostEqual(self.score(), 1, places=2)
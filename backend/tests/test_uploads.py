@@ -0,0 +1,96 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import uploads
+from users.models import User
+
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAC'
+    'hwGA60e6kgAAAABJRU5ErkJggg=='
+)
+TEMP_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=os.path.join(TEMP_ROOT, 'media'),
+    UPLOAD_TEMP_DIR=os.path.join(TEMP_ROOT, 'uploads'),
+)
+class ChunkedUploadTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='p',
+            first_name='Иван', last_name='Петров',
+        )
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.user)
+        self.upload = self.client.post(
+            '/api/uploads/', {'size': len(PNG), 'name': 'photo'},
+            format='json',
+        ).json()
+
+    def send(self, start, end):
+        return self.client.generic(
+            'PATCH', f'/api/uploads/{self.upload["id"]}/', PNG[start:end],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(PNG)}',
+        )
+
+    def test_resume_from_offset(self):
+        middle = len(PNG) // 2
+        self.assertEqual(self.send(0, middle).json()['offset'], middle)
+        response = self.client.get(f'/api/uploads/{self.upload["id"]}/')
+        self.assertEqual(response.json()['offset'], middle)
+        response = self.send(middle, len(PNG))
+        self.assertTrue(response.json()['complete'])
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': self.upload['token']},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['avatar'].endswith('.png'))
+
+    def test_repeated_chunk_is_rejected(self):
+        middle = len(PNG) // 2
+        self.send(0, middle)
+        response = self.send(0, middle)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], middle)
+
+    def test_stale_offset_is_checked_under_lock(self):
+        """Два запроса прочитали смещение 0 до записи первого из них."""
+        stale = uploads.get_upload(self.upload['id'], self.user)
+        uploads.append_chunk(stale, io.BytesIO(PNG), 0, len(PNG))
+        with self.assertRaises(uploads.UploadConflict):
+            uploads.append_chunk(stale, io.BytesIO(PNG), 0, len(PNG))
+        upload = uploads.get_upload(self.upload['id'], self.user)
+        self.assertEqual(upload['offset'], len(PNG))
+        self.assertTrue(upload['complete'])
+
+    def test_overrun_is_truncated(self):
+        data_path, _ = uploads._paths(self.upload['id'])
+        with open(data_path, 'wb') as file:
+            file.write(PNG + b'extra')
+        response = self.send(0, len(PNG))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], len(PNG))
+        self.assertTrue(response.json()['complete'])
+
+    def test_chunk_longer_than_size_is_cut(self):
+        upload = uploads.get_upload(self.upload['id'], self.user)
+        offset = uploads.append_chunk(
+            upload, io.BytesIO(PNG + b'extra'), 0, len(PNG) + 5
+        )
+        self.assertEqual(offset, len(PNG))
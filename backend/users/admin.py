@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
-from django.db.models import Count
+from django.db.models import Count, IntegerField, OuterRef, Subquery
 
+from foodgram.paginators import EstimatedCountPaginator
+from recipes.models import Recipe
 from users.models import User, Subscription
 
 admin.site.unregister(Group)
@@ -22,9 +24,11 @@ class UserAdmin(BaseUserAdmin):
         'get_subscriber_count',
     )
     list_display_links = ('email',)
-    list_filter = ('email', 'username')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('^username', '^email', '^last_name')
     ordering = ('username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ('date_joined', 'last_login')
     add_fieldsets = (
         (None, {
@@ -33,23 +37,34 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
+    @staticmethod
+    def _count(queryset, field):
+        return Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .values('count'),
+            output_field=IntegerField(),
+        )
+
     def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
-            recipe_count=Count('recipes', distinct=True),
-            subscriber_count=Count('subscribers', distinct=True),
+        # Счетчики - коррелированные подзапросы: они выполняются только
+        # для строк страницы вместо двух JOIN с DISTINCT по всей таблице.
+        return super().get_queryset(request).annotate(
+            recipe_count=self._count(Recipe.objects, 'author'),
+            subscriber_count=self._count(
+                Subscription.objects, 'subscribed_to'
+            ),
         )
-        return queryset
 
     def get_recipe_count(self, obj):
-        return obj.recipe_count
+        return obj.recipe_count or 0
     get_recipe_count.short_description = 'Рецептов'
-    get_recipe_count.admin_order_field = 'recipe_count'
 
     def get_subscriber_count(self, obj):
-        return obj.subscriber_count
+        return obj.subscriber_count or 0
     get_subscriber_count.short_description = 'Подписчиков'
-    get_subscriber_count.admin_order_field = 'subscriber_count'
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -62,13 +77,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
     list_display = ('user', 'subscribed_to')
     list_display_links = ('user', 'subscribed_to')
-    search_fields = ('user__username', 'subscribed_to__username')
-    list_filter = ('user', 'subscribed_to')
+    list_select_related = ('user', 'subscribed_to')
+    search_fields = ('^user__username', '^subscribed_to__username')
+    autocomplete_fields = ('user', 'subscribed_to')
     fields = ('user', 'subscribed_to')
-
-    def get_queryset(self, request):
-        return (
-            super()
-            .get_queryset(request)
-            .select_related('user', 'subscribed_to')
-        )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -3,4 +3,6 @@ ANOTHER_USER_MES = 'Этот username уже зарегистрирован с 
 LONG_TEXT = 150
 MAX_SIZE_EMAIL = 254
 PATTERN_MES = 'Имя пользователя может содержать только буквы, цифры и символы'
+PROFILE_CACHE_TIMEOUT = 60 * 60
+PROFILE_LOCAL_CACHE_TIMEOUT = 5
 USERNAME_ME = 'me'
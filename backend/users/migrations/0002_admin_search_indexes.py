@@ -0,0 +1,39 @@
+from django.db import migrations
+
+INDEXES = (
+    # '^username' у пользователей и '^...__username' у подписок,
+    # рецептов, избранного и списков покупок.
+    ('users_user_username_upper_idx', 'users_user', 'username'),
+    # '^email' в списке пользователей.
+    ('users_user_email_upper_idx', 'users_user', 'email'),
+    # '^last_name' в списке пользователей.
+    ('users_user_last_name_upper_idx', 'users_user', 'last_name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'((UPPER({column}::text)) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
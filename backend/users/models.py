@@ -104,9 +104,5 @@ class Subscription(models.Model):
             )
         super().clean()
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f'Подписка: {self.user} -> {self.subscribed_to}'
@@ -0,0 +1,85 @@
+"""
+Кеш базового профиля пользователя (все, кроме is_subscribed).
+Используется при чтении профиля. Сброс при изменении виден другим
+воркерам только в общем кеше (см. api.W001); с кешем в памяти
+процесса профиль хранится лишь PROFILE_LOCAL_CACHE_TIMEOUT секунд.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from api.checks import PROCESS_LOCAL_CACHES
+from users.constants import PROFILE_CACHE_TIMEOUT, PROFILE_LOCAL_CACHE_TIMEOUT
+from users.models import User
+
+
+PROFILE_FIELDS = (
+    'id',
+    'email',
+    'username',
+    'first_name',
+    'last_name',
+    'avatar',
+)
+PROFILE_KEY = 'user-profile:{}'
+
+
+def _user_from_profile(profile, database):
+    """
+    Экземпляр User из кеша; остальные поля загрузятся при обращении.
+    from_db ждет значения в порядке concrete_fields модели.
+    """
+    names = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in profile
+    ]
+    return User.from_db(database, names, [profile[name] for name in names])
+
+
+def _timeout():
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return PROFILE_LOCAL_CACHE_TIMEOUT
+    return PROFILE_CACHE_TIMEOUT
+
+
+def get_cached_users(user_ids):
+    """Пользователи по id: из кеша, недостающие - одним запросом."""
+    keys = {PROFILE_KEY.format(user_id): user_id for user_id in set(user_ids)}
+    profiles = {
+        keys[key]: profile for key, profile in cache.get_many(keys).items()
+    }
+    missing = set(keys.values()) - set(profiles)
+    database = router.db_for_read(User)
+    if missing:
+        fetched = {
+            profile['id']: profile
+            for profile in User.objects.using(database).filter(
+                id__in=missing
+            ).values(*PROFILE_FIELDS)
+        }
+        cache.set_many(
+            {
+                PROFILE_KEY.format(user_id): profile
+                for user_id, profile in fetched.items()
+            },
+            _timeout(),
+        )
+        profiles.update(fetched)
+    return {
+        user_id: _user_from_profile(profile, database)
+        for user_id, profile in profiles.items()
+    }
+
+
+def get_cached_user(user_id):
+    return get_cached_users([user_id]).get(user_id)
+
+
+def invalidate_profile(user_id):
+    """
+    Сбрасывает профиль сразу и после коммита, чтобы параллельное
+    чтение внутри транзакции не вернуло в кеш старые данные.
+    """
+    key = PROFILE_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))